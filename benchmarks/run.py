@@ -0,0 +1,262 @@
+# Benchmarki ścieżek obliczeniowych kalkulatora:
+#   python benchmarks/run.py                  # porównanie z benchmarks/baseline.json
+#   python benchmarks/run.py --save-baseline  # zapis nowej linii bazowej
+# Każdy pomiar to mediana z --repeat próbek wraz z ich rozrzutem (względny rozstęp
+# międzykwartylowy), szczyt pamięci mierzy tracemalloc w osobnym przebiegu (NumPy
+# raportuje do niego swoje bufory). Czasy porównujemy po normalizacji przez
+# benchmark kalibracyjny (stała praca w Pythonie i NumPy), więc chwilowo wolniejsza
+# maszyna nie daje regresji na wszystkich ścieżkach. Ścieżka jest regresją, gdy
+# znormalizowany czas przekracza linię bazową o więcej niż większy z progów:
+# --threshold albo NOISE_FACTOR × rozrzut pomiaru (w linii bazowej lub teraz);
+# szczyt pamięci - o więcej niż --threshold. Wtedy kod wyjścia to 1. Linia bazowa
+# zależy od maszyny - po zmianie sprzętu trzeba ją zapisać ponownie.
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from fifty_fifty.backtest import metal_weights, run_backtest, run_rolling_backtest  # noqa: E402
+from fifty_fifty.core import get_agio, get_metals, strategies  # noqa: E402
+from fifty_fifty.fees import storage_profile  # noqa: E402
+from fifty_fifty.grid import evaluate_grid, grid_offsets  # noqa: E402
+from fifty_fifty.montecarlo import block_tables, run_monte_carlo, weekly_log_returns  # noqa: E402
+from fifty_fifty.price_store import LBMA_PATH, build_store, open_store, parse_csv  # noqa: E402
+from fifty_fifty.vectorized import get_agio_array  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+THRESHOLD = 0.25
+REPEAT = 11
+MIN_SAMPLE = 0.05
+NOISE_FACTOR = 3
+CALIBRATION = "calibration"
+AGIO_AMOUNTS = 10000
+MC_PATHS = (1000, 10000, 50000)
+STRATEGY = "FOUNDATION"
+AMOUNT, PURCHASE, YEARS = 400000, 100, 20
+
+# Import w świeżym interpreterze: pakiet lekki (bez NumPy) i silniki symulacji
+IMPORT_SCRIPT = """
+import json, sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+tracemalloc.start()
+started = time.perf_counter()
+import {modules}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "peakBytes": tracemalloc.get_traced_memory()[1]}}))
+"""
+
+
+def cold_import(modules):
+    def measure():
+        script = IMPORT_SCRIPT.format(root=ROOT, modules=modules)
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        return json.loads(output)
+    return measure
+
+
+def summarize(samples):
+    # Mediana próbek i rozrzut: rozstęp międzykwartylowy względem mediany
+    q1, median, q3 = np.percentile(samples, [25, 50, 75])
+    return {"seconds": float(median), "noise": float((q3 - q1) / median) if median > 0 else 0.0}
+
+
+def measure_call(function, repeat):
+    # Szybkie ścieżki wołamy w pętli (jak timeit.autorange), aby próbka trwała
+    # co najmniej MIN_SAMPLE sekund - pojedyncze wywołania poniżej 1 ms są zbyt zaszumione
+    number = 1
+    while _timed(function, number) < MIN_SAMPLE:
+        number *= 2
+    result = summarize([_timed(function, number) / number for _ in range(repeat)])
+    tracemalloc.start()
+    try:
+        function()
+        result["peakBytes"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def _timed(function, number=1):
+    started = time.perf_counter()
+    for _ in range(number):
+        function()
+    return time.perf_counter() - started
+
+
+def calibration():
+    # Stała praca niezależna od kodu kalkulatora: pętla Pythona, sortowanie i mnożenie macierzy
+    values = np.random.default_rng(0).random(200000)
+    total = 0.0
+    for value in values[:50000].tolist():
+        total += value * value
+    np.sort(values)
+    matrix = values[:40000].reshape(200, 200)
+    return total + float((matrix @ matrix).sum())
+
+
+def benchmark_cases(cache_dir):
+    # (nazwa, funkcja pomiaru lub wywołanie, liczba jednostek, jednostka)
+    data = open_store(LBMA_PATH, cache_dir)
+    weights, _ = metal_weights(get_metals(STRATEGY, AMOUNT), data["columns"])
+    storage = storage_profile(STRATEGY, AMOUNT)
+    tables = block_tables(weekly_log_returns(data))
+    strategy = next(s for s in strategies if s["name"] == STRATEGY)
+    amounts = np.linspace(strategy["minValue"], strategy["maxValue"], AGIO_AMOUNTS)
+    amount_list = amounts.tolist()
+    rows = len(data["days"])
+
+    cases = [
+        (CALIBRATION, calibration, 1, "run"),
+        ("import.package", cold_import("fifty_fifty"), 1, "import"),
+        ("import.engines", cold_import("fifty_fifty.backtest, fifty_fifty.montecarlo, fifty_fifty.price_store"), 1, "import"),
+        ("load.csv", lambda: parse_csv(LBMA_PATH), rows, "row"),
+        ("load.store_build", lambda: build_store(LBMA_PATH, os.path.join(cache_dir, "build")), rows, "row"),
+        ("load.store_open", lambda: open_store(LBMA_PATH, cache_dir), rows, "row"),
+        ("agio.scalar", lambda: [get_agio(STRATEGY, amount) for amount in amount_list], AGIO_AMOUNTS, "call"),
+        ("agio.vectorized", lambda: get_agio_array(STRATEGY, amounts), AGIO_AMOUNTS, "call"),
+        ("backtest.single", lambda: run_backtest(data, weights, AMOUNT, PURCHASE, YEARS, storage=storage), 1, "backtest"),
+        ("backtest.all_starts", lambda: run_rolling_backtest(data, weights, AMOUNT, PURCHASE, YEARS, storage=storage), 1, "backtest"),
+    ]
+    for paths in MC_PATHS:
+        cases.append((f"montecarlo.{paths}", lambda paths=paths: run_monte_carlo(
+            tables, weights, AMOUNT, PURCHASE, YEARS, n_paths=paths, workers=1, storage=storage), paths, "path"))
+    cases.append(("grid.full", lambda: evaluate_grid(data), int(grid_offsets()[-1]), "cell"))
+    return cases
+
+
+def run_benchmarks(repeat=REPEAT, only=None):
+    cache_dir = tempfile.mkdtemp(prefix="ffcalc-bench-")
+    try:
+        results = {}
+        for name, function, units, unit in benchmark_cases(cache_dir):
+            # Kalibracja jest potrzebna do normalizacji także przy --only
+            if only and name != CALIBRATION and not any(pattern in name for pattern in only):
+                continue
+            if name.startswith("import."):
+                samples = [function() for _ in range(repeat)]
+                result = dict(summarize([s["seconds"] for s in samples]), peakBytes=max(s["peakBytes"] for s in samples))
+            else:
+                result = measure_call(function, repeat)
+            results[name] = dict(result, throughput=units / result["seconds"], unit=f"{unit}/s")
+        return results
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count()
+    }
+
+
+def speed_factor(results, baseline):
+    # Ile razy wolniej niż przy zapisie linii bazowej działa teraz maszyna
+    if CALIBRATION in results and CALIBRATION in baseline:
+        return results[CALIBRATION]["seconds"] / baseline[CALIBRATION]["seconds"]
+    return 1.0
+
+
+def time_ratio(result, reference, factor):
+    return result["seconds"] / reference["seconds"] / factor
+
+
+def allowed_ratio(result, reference, threshold):
+    # Próg czasu nie mniejszy niż NOISE_FACTOR × rozrzut pomiaru
+    noise = max(result.get("noise", 0.0), reference.get("noise", 0.0))
+    return 1 + max(threshold, NOISE_FACTOR * noise)
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    # Zwraca listę regresji: (nazwa, miara, stosunek do linii bazowej, dopuszczalny stosunek)
+    regressions = []
+    factor = speed_factor(results, baseline)
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None or name == CALIBRATION:
+            continue
+        if reference["seconds"] > 0:
+            ratio, allowed = time_ratio(result, reference, factor), allowed_ratio(result, reference, threshold)
+            if ratio > allowed:
+                regressions.append((name, "seconds", ratio, allowed))
+        if reference["peakBytes"] > 0 and result["peakBytes"] / reference["peakBytes"] > 1 + threshold:
+            regressions.append((name, "peakBytes", result["peakBytes"] / reference["peakBytes"], 1 + threshold))
+    return regressions
+
+
+def _format_bytes(value):
+    return f"{value / 2 ** 20:8.2f} MB"
+
+
+def report(results, baseline):
+    # vs baza: czas względem linii bazowej po normalizacji kalibracją
+    factor = speed_factor(results, baseline)
+    lines = [f"{'ścieżka':<22}{'czas':>12}{'rozrzut':>9}{'przepustowość':>22}{'pamięć':>12}{'vs baza':>10}"]
+    for name, result in results.items():
+        reference = baseline.get(name)
+        ratio = f"{time_ratio(result, reference, factor):9.2f}x" if reference else f"{'-':>10}"
+        lines.append(f"{name:<22}{result['seconds'] * 1000:10.2f}ms{result.get('noise', 0.0):8.1%}"
+                     f"{result['throughput']:>15.0f} {result['unit']:<6}{_format_bytes(result['peakBytes']):>12}{ratio}")
+    if baseline:
+        lines.append(f"Kalibracja: maszyna {factor:.2f}x czasu z linii bazowej")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python benchmarks/run.py", description="Benchmarki kalkulatora Fifty/Fifty")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="plik linii bazowej (JSON)")
+    parser.add_argument("--save-baseline", action="store_true", help="zapisz wyniki jako nową linię bazową")
+    parser.add_argument("--check", action="store_true", help="porównaj z linią bazową (domyślnie)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="minimalny dopuszczalny wzrost czasu i pamięci (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--only", nargs="*", help="tylko ścieżki zawierające podane fragmenty nazw")
+    parser.add_argument("--output", help="zapisz wyniki do pliku JSON")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.only)
+    document = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+            f.write("\n")
+        print(report(results, {}))
+        print(f"Zapisano linię bazową: {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(report(results, {}))
+        print(f"Brak linii bazowej {args.baseline} - uruchom z --save-baseline")
+        return 0
+    print(report(results, baseline["results"]))
+    if baseline.get("environment") != document["environment"]:
+        print("Uwaga: linia bazowa pochodzi z innego środowiska")
+
+    regressions = compare(results, baseline["results"], args.threshold)
+    for name, key, ratio, allowed in regressions:
+        print(f"REGRESJA {name}: {key} {ratio:.2f}x linii bazowej (próg {allowed:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
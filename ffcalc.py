@@ -1,182 +1,588 @@
+import html
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from fifty_fifty import (deposit_tariffs, format_eur, get_agio, get_components, get_current_tariff,
+                         get_metals, strategies)
+from fifty_fifty.backtest import metal_weights, run_backtest, run_rolling_backtest
+from fifty_fifty.compare import compare_strategies, weight_matrix
+from fifty_fifty.core import METAL_COLORS, PRICE_COLUMNS
+from fifty_fifty.deposits import cost_curve, curve_value, percent_rate
+from fifty_fifty.export import EXPORT_FORMATS, ExportJobs
+from fifty_fifty.fees import storage_profile, total_cost_of_ownership
+from fifty_fifty.grid import evaluate_grid, grid_offsets
+from fifty_fifty.lod import lod_trace
+from fifty_fifty.montecarlo import block_tables, run_monte_carlo, weekly_log_returns
+from fifty_fifty.price_store import LBMA_PATH, open_store
+from fifty_fifty.profiling import ENABLED as PROFILING, export_json, finish_run, instrument, section, start_run
+from fifty_fifty.rebalance import REBALANCE_MODES, band_sweep, simulate_rebalancing
+from fifty_fifty.risk import periods_per_year, risk_report
+from fifty_fifty.schedule import (MONTHS_PER_YEAR, SCHEDULE_KINDS, WEEKLY, WEEKS_PER_YEAR, make_schedule,
+                                  schedule_rows)
+
 # Ustaw konfigurację strony
 st.set_page_config(page_title="Kalkulator Strategii Fifty/Fifty", 
                    layout="wide",
                    initial_sidebar_state="expanded")
 
-# Niestandardowa funkcja formatowania EUR bez użycia locale
-def format_eur(value):
-    if isinstance(value, (int, float)):
-        return f"{int(value):,} €".replace(",", " ")
-    return f"0 €"
-
-# Definicja strategii
-strategies = [
-    {
-        "name": "START",
-        "minValue": 5000,
-        "maxValue": 10000,
-        "description": "Fundamentalny pierwszy krok w budowaniu trwałego, materialnego majątku zabezpieczonego przed inflacją",
-        "minPurchase": 100,
-        "maxPurchase": 500,
-        "minYears": 7,
-        "maxYears": 30,
-        "yearsDescription": "Horyzont czasowy 7-30+ lat stanowi perspektywę dla budowy solidnych podstaw majątkowych",
-        "step": 250
-    },
-    {
-        "name": "BALANCE",
-        "minValue": 10000,
-        "maxValue": 100000,
-        "description": "Zaawansowana dywersyfikacja majątku poprzez zrównoważoną alokację kapitału między różne klasy metali",
-        "minPurchase": 250,
-        "maxPurchase": 2500,
-        "minYears": 7,
-        "maxYears": 30,
-        "yearsDescription": "Perspektywa 7-30+ lat to początek drogi ku stworzeniu trwałego majątku rodzinnego",
-        "step": 500
-    },
-    {
-        "name": "FOUNDATION",
-        "minValue": 100000,
-        "maxValue": 700000,
-        "description": "Kompleksowe rozwiązanie dla budowania solidnego fundamentu majątkowego opartego na materialnych aktywach",
-        "minPurchase": 500,
-        "maxPurchase": 5000,
-        "minYears": 15,
-        "maxYears": 30,
-        "yearsDescription": "Horyzont 15-30+ lat to optymalny okres dla ukazania pełnego potencjału strategii",
-        "step": 5000
-    },
-    {
-        "name": "OPTIMAL",
-        "minValue": 700000,
-        "maxValue": 2100000,
-        "description": "Zaawansowane rozwiązanie dla tworzenia znaczącego majątku materialnego o najwyższym stopniu odporności",
-        "minPurchase": 1000,
-        "maxPurchase": 20000,
-        "minYears": 15,
-        "maxYears": 30,
-        "yearsDescription": "Perspektywa 15-30+ lat stanowi ramę czasową dla strategicznego rozwoju portfela",
-        "step": 10000
-    },
-    {
-        "name": "PRESTIGE",
-        "minValue": 2100000,
-        "maxValue": 5000000,
-        "description": "Kwintesencja budowania dynastycznego majątku materialnego z dominującym udziałem metali strategicznych",
-        "minPurchase": 2500,
-        "maxPurchase": 50000,
-        "minYears": 20,
-        "maxYears": 30,
-        "yearsDescription": "Perspektywa 20-30+ lat odzwierciedla horyzont planowania ponadpokoleniowego majątku",
-        "step": 25000
-    }
-]
-
-# Informacje o taryfach depozytowych
-deposit_tariffs = {
-    "START": [
-        {
-            "name": "GTSmart",
-            "minValue": 5000,
-            "maxValue": 10000,
-            "agio": "3,5% kwoty aktywacji",
-            "metals": "40% złoto, 20% srebro, 20% platyna, 20% pallad",
-            "storage": "1,5% netto + VAT rocznie",
-            "advantages": ["Niski próg wejścia", "Prostota zarządzania", "Ekspozycja na podstawowe metale szlachetne", "Zakupy dodatkowe możliwe bez AGIO", "Efekt Kursu Średniego"],
-            "details": "Zakupy dodatkowe: 100-500 EUR/tygodniowo bez AGIO"
-        }
-    ],
-    "BALANCE": [
-        {
-            "name": "GTSmart + GRatio S-3",
-            "minValue": 10000,
-            "maxValue": 30000,
-            "agio": "3,5% dla SSW + 300 EUR (stała kwota) dla Auvesta",
-            "metals": "GTS: 40% złoto, 20% srebro, 20% platyna, 20% pallad | GR: 50% złoto, 50% srebro",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,08% netto + VAT miesięcznie",
-            "advantages": ["Równowaga między dostawcami", "Dywersyfikacja metali", "AGIO w GR zwracane w 100% jako bonus metali", "Zakupy dodatkowe bez AGIO"],
-            "details": "Podział 50/50 między SSW (GTS) i Auvesta (GR). Zakupy dodatkowe: 250-2.500 EUR/tydzień bez AGIO."
-        },
-        {
-            "name": "GTSmart + GRatio M-6",
-            "minValue": 30000,
-            "maxValue": 50000,
-            "agio": "3,5% dla SSW + 600 EUR (stała kwota) dla Auvesta",
-            "metals": "GTS: 40% złoto, 20% srebro, 20% platyna, 20% pallad | GR: 50% złoto, 50% srebro",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,07% netto + VAT miesięcznie",
-            "advantages": ["Równowaga między dostawcami", "Dywersyfikacja metali", "AGIO w GR zwracane w 100% jako bonus metali", "Ceny zakupu metali: 1% taniej od taryfy S-3"],
-            "details": "Podział 50/50 między SSW (GTS) i Auvesta (GR). Zakupy dodatkowe: 250-2.500 EUR/tydzień bez AGIO."
-        },
-        {
-            "name": "GTSmart + GRatio L-12",
-            "minValue": 50000,
-            "maxValue": 100000,
-            "agio": "3,5% dla SSW + 1.200 EUR (stała kwota) dla Auvesta",
-            "metals": "GTS: 40% złoto, 20% srebro, 20% platyna, 20% pallad | GR: 50% złoto, 50% srebro",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,06% netto + VAT miesięcznie",
-            "advantages": ["Równowaga między dostawcami", "Dywersyfikacja metali", "AGIO w GR zwracane w 100% jako bonus metali", "Ceny zakupu metali: 3% taniej od taryfy S-3"],
-            "details": "Podział 50/50 między SSW (GTS) i Auvesta (GR). Zakupy dodatkowe: 250-2.500 EUR/tydzień bez AGIO."
-        }
-    ],
-    "FOUNDATION": [
-        {
-            "name": "GT + 3 x GR XL-24",
-            "minValue": 100000,
-            "maxValue": 300000,
-            "agio": "3,5% dla SSW + 2.400 EUR (stała kwota) dla Auvesta",
-            "metals": "GT: 20% złoto, 10% srebro, 10% platyna, 10% pallad, 50% metale strategiczne | GR: 50% złoto, 50% srebro",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,05% netto + VAT miesięcznie",
-            "advantages": ["Dostęp do metali strategicznych", "Optymalne koszty magazynowania", "AGIO w GR zwracane w 100% jako bonus metali", "Ceny zakupu metali: 6% taniej od taryfy S-3"],
-            "details": "Podział 50/50 między SSW (GT) i Auvesta (GR). Zakupy dodatkowe: 500-5.000 EUR/tydzień bez AGIO."
-        },
-        {
-            "name": "GT + 6 x GR XL-24 lub 2 x GR VIP",
-            "minValue": 300000,
-            "maxValue": 700000,
-            "agio": "3,5% dla SSW + 2.400 EUR (stała kwota) dla Auvesta",
-            "metals": "GT: 20% złoto, 10% srebro, 10% platyna, 10% pallad, 50% metale strategiczne | GR: 50% złoto, 50% srebro",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,04% netto + VAT miesięcznie",
-            "advantages": ["Dostęp do metali strategicznych", "Optymalne koszty magazynowania", "AGIO w GR zwracane w 100% jako bonus metali", "Ceny zakupu metali: 7% taniej od taryfy S-3"],
-            "details": "Podział 50/50 między SSW (GT) i Auvesta (GR). Zakupy dodatkowe: 500-5.000 EUR/tydzień bez AGIO."
-        }
-    ],
-    "OPTIMAL": [
-        {
-            "name": "GT + 6 x GR VIP",
-            "minValue": 700000,
-            "maxValue": 2100000,
-            "agio": "3,5% dla SSW + 2.400 EUR za każde 150.000 EUR dla Auvesta",
-            "metals": "GT: 20% złoto, 10% srebro, 10% platyna, 10% pallad, 50% metale strategiczne | GR: 50% złoto, 50% srebro",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,04% netto + VAT miesięcznie",
-            "advantages": ["Maksymalna efektywność kosztowa", "Idealna dywersyfikacja", "Dostęp do taryf VIP", "Ceny zakupu metali: 7% taniej od taryfy S-3"],
-            "details": "Podział 50/50 między SSW (GT) i Auvesta (GR). Dla kwot powyżej 900.000 EUR zalecany podział na maksymalnie 6 depozytów VIP. Zakupy dodatkowe: 1.000-20.000 EUR/tydzień bez AGIO."
-        }
-    ],
-    "PRESTIGE": [
-        {
-            "name": "GTSmart + GT + 6 x GR VIP + SMH",
-            "minValue": 2100000,
-            "maxValue": 5000000,
-            "agio": "3,5% dla SSW (GTS, GT) + 2.400 EUR za każde 150.000 EUR dla Auvesta + 0% dla SMH",
-            "metals": "Złożony portfel w proporcjach: 10% GTS, 20% GT, 30% GR, 40% SMH",
-            "storage": "SSW: 1,5% netto + VAT rocznie | Auvesta: 0,04% netto + VAT miesięcznie",
-            "advantages": ["Maksymalna dywersyfikacja", "Dominujący udział metali strategicznych (SMH)", "Najniższe koszty utrzymania", "Dedykowany komponent dla metali strategicznych"],
-            "details": "Podział: 10% GTS, 20% GT, 30% GR, 40% SMH. Zakupy dodatkowe: 2.500-50.000 EUR/tydzień bez AGIO."
-        }
-    ]
+# Profilowanie przebiegu - aktywne tylko z FFCALC_PROFILE=1
+start_run()
+get_agio, get_components, get_current_tariff, get_metals = (
+    instrument()(function) for function in (get_agio, get_components, get_current_tariff, get_metals)
+)
+
+@instrument(st.cache_resource)
+def get_price_data():
+    return open_store(LBMA_PATH)
+
+@instrument(st.cache_resource)
+def get_grid():
+    return evaluate_grid(get_price_data()), grid_offsets()
+
+@instrument(st.cache_resource)
+def get_cost_curves():
+    # Programowanie dynamiczne podziału depozytów liczone raz dla wszystkich strategii
+    return {s["name"]: cost_curve(s["name"]) for s in strategies}
+
+@instrument(st.cache_resource)
+def get_export_jobs():
+    # Jedna ograniczona pula eksportów dla wszystkich sesji
+    return ExportJobs()
+
+@instrument(st.cache_resource)
+def get_block_tables():
+    return block_tables(weekly_log_returns(get_price_data()))
+
+@instrument(st.cache_data(show_spinner=False))
+def get_rebalancing(strategy_name, amount, purchase, years, mode, band, months):
+    data = get_price_data()
+    weights, _ = metal_weights(get_metals(strategy_name, amount), data["columns"])
+    return (simulate_rebalancing(data, weights, amount, purchase, years, mode, band, months),
+            band_sweep(data, weights, amount, purchase, years), weights)
+
+@instrument(st.cache_data(show_spinner=False))
+def get_risk_report(amount, window_years):
+    data = get_price_data()
+    window = int(round(window_years * periods_per_year(data["days"])))
+    return risk_report(data, weight_matrix(data, amount), window)
+
+@instrument(st.cache_resource)
+def get_price_labels():
+    # Nazwy metali dla kolumn cen LBMA
+    column_names = {column: name for name, column in PRICE_COLUMNS.items()}
+    return [column_names.get(column, column) for column in get_price_data()["columns"]]
+
+@instrument(st.cache_data(show_spinner=False))
+def get_backtest(strategy_name, amount, purchase, years, storage_mode, schedule=WEEKLY):
+    # Backtest zakupów wg harmonogramu (purchase na termin) na historycznych cenach LBMA
+    data = get_price_data()
+    weights, coverage = metal_weights(get_metals(strategy_name, amount), data["columns"])
+    storage = storage_profile(strategy_name, amount)
+    backtest = run_backtest(data, weights, amount, purchase, years, storage=storage, storage_mode=storage_mode,
+                            schedule=schedule)
+    rolling = run_rolling_backtest(data, weights, amount, purchase, years, storage=storage,
+                                   storage_mode=storage_mode, schedule=schedule)
+    ownership_cost = total_cost_of_ownership(get_agio(strategy_name, amount), backtest["storageByComponent"],
+                                             backtest["costBasis"][-1], storage["names"])
+    return backtest, rolling, coverage, ownership_cost
+
+# Projekcja Monte Carlo (bootstrap blokowy tygodniowych zwrotów)
+@instrument(st.cache_data(show_spinner="Symulacja Monte Carlo..."))
+def get_projection(strategy_name, amount, purchase, years, storage_mode):
+    weights, _ = metal_weights(get_metals(strategy_name, amount), get_price_data()["columns"])
+    return run_monte_carlo(get_block_tables(), weights, amount, purchase, years,
+                           storage=storage_profile(strategy_name, amount), storage_mode=storage_mode)
+
+@instrument(st.cache_data(show_spinner=False))
+def get_comparison(amount, purchase, years, storage_mode):
+    # Wszystkie strategie w jednym przebiegu na wspólnej macierzy cen
+    return compare_strategies(get_price_data(), amount, purchase, years, storage_mode)
+
+# Wykresy zapamiętywane per zestaw parametrów i współdzielone przez sesje - ponowne
+# wykonanie skryptu z tymi samymi ustawieniami nie buduje figur od nowa.
+# Zwrócone figury są tylko do odczytu.
+STRATEGY_COLORS = ["#F2C94C", "#27AE60", "#2F80ED", "#9B51E0", "#EB5757"]
+FIGURE_CACHE_SIZE = 64
+LEGEND = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
+MARGIN = dict(l=20, r=20, t=20, b=20)
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def allocation_figure(strategy_name, kind):
+    # Udziały procentowe nie zależą od kwoty
+    rows = get_metals(strategy_name, 0) if kind == "metals" else get_components(strategy_name, 0)
+    fig = px.pie(
+        pd.DataFrame(rows),
+        values='value',
+        names='name',
+        color='name',
+        color_discrete_map={row["name"]: row["color"] for row in rows},
+        hole=0.3
+    )
+    fig.update_traces(textinfo='percent+label', textfont_size=12)
+    fig.update_layout(height=500, margin=MARGIN, legend=LEGEND)
+    return fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def rebalancing_figures(strategy_name, amount, purchase, years, mode, band, months):
+    rebalancing, sweep, target_weights = get_rebalancing(strategy_name, amount, purchase, years, mode, band, months)
+    weights_fig = go.Figure()
+    for index, label in enumerate(get_price_labels()):
+        if target_weights[index] == 0:
+            continue
+        color = METAL_COLORS.get(label)
+        weights_fig.add_trace(lod_trace(rebalancing["dates"], rebalancing["weights"][:, index] * 100,
+                                        name=label, line=dict(color=color, width=1.5)))
+        weights_fig.add_hline(y=target_weights[index] * 100, line=dict(color=color, dash="dot", width=1))
+    weights_fig.update_layout(height=400, margin=MARGIN, yaxis_title="Udział w portfelu (%)", legend=LEGEND)
+
+    sweep_fig = go.Figure()
+    sweep_fig.add_trace(go.Bar(x=sweep["bands"] * 100, y=sweep["turnoverPercent"], name="Obrót (% wpłat)",
+                               marker_color="#2F80ED"))
+    sweep_fig.add_trace(go.Scatter(x=sweep["bands"] * 100, y=sweep["rebalances"], name="Rebalancingi",
+                                   yaxis="y2", line=dict(color="#EB5757")))
+    sweep_fig.update_layout(
+        height=350,
+        margin=MARGIN,
+        xaxis_title="Pasmo odchylenia (pkt %)",
+        yaxis=dict(title="Obrót (% wpłat)"),
+        yaxis2=dict(title="Rebalancingi", overlaying="y", side="right"),
+        legend=LEGEND
+    )
+    return weights_fig, sweep_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def risk_figures(strategy_index, amount, window_years):
+    risk = get_risk_report(amount, window_years)
+    volatility_fig = go.Figure()
+    for index, s in enumerate(strategies):
+        volatility_fig.add_trace(lod_trace(
+            risk["rollingDates"],
+            risk["rollingVolatility"][:, index] * 100,
+            name=s["name"],
+            line=dict(color=STRATEGY_COLORS[index], width=2.5 if index == strategy_index else 1)
+        ))
+    volatility_fig.update_layout(height=400, margin=MARGIN, yaxis_title="Zmienność roczna (%)", legend=LEGEND)
+
+    price_labels = get_price_labels()
+    correlation_fig = go.Figure()
+    for index, (first, second) in enumerate(risk["pairs"]):
+        correlation_fig.add_trace(lod_trace(
+            risk["rollingDates"],
+            risk["rollingCorrelation"][:, index],
+            name=f"{price_labels[first]} / {price_labels[second]}",
+            line=dict(width=1)
+        ))
+    correlation_fig.update_layout(height=400, margin=MARGIN, yaxis=dict(title="Korelacja", range=[-1, 1]), legend=LEGEND)
+    return volatility_fig, correlation_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def cost_heatmap_figure(strategy_index, purchase):
+    # Mapa kosztów z prekomputowanej siatki wszystkich pozycji suwaków
+    grid, offsets = get_grid()
+    strategy_grid = grid[offsets[strategy_index]:offsets[strategy_index + 1]]
+    strategy_grid = strategy_grid[strategy_grid["purchase"] == purchase]
+    grid_amounts = np.unique(strategy_grid["amount"])
+    grid_years = np.unique(strategy_grid["years"])
+    cost_share = (strategy_grid["effectiveAgio"] / strategy_grid["projected"] * 100).reshape(len(grid_amounts), len(grid_years))
+    heatmap_fig = go.Figure(go.Heatmap(
+        x=grid_amounts,
+        y=grid_years,
+        z=cost_share.T,
+        colorscale="YlGn_r",
+        colorbar=dict(title="% wpłat"),
+        hovertemplate="Kwota: %{x:,.0f} €<br>Lata: %{y}<br>Efektywne AGIO: %{z:.2f}% wpłat<extra></extra>"
+    ))
+    heatmap_fig.update_layout(height=400, margin=MARGIN, xaxis_title="Kwota alokacji", yaxis_title="Lata")
+    return heatmap_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def agio_curve_figure(strategy_index):
+    # Odcinkowo stała krzywa AGIO początkowego: taryfa standardowa i optymalny podział depozytów
+    strategy_name = strategies[strategy_index]["name"]
+    curve = get_cost_curves()[strategy_name]
+    amounts = np.append(curve["amounts"], strategies[strategy_index]["maxValue"])
+    linear = amounts * percent_rate(strategy_name)
+    curve_fig = go.Figure()
+    for key, label, color in (("standardFees", "Taryfa standardowa", "#EB5757"),
+                              ("optimalFees", "Optymalny podział depozytów", "#27AE60")):
+        fees = np.append(curve[key], curve[key][-1])
+        curve_fig.add_trace(go.Scatter(
+            x=amounts, y=fees + linear, name=label, line=dict(color=color, shape="hv"),
+            hovertemplate="Kwota: %{x:,.0f} €<br>AGIO: %{y:,.0f} €<extra></extra>"
+        ))
+    for cliff, jump in zip(curve["cliffAmounts"], curve["cliffJumps"]):
+        curve_fig.add_vline(x=cliff, line=dict(color="#828282", dash="dot", width=1),
+                            annotation_text=f"+{jump:,.0f} €", annotation_font_size=10)
+    curve_fig.update_layout(height=400, margin=MARGIN, xaxis_title="Kwota alokacji",
+                            yaxis_title="AGIO początkowe (€)", legend=LEGEND)
+    return curve_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def comparison_figure(strategy_index, amount, purchase, years, storage_mode):
+    comparison = get_comparison(amount, purchase, years, storage_mode)
+    comparison_fig = go.Figure()
+    for index, name in enumerate(comparison["names"]):
+        comparison_fig.add_trace(lod_trace(
+            comparison["dates"],
+            comparison["values"][:, index],
+            name=name,
+            line=dict(color=STRATEGY_COLORS[index], width=3 if index == strategy_index else 1.5)
+        ))
+    comparison_fig.add_trace(lod_trace(comparison["dates"], comparison["invested"], name="Wpłacony kapitał",
+                                       line=dict(color="#828282", dash="dot")))
+    comparison_fig.update_layout(height=450, margin=MARGIN, legend=LEGEND)
+    return comparison_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def rolling_figure(strategy_name, amount, purchase, years, storage_mode, schedule):
+    # Zakres historyczny - wynik planu dla każdej możliwej daty startu
+    _, rolling, _, _ = get_backtest(strategy_name, amount, purchase, years, storage_mode, schedule)
+    rolling_fig = go.Figure()
+    rolling_fig.add_trace(lod_trace(rolling["startDates"], rolling["finalValue"], method="minmax", name="Wartość końcowa", line=dict(color="#2F80ED")))
+    for percentile, dash in [(5, "dot"), (50, "dash"), (95, "dot")]:
+        rolling_fig.add_hline(y=rolling["percentiles"][percentile], line_dash=dash, line_color="#27AE60",
+                              annotation_text=f"P{percentile}", annotation_position="right")
+    rolling_fig.add_hline(y=rolling["invested"], line_color="#F2C94C", annotation_text="Wpłaty", annotation_position="left")
+    rolling_fig.update_layout(height=350, margin=MARGIN, xaxis_title="Data startu", showlegend=False)
+    return rolling_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def backtest_figure(strategy_name, amount, purchase, years, storage_mode, schedule, x_range):
+    # Seria jest zmniejszana do LOD_POINTS punktów w widocznym zakresie
+    backtest, _, _, _ = get_backtest(strategy_name, amount, purchase, years, storage_mode, schedule)
+    backtest_fig = go.Figure()
+    backtest_fig.add_trace(lod_trace(backtest["dates"], backtest["netValue"], x_range=x_range, name="Wartość netto", line=dict(color="#2F80ED")))
+    backtest_fig.add_trace(lod_trace(backtest["dates"], backtest["costBasis"], x_range=x_range, name="Wpłacony kapitał", line=dict(color="#F2C94C")))
+    backtest_fig.add_trace(lod_trace(backtest["dates"], backtest["storageFees"], x_range=x_range, name="Koszty magazynowania (narastająco)", line=dict(color="#EB5757")))
+    backtest_fig.update_layout(
+        height=400,
+        xaxis_range=[str(x_range[0]), str(x_range[1])],
+        margin=MARGIN,
+        legend=LEGEND
+    )
+    return backtest_fig
+
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def projection_figure(strategy_name, amount, purchase, years, storage_mode):
+    projection = get_projection(strategy_name, amount, purchase, years, storage_mode)
+    projection_fig = go.Figure()
+    projection_fig.add_trace(go.Scatter(x=projection["years"], y=projection["percentiles"][95], name="P95", line=dict(color="#2F80ED", width=0)))
+    projection_fig.add_trace(go.Scatter(x=projection["years"], y=projection["percentiles"][5], name="P5-P95", fill="tonexty", fillcolor="rgba(47, 128, 237, 0.2)", line=dict(color="#2F80ED", width=0)))
+    projection_fig.add_trace(go.Scatter(x=projection["years"], y=projection["percentiles"][50], name="Mediana", line=dict(color="#2F80ED")))
+    projection_fig.add_trace(go.Scatter(x=projection["years"], y=projection["invested"], name="Wpłacony kapitał", line=dict(color="#F2C94C")))
+    projection_fig.update_layout(height=400, margin=MARGIN, xaxis_title="Lata", legend=LEGEND)
+    return projection_fig
+
+CARD_STYLES = {
+    True: "background-color: #E6F3FF; padding: 20px; border-radius: 10px; margin-bottom: 20px; border-left: 4px solid #0066CC;",
+    False: "background-color: #FFFFFF; padding: 20px; border-radius: 10px; margin-bottom: 20px; border: 1px solid #E0E0E0;"
 }
+CARD_BADGES = {
+    True: '<span style="background-color: #E6F9E8; color: #219653; padding: 4px 10px; border-radius: 6px;">✓ Dostępna dla aktualnej kwoty</span>',
+    False: '<span style="background-color: #E6F0FF; color: #2F80ED; padding: 4px 10px; border-radius: 6px;">Poza aktualnym zakresem</span>'
+}
+
+def tariff_card(tariff, is_current):
+    advantages = "".join(f"<li>{html.escape(advantage)}</li>" for advantage in tariff["advantages"])
+    return f'''
+        <div style="{CARD_STYLES[is_current]}">
+            <div style="display: flex; justify-content: space-between; align-items: center; flex-wrap: wrap;">
+                <h3 style="margin: 0;">{html.escape(tariff["name"])}</h3>{CARD_BADGES[is_current]}
+            </div>
+            <p>Kwota: {format_eur(tariff["minValue"])} - {format_eur(tariff["maxValue"])}</p>
+            <div style="display: flex; gap: 20px; flex-wrap: wrap;">
+                <div style="flex: 1; min-width: 240px;">
+                    <p><b>AGIO:</b><br>{html.escape(tariff["agio"])}</p>
+                    <p><b>Koszty magazynowania:</b><br>{html.escape(tariff["storage"])}</p>
+                </div>
+                <div style="flex: 1; min-width: 240px;">
+                    <p><b>Alokacja metali:</b><br>{html.escape(tariff["metals"])}</p>
+                </div>
+            </div>
+            <p style="margin-bottom: 0;"><b>Zalety:</b></p>
+            <ul>{advantages}</ul>
+            <p style="margin-bottom: 0;"><b>Szczegóły:</b> {html.escape(tariff["details"])}</p>
+        </div>
+        '''
+
+# Karty taryf budowane raz na strategię w obu wariantach (aktualna / poza zakresem) -
+# zmiana kwoty wybiera tylko warianty, zmiana horyzontu nie dotyka kart
+@instrument(st.cache_resource(max_entries=FIGURE_CACHE_SIZE))
+def tariff_cards(strategy_name):
+    return [
+        (tariff["minValue"], tariff["maxValue"], {is_current: tariff_card(tariff, is_current) for is_current in (True, False)})
+        for tariff in deposit_tariffs.get(strategy_name, [])
+    ]
+
+# Fragmenty z własnymi kontrolkami - zmiana kontrolki wewnątrz fragmentu wykonuje
+# ponownie tylko ten fragment, a nie cały skrypt
+@st.fragment
+@instrument()
+def rebalancing_section(strategy_name, amount, purchase, years):
+    st.subheader("Dryf wag i rebalancing")
+    mode_labels = {"calendar": "Kalendarzowy", "band": "Pasmo odchylenia", "cashflow": "Tylko zakupy"}
+    rebalance_col1, rebalance_col2 = st.columns(2)
+    with rebalance_col1:
+        rebalance_mode = st.radio("Tryb rebalancingu:", options=list(REBALANCE_MODES),
+                                  format_func=mode_labels.get, index=1, horizontal=True)
+    with rebalance_col2:
+        rebalance_band = st.slider("Pasmo odchylenia wagi (pkt %):", min_value=1, max_value=20, value=5,
+                                   disabled=rebalance_mode != "band") / 100
+        rebalance_months = st.select_slider("Co ile miesięcy:", options=[1, 3, 6, 12, 24], value=12,
+                                            disabled=rebalance_mode != "calendar")
+
+    rebalancing, _, _ = get_rebalancing(strategy_name, amount, purchase, years,
+                                        rebalance_mode, rebalance_band, rebalance_months)
+    metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+    metric_col1.metric("Rebalancingi", rebalancing["rebalances"])
+    metric_col2.metric("Transakcje", rebalancing["trades"])
+    metric_col3.metric("Obrót", format_eur(rebalancing["turnover"]), f"{rebalancing['turnoverPercent']:.1f}% wpłat",
+                       delta_color="off")
+    metric_col4.metric("Maks. odchylenie wagi", f"{rebalancing['maxDrift']:.1%}")
+
+    weights_fig, sweep_fig = rebalancing_figures(strategy_name, amount, purchase, years,
+                                                 rebalance_mode, rebalance_band, rebalance_months)
+    st.plotly_chart(weights_fig, use_container_width=True)
+    st.plotly_chart(sweep_fig, use_container_width=True)
+    st.caption(
+        "Wagi metali z notowaniami LBMA (metale strategiczne pominięte), bez kosztów transakcyjnych i magazynowania. "
+        "Obrót jednostronny: wartość sprzedaży pokrywającej zakupy przy przywracaniu wag."
+    )
+
+@st.fragment
+@instrument()
+def risk_section(strategy_index, amount):
+    st.header("Ryzyko mieszanek metali")
+
+    risk_window = st.select_slider(
+        "Okno kroczące (lata):",
+        options=[0.25, 0.5, 1, 2, 3, 5],
+        value=1
+    )
+    risk = get_risk_report(amount, risk_window)
+
+    risk_table = pd.DataFrame({
+        "Strategia": [s["name"] for s in strategies],
+        "Zmienność roczna": [f"{value:.1%}" for value in risk["volatility"]],
+        "Średni zwrot roczny": [f"{value:.1%}" for value in risk["meanReturn"]],
+        "Zwrot / zmienność": [f"{value:.2f}" for value in risk["sharpe"]],
+        "Maks. obsunięcie": [f"{value:.1%}" for value in risk["maxDrawdown"]]
+    })
+    st.dataframe(risk_table, hide_index=True, use_container_width=True)
+
+    price_labels = get_price_labels()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Metale - pełna historia")
+        st.dataframe(pd.DataFrame({
+            "Metal": price_labels,
+            "Zmienność roczna": [f"{value:.1%}" for value in risk["metalVolatility"]],
+            "Średni zwrot roczny": [f"{value:.1%}" for value in risk["metalMeanReturn"]],
+            "Maks. obsunięcie": [f"{value:.1%}" for value in risk["metalDrawdown"]]
+        }), hide_index=True, use_container_width=True)
+    with col2:
+        st.subheader("Korelacja metali - pełna historia")
+        st.dataframe(pd.DataFrame(risk["metalCorrelation"], index=price_labels, columns=price_labels).round(2),
+                     use_container_width=True)
+
+    volatility_fig, correlation_fig = risk_figures(strategy_index, amount, risk_window)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Zmienność krocząca")
+        st.plotly_chart(volatility_fig, use_container_width=True)
+    with col2:
+        st.subheader("Korelacja krocząca metali")
+        st.plotly_chart(correlation_fig, use_container_width=True)
+
+    st.caption(
+        "Dzienne log-zwroty z notowań LBMA w EUR dla mieszanek o stałych wagach metali, bez kosztów. "
+        "Zwrot / zmienność to średni roczny log-zwrot podzielony przez zmienność roczną (bez stopy wolnej od ryzyka)."
+    )
+
+@st.fragment
+@instrument()
+def backtest_section(strategy_name, amount, purchase, years, storage_mode, schedule):
+    backtest, _, coverage, _ = get_backtest(strategy_name, amount, purchase, years, storage_mode, schedule)
+    st.header("Backtest historyczny")
+    backtest_range = st.slider(
+        "Zakres wykresu:",
+        min_value=backtest["dates"][0].astype(object),
+        max_value=backtest["dates"][-1].astype(object),
+        value=(backtest["dates"][0].astype(object), backtest["dates"][-1].astype(object)),
+        format="YYYY-MM-DD"
+    )
+    st.plotly_chart(backtest_figure(strategy_name, amount, purchase, years, storage_mode, schedule, backtest_range),
+                    use_container_width=True)
+    st.caption(
+        f"Zakupy {schedule_label(schedule)} po {format_eur(purchase)} od {backtest['dates'][0]} do {backtest['dates'][-1]} "
+        "wg fixingów LBMA w EUR. "
+        f"Backtest obejmuje {coverage:.0%} alokacji (złoto, srebro, platyna, pallad) - metale strategiczne nie mają historii cen. "
+        f"Wartości uwzględniają koszty magazynowania (z VAT) naliczane co miesiąc dla każdego komponentu."
+    )
+
+# Sekcje bez własnych kontrolek czytają ustawienia z paska bocznego zapisane w st.session_state
+@st.fragment
+@instrument()
+def tariff_section():
+    plan = st.session_state["plan"]
+    strategy = strategies[plan["strategyIndex"]]
+    amount, purchase = plan["amount"], plan["purchase"]
+    st.header(f"Taryfy depozytowe dla strategii {strategy['name']}")
+    st.markdown("".join(cards[low <= amount <= high] for low, high, cards in tariff_cards(strategy["name"])),
+                unsafe_allow_html=True)
+
+    # Mapa kosztów z prekomputowanej siatki wszystkich pozycji suwaków
+    st.subheader("Mapa kosztów: efektywne AGIO względem kwoty i horyzontu")
+    st.plotly_chart(cost_heatmap_figure(plan["strategyIndex"], purchase), use_container_width=True)
+    st.caption(f"Efektywne AGIO jako odsetek łącznych wpłat (kwota + {format_eur(purchase)}/tydzień) dla każdej pozycji suwaków.")
+
+    # Krzywa kosztów z progami taryf i rekomendacja podziału na depozyty
+    st.subheader("Krzywa AGIO i progi taryf")
+    st.plotly_chart(agio_curve_figure(plan["strategyIndex"]), use_container_width=True)
+    st.caption("Linie przerywane oznaczają progi taryf, na których AGIO początkowe skokowo rośnie.")
+    # Krzywe są już policzone w get_cost_curves() - odczyt odcinka to wyszukiwanie binarne
+    get_cost_curves()
+    split = curve_value(strategy["name"], amount)
+    split_deposits = [
+        f"{component}: " + ", ".join(f"{count} × {name}" for name, count in deposits.items())
+        for component, deposits in split["deposits"].items()
+    ]
+    if split["saving"] >= 0.01 and split_deposits:
+        st.info(f"Podział na depozyty ({'; '.join(split_deposits)}) obniża AGIO początkowe o "
+                f"{format_eur(split['saving'])} do {format_eur(split['optimalAgio'])}. "
+                "Rekomendacja orientacyjna - obliczenia kalkulatora zakładają taryfę standardową.")
+    else:
+        st.caption("Dla tej kwoty podział na kilka depozytów nie obniża AGIO.")
+
+@st.fragment
+@instrument()
+def projection_section():
+    plan = st.session_state["plan"]
+    strategy_name = strategies[plan["strategyIndex"]]["name"]
+    args = strategy_name, plan["amount"], plan["purchase"], plan["years"], plan["storageMode"]
+    projection = get_projection(*args)
+    st.header("Projekcja Monte Carlo")
+    st.plotly_chart(projection_figure(*args), use_container_width=True)
+    st.caption(f"{projection['paths']:,} ścieżek z losowania kwartalnych bloków historycznych tygodniowych zwrotów LBMA (od 1977 r.).".replace(",", " "))
+
+SCHEDULE_LABELS = {"weekly": "Co tydzień", "monthly": "Co miesiąc", "custom": "Własne daty"}
+WEEKDAY_LABELS = ["poniedziałek", "wtorek", "środa", "czwartek", "piątek"]
+# Przykładowe daty własne - dwa zakupy w roku
+DEFAULT_CUSTOM_DATES = "\n".join(f"{year}-{month:02d}-15" for year in range(2010, 2025) for month in (3, 9))
+
+def schedule_label(schedule):
+    if schedule.kind == "weekly":
+        return f"tygodniowe ({WEEKDAY_LABELS[schedule.weekday]})"
+    if schedule.kind == "monthly":
+        return f"miesięczne ({schedule.day}. dnia miesiąca)"
+    return "we własnych terminach"
+
+def schedule_controls(purchase):
+    # Harmonogram zakupów w backtestach i kwota na termin; przy zakupach miesięcznych
+    # domyślnie ten sam budżet roczny co przy tygodniowych
+    schedule_kind = st.selectbox("Harmonogram zakupów (backtest):", options=list(SCHEDULE_KINDS),
+                                 format_func=SCHEDULE_LABELS.get)
+    if schedule_kind == "weekly":
+        weekday = st.selectbox("Dzień zakupu:", options=list(range(len(WEEKDAY_LABELS))),
+                               format_func=lambda day: WEEKDAY_LABELS[day].capitalize())
+        return make_schedule("weekly", weekday=weekday), purchase
+    monthly_purchase = round(purchase * WEEKS_PER_YEAR / MONTHS_PER_YEAR)
+    if schedule_kind == "monthly":
+        day = st.number_input("Dzień miesiąca:", min_value=1, max_value=31, value=1)
+        st.caption(f"Miesięcznie {format_eur(monthly_purchase)} - ten sam budżet roczny co {format_eur(purchase)}/tydzień")
+        return make_schedule("monthly", day=int(day)), monthly_purchase
+
+    dates_text = st.text_area("Daty zakupów (RRRR-MM-DD, jedna w wierszu):", value=DEFAULT_CUSTOM_DATES)
+    term_purchase = st.number_input("Kwota na termin:", min_value=0, value=monthly_purchase, step=100)
+    try:
+        schedule = make_schedule("custom", dates=dates_text.split())
+        terms = len(schedule_rows(get_price_data(), schedule))
+        if terms < 2:
+            raise ValueError("Co najmniej dwie daty muszą mieścić się w historii notowań")
+    except ValueError as error:
+        st.error(f"{error} - backtest używa zakupów tygodniowych.")
+        return WEEKLY, purchase
+    # Horyzont harmonogramu własnego: liczba okresów okna zamiast lat
+    periods = st.number_input("Okresy w oknie backtestu:", min_value=1, max_value=terms - 1, value=terms - 1,
+                              help="Zakres historyczny pokazuje każde okno o tej liczbie okresów między datami")
+    return schedule._replace(periods=int(periods)), float(term_purchase)
+
+def horizon_label(schedule, years):
+    return f"{schedule.periods} okresów" if schedule.kind == "custom" else f"{years} lat"
+
+EXPORT_LABELS = {"xlsx": "Excel (xlsx)", "parquet": "Parquet (zip)"}
+# Co ile tygodni kolejna data startu scenariusza w rejestrze backtestu
+EXPORT_STRIDES = {None: "Ostatnie okno", 52: "Start co rok", 13: "Start co kwartał", 1: "Każdy tydzień startu"}
+EXPORT_POLL_SECONDS = 1
+
+@st.fragment
+@instrument()
+def export_section(strategy_name, amount, purchase, years, storage_mode):
+    export_col1, export_col2, export_col3 = st.columns([2, 2, 1])
+    with export_col1:
+        export_format = st.radio("Format:", options=list(EXPORT_FORMATS), format_func=EXPORT_LABELS.get, horizontal=True)
+    with export_col2:
+        export_stride = st.selectbox("Scenariusze backtestu:", options=list(EXPORT_STRIDES), format_func=EXPORT_STRIDES.get)
+    with export_col3:
+        submitted = st.button("Eksportuj", use_container_width=True)
+    if submitted:
+        try:
+            # Procesy puli otwierają magazyn cen same - bez przesyłania tablic
+            st.session_state["export_job"] = get_export_jobs().submit(
+                export_format, strategy_name, amount, purchase, years, storage_mode, export_stride)
+        except ValueError as error:
+            st.error(str(error))
+            return
+        # Pełny przebieg wyświetla postęp nowego zadania
+        st.rerun()
+
+@st.fragment(run_every=EXPORT_POLL_SECONDS)
+@instrument()
+def export_progress(job_id):
+    # Odpytuje stan zadania w tle; po zakończeniu pełny przebieg pokazuje wynik
+    job = get_export_jobs().status(job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        st.rerun()
+    st.progress(job["progress"], text=job["stage"])
+
+def export_result(job):
+    if job["status"] == "error":
+        st.error(f"Eksport nie powiódł się: {job['error']}")
+        return
+    with open(job["path"], "rb") as f:
+        st.download_button("Pobierz raport", f, file_name=job["fileName"], mime=job["mime"])
+    rows = f"{job['result']['rows']:,}".replace(",", " ")
+    st.caption(f"{job['result']['scenarios']} scenariuszy, {rows} wierszy rejestru, {job['seconds']:.1f} s")
+
+def profile_panel(record):
+    # Czasy sekcji i funkcji ostatniego przebiegu oraz eksport historii przebiegów
+    with st.expander("Profilowanie przebiegu"):
+        st.metric("Czas przebiegu", f"{record['seconds'] * 1000:.0f} ms")
+        sections = pd.DataFrame({
+            "Sekcja": list(record["sections"]),
+            "Czas (ms)": [seconds * 1000 for seconds in record["sections"].values()]
+        })
+        st.dataframe(sections, hide_index=True, use_container_width=True)
+        functions = pd.DataFrame([
+            {"Funkcja": name, "Wywołania": stats["calls"], "Czas (ms)": stats["seconds"] * 1000,
+             "Maks. (ms)": stats["maxSeconds"] * 1000, "Trafienia cache": stats["hits"]}
+            for name, stats in record["functions"].items()
+        ])
+        if not functions.empty:
+            functions = functions.sort_values("Czas (ms)", ascending=False)
+        st.dataframe(functions, hide_index=True, use_container_width=True)
+        st.download_button("Pobierz log (JSON)", export_json(), file_name="ffcalc-profile.json", mime="application/json")
 
 # Tytuł i opis aplikacji
 st.title("Kalkulator Strategii Fifty/Fifty")
 st.markdown("Optymalizacja alokacji aktywów w metale szlachetne i strategiczne")
 
 # Sidebar z konfiguracją strategii
+section("Sidebar")
 with st.sidebar:
     st.header("Konfiguracja STRATEGII")
 
@@ -220,6 +626,7 @@ with st.sidebar:
     st.metric("Tygodniowo", value=format_eur(purchase))
     
     st.caption("Regularne dokupienia metali dla optymalizacji średniej ceny zakupu")
+    schedule, term_purchase = schedule_controls(purchase)
     
     # Perspektywa czasowa
     st.subheader("Perspektywa czasowa")
@@ -237,152 +644,32 @@ with st.sidebar:
     
     st.caption(current_strategy["yearsDescription"])
 
-# Funkcje pomocnicze
-def get_metals(strategy_name, amount):
-    if strategy_name == "START":
-        return [
-            {"name": "Złoto", "value": 40, "amount": amount * 0.4, "color": "#FFD700"},
-            {"name": "Srebro", "value": 20, "amount": amount * 0.2, "color": "#C0C0C0"},
-            {"name": "Platyna", "value": 20, "amount": amount * 0.2, "color": "#E5E4E2"},
-            {"name": "Pallad", "value": 20, "amount": amount * 0.2, "color": "#B9F2FF"}
-        ]
-    elif strategy_name == "BALANCE":
-        return [
-            {"name": "Złoto", "value": 45, "amount": amount * 0.45, "color": "#FFD700"},
-            {"name": "Srebro", "value": 35, "amount": amount * 0.35, "color": "#C0C0C0"},
-            {"name": "Platyna", "value": 10, "amount": amount * 0.1, "color": "#E5E4E2"},
-            {"name": "Pallad", "value": 10, "amount": amount * 0.1, "color": "#B9F2FF"}
-        ]
-    elif strategy_name in ["FOUNDATION", "OPTIMAL"]:
-        return [
-            {"name": "Złoto", "value": 35, "amount": amount * 0.35, "color": "#FFD700"},
-            {"name": "Srebro", "value": 30, "amount": amount * 0.3, "color": "#C0C0C0"},
-            {"name": "Platyna", "value": 5, "amount": amount * 0.05, "color": "#E5E4E2"},
-            {"name": "Pallad", "value": 5, "amount": amount * 0.05, "color": "#B9F2FF"},
-            {"name": "Hafn", "value": 5, "amount": amount * 0.05, "color": "#A9A9A9"},
-            {"name": "Gal", "value": 5, "amount": amount * 0.05, "color": "#6495ED"},
-            {"name": "Ind", "value": 5, "amount": amount * 0.05, "color": "#9370DB"},
-            {"name": "German", "value": 5, "amount": amount * 0.05, "color": "#808080"},
-            {"name": "Tantal", "value": 5, "amount": amount * 0.05, "color": "#708090"}
-        ]
-    else:  # PRESTIGE
-        return [
-            {"name": "Złoto", "value": 20, "amount": amount * 0.20, "color": "#FFD700"},
-            {"name": "Srebro", "value": 16, "amount": amount * 0.16, "color": "#C0C0C0"},
-            {"name": "Platyna", "value": 7, "amount": amount * 0.07, "color": "#E5E4E2"},
-            {"name": "Pallad", "value": 7, "amount": amount * 0.07, "color": "#B9F2FF"},
-            
-            {"name": "Hafn", "value": 2, "amount": amount * 0.02, "color": "#A9A9A9"},
-            {"name": "Gal", "value": 2, "amount": amount * 0.02, "color": "#6495ED"},
-            {"name": "Ind", "value": 2, "amount": amount * 0.02, "color": "#9370DB"},
-            {"name": "German", "value": 2, "amount": amount * 0.02, "color": "#808080"},
-            {"name": "Tantal", "value": 2, "amount": amount * 0.02, "color": "#708090"},
-            {"name": "Metale Strategiczne", "value": 40, "amount": amount * 0.4, "color": "#4169E1"}
-        ]
-
-def get_components(strategy_name, amount):
-    if strategy_name == "START":
-        return [
-            {"name": "GTSmart (SSW)", "value": 100, "amount": amount, "color": "#FFD700"}
-        ]
-    elif strategy_name in ["BALANCE", "FOUNDATION", "OPTIMAL"]:
-        component_name = "GTSmart (SSW)" if strategy_name == "BALANCE" else "GT (SSW)"
-        return [
-            {"name": component_name, "value": 50, "amount": amount * 0.5, "color": "#FFD700"},
-            {"name": "GRatio (Auvesta)", "value": 50, "amount": amount * 0.5, "color": "#C0C0C0"}
-        ]
-    else:  # PRESTIGE
-        return [
-            {"name": "GTS (SSW)", "value": 10, "amount": amount * 0.1, "color": "#FFD700"},
-            {"name": "GT (SSW)", "value": 20, "amount": amount * 0.2, "color": "#E5E4E2"},
-            {"name": "GR (Auvesta)", "value": 30, "amount": amount * 0.3, "color": "#C0C0C0"},
-            {"name": "SMH (SSW)", "value": 40, "amount": amount * 0.4, "color": "#6495ED"}
-        ]
-
-def get_agio(strategy_name, amount):
-    initial_agio = 0
-    bonus = 0
-    
-    if strategy_name == "START":
-        initial_agio = amount * 0.035  # 3.5%
-    elif strategy_name in ["BALANCE", "FOUNDATION", "OPTIMAL"]:
-        ssw_agio = amount * 0.5 * 0.035  # 3.5% dla SSW
-        auvesta_agio = 0
-        
-        auvesta_amount = amount * 0.5
-        if auvesta_amount < 15000:
-            auvesta_agio = 300  # S-3
-        elif auvesta_amount < 25000:
-            auvesta_agio = 600  # M-6
-        elif auvesta_amount < 50000:
-            auvesta_agio = 1200  # L-12
-        elif auvesta_amount < 150000:
-            auvesta_agio = 2400  # XL-24
-        else:
-            vip_count = min(6, int(auvesta_amount / 150000) + (1 if auvesta_amount % 150000 > 0 else 0))
-            auvesta_agio = vip_count * 2400  # VIP
-        
-        initial_agio = ssw_agio + auvesta_agio
-        bonus = auvesta_agio  # 100% zwrotu
-    else:  # PRESTIGE
-        gts_agio = amount * 0.1 * 0.035
-        gt_agio = amount * 0.2 * 0.035
-        gr_amount = amount * 0.3
-        gr_count = min(6, int(gr_amount / 150000) + (1 if gr_amount % 150000 > 0 else 0))
-        gr_agio = gr_count * 2400
-        
-        initial_agio = gts_agio + gt_agio + gr_agio
-        bonus = gr_agio
-    
-    effective_agio = initial_agio - bonus
-    initial_percent = (initial_agio / amount) * 100 if amount > 0 else 0
-    effective_percent = (effective_agio / amount) * 100 if amount > 0 else 0
-    
-    return {
-        "initialAgio": initial_agio,
-        "bonus": bonus,
-        "effectiveAgio": effective_agio,
-        "initialPercent": initial_percent,
-        "effectivePercent": effective_percent
-    }
-
-def get_current_tariff(strategy_name, amount):
-    if strategy_name in deposit_tariffs:
-        for tariff in deposit_tariffs[strategy_name]:
-            if tariff["minValue"] <= amount <= tariff["maxValue"]:
-                return tariff
-    return None
+    # Koszty magazynowania
+    st.subheader("Koszty magazynowania")
+    storage_mode = st.radio(
+        "Pobierane w:",
+        options=["metal", "eur"],
+        format_func=lambda mode: "metalu" if mode == "metal" else "EUR",
+        horizontal=True
+    )
+
+st.session_state["plan"] = dict(strategyIndex=strategy_index, amount=amount, purchase=purchase,
+                                years=years_value, storageMode=storage_mode)
 
 # Główne zakładki
-tab1, tab2, tab3 = st.tabs(["Alokacja metali", "Struktura komponentów", "Taryfy depozytowe"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Alokacja metali", "Ryzyko", "Struktura komponentów", "Taryfy depozytowe", "Porównanie strategii"])
 
+section("Alokacja metali")
 with tab1:
     st.header("Alokacja według metali")
     
     metals = get_metals(current_strategy["name"], amount)
     
-    # Przygotowanie danych do wykresu
-    metals_df = pd.DataFrame(metals)
-    
     col1, col2 = st.columns(2)
     
     with col1:
         # Wykres kołowy z Plotly
-        fig = px.pie(
-            metals_df, 
-            values='value', 
-            names='name',
-            color='name',
-            color_discrete_map={m["name"]: m["color"] for m in metals},
-            hole=0.3
-        )
-        fig.update_traces(textinfo='percent+label', textfont_size=12)
-        fig.update_layout(
-            height=500,
-            margin=dict(l=20, r=20, t=20, b=20),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(allocation_figure(current_strategy["name"], "metals"), use_container_width=True)
     
     with col2:
         # Tabela z danymi
@@ -406,33 +693,23 @@ with tab1:
             use_container_width=True
         )
 
+    rebalancing_section(current_strategy["name"], amount, purchase, years_value)
+
+section("Ryzyko")
 with tab2:
+    risk_section(strategy_index, amount)
+
+section("Struktura komponentów")
+with tab3:
     st.header("Struktura komponentów")
     
     components = get_components(current_strategy["name"], amount)
     
-    # Przygotowanie danych do wykresu
-    components_df = pd.DataFrame(components)
-    
     col1, col2 = st.columns(2)
     
     with col1:
         # Wykres kołowy z Plotly
-        fig = px.pie(
-            components_df, 
-            values='value', 
-            names='name',
-            color='name',
-            color_discrete_map={c["name"]: c["color"] for c in components},
-            hole=0.3
-        )
-        fig.update_traces(textinfo='percent+label', textfont_size=12)
-        fig.update_layout(
-            height=500,
-            margin=dict(l=20, r=20, t=20, b=20),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(allocation_figure(current_strategy["name"], "components"), use_container_width=True)
     
     with col2:
         # Tabela z danymi
@@ -456,56 +733,38 @@ with tab2:
             use_container_width=True
         )
 
-with tab3:
-    st.header(f"Taryfy depozytowe dla strategii {current_strategy['name']}")
-    
-    if current_strategy["name"] in deposit_tariffs:
-        for idx, tariff in enumerate(deposit_tariffs[current_strategy["name"]]):
-            is_current = tariff["minValue"] <= amount <= tariff["maxValue"]
-            
-            # Dodaj kolorowe tło dla aktualnie wybranej taryfy
-            container_style = "background-color: #E6F3FF; padding: 20px; border-radius: 10px; margin-bottom: 20px; border-left: 4px solid #0066CC;" if is_current else "background-color: #FFFFFF; padding: 20px; border-radius: 10px; margin-bottom: 20px;"
-            
-            with st.container():
-                st.markdown(f'<div style="{container_style}">', unsafe_allow_html=True)
-                
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    st.subheader(tariff["name"])
-                    st.markdown(f"Kwota: {format_eur(tariff['minValue'])} - {format_eur(tariff['maxValue'])}")
-                
-                with col2:
-                    if is_current:
-                        st.success("✓ Dostępna dla aktualnej kwoty")
-                    else:
-                        st.info("Poza aktualnym zakresem")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("**AGIO:**")
-                    st.markdown(tariff["agio"])
-                    
-                    st.markdown("**Koszty magazynowania:**")
-                    st.markdown(tariff["storage"])
-                
-                with col2:
-                    st.markdown("**Alokacja metali:**")
-                    st.markdown(tariff["metals"])
-                
-                st.markdown("**Zalety:**")
-                advantages_text = "".join([f"- {advantage}<br>" for advantage in tariff["advantages"]])
-                st.markdown(advantages_text, unsafe_allow_html=True)
-                
-                st.markdown("**Szczegóły:**")
-                st.info(tariff["details"])
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+section("Taryfy depozytowe")
+with tab4:
+    tariff_section()
+
+section("Porównanie strategii")
+with tab5:
+    st.header("Porównanie strategii")
+
+    comparison = get_comparison(amount, purchase, years_value, storage_mode)
+    st.plotly_chart(comparison_figure(strategy_index, amount, purchase, years_value, storage_mode), use_container_width=True)
+
+    comparison_table = pd.DataFrame({
+        "Strategia": comparison["names"],
+        "Wartość końcowa": [format_eur(value) for value in comparison["finalValue"]],
+        "CAGR": [f"{value:.2%}" for value in comparison["cagr"]],
+        "Maks. obsunięcie": [f"{value:.1%}" for value in comparison["maxDrawdown"]],
+        "Efektywne AGIO": [f"{percent:.2f}% ({format_eur(value)})" for percent, value in zip(comparison["effectivePercent"], comparison["effectiveAgio"])]
+    })
+    st.dataframe(comparison_table, hide_index=True, use_container_width=True)
+    st.caption(
+        f"Ta sama kwota {format_eur(amount)} i {format_eur(purchase)}/tydzień przez {years_value} lat dla każdej strategii, "
+        "po kosztach magazynowania. CAGR i obsunięcie dotyczą 1 EUR zainwestowanego na starcie okresu."
+    )
 
 # Obliczenia
+section("Podsumowanie")
 agio = get_agio(current_strategy["name"], amount)
 current_tariff = get_current_tariff(current_strategy["name"], amount)
+backtest, rolling, _, ownership_cost = get_backtest(current_strategy["name"], amount, term_purchase,
+                                                   years_value, storage_mode, schedule)
+backtest_horizon = horizon_label(schedule, years_value)
+projection = get_projection(current_strategy["name"], amount, purchase, years_value, storage_mode)
 
 # Koszty AGIO i Rekomendacje
 st.header("Podsumowanie strategii")
@@ -537,6 +796,22 @@ with col1:
         unsafe_allow_html=True
     )
 
+    # Ramka całkowitego kosztu posiadania (AGIO + magazynowanie w backteście)
+    storage_lines = "".join(
+        f'<li>{name}: {format_eur(value)}</li>' for name, value in ownership_cost["storageByComponent"].items()
+    )
+    st.markdown(
+        f'''
+        <div style="background-color: #FDECEC; padding: 15px; border-radius: 10px; border-left: 4px solid #EB5757; margin-top: 15px;">
+            <h4 style="margin-top: 0;">Całkowity koszt posiadania ({backtest_horizon}):</h4>
+            <p style="font-size: 24px; font-weight: bold; color: #EB5757;">{ownership_cost["percentOfInvested"]:.2f}% wpłat ({format_eur(ownership_cost["total"])})</p>
+            <p style="margin-top: 10px; font-size: 14px;"><span style="font-weight: bold;">Magazynowanie:</span> {format_eur(ownership_cost["storage"])} + <span style="font-weight: bold;">AGIO efektywne:</span> {format_eur(ownership_cost["effectiveAgio"])}</p>
+            <ul style="font-size: 14px; margin-bottom: 0;">{storage_lines}</ul>
+        </div>
+        ''', 
+        unsafe_allow_html=True
+    )
+
 with col2:
     st.subheader("Projekcja i rekomendacja")
     
@@ -550,14 +825,45 @@ with col2:
                 <li style="margin-bottom: 10px;"><span style="font-weight: bold;">Rekomendacja Efektu Kursu Średniego:</span> <span style="font-weight: 500;">{format_eur(purchase)}/tydzień</span></li>
                 <li style="margin-bottom: 10px;"><span style="font-weight: bold;">Roczna kwota dokupów:</span> <span style="font-weight: 500;">{format_eur(purchase * 52)}</span></li>
                 <li style="margin-bottom: 10px;"><span style="font-weight: bold;">Perspektywa budowy:</span> <span style="font-weight: 500;">{years_display} lat</span></li>
-                <li><span style="font-weight: bold;">Szacowana suma po {years_display} latach:</span> <span style="color: #2F80ED; font-weight: bold;">{format_eur(round(amount + (purchase * 52 * min(years_value, 30))))}</span></li>
+                <li style="margin-bottom: 10px;"><span style="font-weight: bold;">Szacowana suma po {years_display} latach (mediana):</span> <span style="color: #2F80ED; font-weight: bold;">{format_eur(round(projection["percentiles"][50][-1]))}</span> <span style="font-size: 14px;">(P5-P95: {format_eur(projection["percentiles"][5][-1])} - {format_eur(projection["percentiles"][95][-1])})</span></li>
+                <li><span style="font-weight: bold;">Wartość wg cen historycznych ({backtest_horizon}):</span> <span style="color: #27AE60; font-weight: bold;">{format_eur(round(backtest["netValue"][-1]))}</span></li>
             </ul>
         </div>
         ''', 
         unsafe_allow_html=True
     )
 
+    # Zakres historyczny - wynik planu dla każdej możliwej daty startu
+    st.subheader("Zakres historyczny")
+    st.plotly_chart(rolling_figure(current_strategy["name"], amount, term_purchase, years_value, storage_mode, schedule),
+                    use_container_width=True)
+    st.caption(
+        f"{len(rolling['finalValue'])} okien ({backtest_horizon}): najgorszy {format_eur(rolling['worst'])}, "
+        f"mediana {format_eur(rolling['median'])}, najlepszy {format_eur(rolling['best'])} "
+        f"(P25-P75: {format_eur(rolling['percentiles'][25])} - {format_eur(rolling['percentiles'][75])})"
+    )
+
+# Backtest historyczny
+section("Backtest")
+backtest_section(current_strategy["name"], amount, term_purchase, years_value, storage_mode, schedule)
+
+# Projekcja Monte Carlo
+section("Projekcja")
+projection_section()
+
+section("Eksport")
+st.header("Eksport raportu")
+export_section(current_strategy["name"], amount, purchase, years_value, storage_mode)
+export_job = get_export_jobs().status(st.session_state.get("export_job"))
+if export_job is not None and export_job["status"] in ("queued", "running"):
+    export_progress(export_job["id"])
+elif export_job is not None:
+    export_result(export_job)
+st.caption("Plan, alokacja, taryfa, AGIO per komponent, percentyle Monte Carlo i tygodniowy rejestr backtestu. "
+           "Eksport działa w tle - można dalej korzystać z kalkulatora.")
+
 # Podsumowanie
+section("Stopka")
 st.markdown(
     f'''
     <div style="background-color: #2F80ED; color: white; padding: 20px; border-radius: 10px; margin-top: 30px; text-align: center;">
@@ -568,8 +874,8 @@ st.markdown(
             <span style="font-size: 14px; margin-left: 10px;">({format_eur(amount)} + {format_eur(agio["initialAgio"])} AGIO)</span>
         </div>
         <div>
-            <p>Szacowana alokacja środków po {years_display} latach: <span style="font-weight: 700; font-size: 24px;">{format_eur(round(amount + (purchase * 52 * min(years_value, 30))))}</span></p>
-            <p style="font-size: 14px; margin-top: 5px;">Z początkowej alokacji {format_eur(amount)} i tygodniowych dokupień w wysokości {format_eur(purchase)}</p>
+            <p>Szacowana wartość po {years_display} latach (mediana Monte Carlo): <span style="font-weight: 700; font-size: 24px;">{format_eur(round(projection["percentiles"][50][-1]))}</span></p>
+            <p style="font-size: 14px; margin-top: 5px;">P5-P95: {format_eur(projection["percentiles"][5][-1])} - {format_eur(projection["percentiles"][95][-1])} przy wpłatach {format_eur(projection["invested"][-1])} ({format_eur(amount)} na start i {format_eur(purchase)}/tydzień)</p>
         </div>
     </div>
     ''', 
@@ -589,3 +895,7 @@ st.markdown(
     ''', 
     unsafe_allow_html=True
 )
+
+# Panel profilowania (tylko z FFCALC_PROFILE=1)
+if PROFILING:
+    profile_panel(finish_run())
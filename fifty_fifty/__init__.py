@@ -0,0 +1,15 @@
+# Rdzeń obliczeniowy kalkulatora Fifty/Fifty. Import pakietu nie ładuje Streamlit,
+# pandas, Plotly ani NumPy - silniki symulacji są w osobnych modułach
+# (fifty_fifty.backtest, fifty_fifty.montecarlo, fifty_fifty.price_store).
+from .core import (deposit_tariffs, format_eur, get_agio, get_components, get_current_tariff,
+                   get_metals, strategies)
+
+__all__ = [
+    "deposit_tariffs",
+    "format_eur",
+    "get_agio",
+    "get_components",
+    "get_current_tariff",
+    "get_metals",
+    "strategies"
+]
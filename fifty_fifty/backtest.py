@@ -0,0 +1,158 @@
+import numpy as np
+
+from .core import PRICE_COLUMNS
+from .fees import STORAGE_MODES, accrue_storage, decay_groups, month_index
+from .schedule import WEEKLY, WEEKS_PER_YEAR, elapsed_weeks, horizon_error, schedule_horizon, schedule_rows
+
+
+def metal_weights(metals, columns):
+    # Wagi metali z notowaniami, znormalizowane do 1. Metale strategiczne nie mają
+    # historii cen, więc pomijamy je i zwracamy pokrytą część alokacji.
+    weights = np.zeros(len(columns))
+    for metal in metals:
+        column = PRICE_COLUMNS.get(metal["name"])
+        if column in columns:
+            weights[columns.index(column)] += metal["value"]
+    covered = weights.sum()
+    if covered == 0:
+        raise ValueError("Brak metali z historią cen w alokacji")
+    return weights / covered, covered / 100
+
+
+def purchase_plan(data, amount, purchase, years, start_week=None, schedule=WEEKLY):
+    # Okno backtestu [first, last] w wierszach cen oraz wpłaty w każdym wierszu okna.
+    # start_week i purchase odnoszą się do terminów harmonogramu (domyślnie tygodni);
+    # harmonogram własny ignoruje years i używa własnego horyzontu.
+    week_rows = schedule_rows(data, schedule)
+    horizon = schedule_horizon(schedule, years, len(week_rows))
+    if start_week is None:
+        start_week = len(week_rows) - 1 - horizon
+    if horizon <= 0 or start_week < 0 or start_week + horizon >= len(week_rows):
+        raise horizon_error(schedule, years)
+
+    rows = week_rows[start_week:start_week + horizon + 1]
+    first, last = rows[0], rows[-1]
+    cash = np.zeros(last - first + 1)
+    cash[rows[:-1] - first] = purchase
+    cash[0] += amount
+    return first, last, cash
+
+
+def run_backtest(data, weights, amount, purchase, years, start_week=None, storage=None, storage_mode="metal",
+                 schedule=WEEKLY):
+    # Kwota początkowa i pierwszy zakup w tygodniu 0, kolejne zakupy co tydzień,
+    # wycena na pierwszym fixingu tygodnia start_week + 52 * years.
+    # storage: profil z fees.storage_profile() - koszty magazynowania naliczane co miesiąc
+    # schedule: inny harmonogram zakupów z schedule.make_schedule() (np. piątki, co miesiąc)
+    first, last, cash = purchase_plan(data, amount, purchase, years, start_week, schedule)
+    prices = data["prices"][first:last + 1]
+
+    bought = cash[:, None] * weights / prices
+    purchased = np.cumsum(bought, axis=0)
+    cost_basis = np.cumsum(cash)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_price = cost_basis[:, None] * weights / purchased
+
+    ounces, storage_fees = purchased, np.zeros((0, len(cash)))
+    if storage is not None:
+        ounces, storage_fees = accrue_storage(bought, prices, month_index(data["days"][first:last + 1]),
+                                              storage, storage_mode)
+    market_value = (ounces * prices).sum(axis=1)
+    cumulative_fees = np.cumsum(storage_fees.sum(axis=0))
+
+    return {
+        "dates": data["dates"][first:last + 1],
+        "ounces": ounces,
+        "costBasis": cost_basis,
+        "avgPrice": avg_price,
+        "marketValue": market_value,
+        "storageFees": cumulative_fees,
+        "storageByComponent": storage_fees.sum(axis=1),
+        # Przy płatności w EUR koszty nie zmniejszają stanu metalu, ale majątek netto
+        "netValue": market_value - cumulative_fees if storage_mode == "eur" else market_value
+    }
+
+
+ROLLING_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def rolling_factors(data, weights, years, storage=None, storage_mode="metal", schedule=WEEKLY):
+    # Wartość końcowa 1 EUR wpłaconego na starcie (initial) i 1 EUR/tydzień (weekly)
+    # dla każdej możliwej daty startu. Uncje kupione za 1 EUR w oknie [s, s + H) to
+    # różnica sum prefiksowych 1 / cena. Wagi (M,) lub macierz (K, M) dla K strategii.
+    # Z profilem storage uncje kupione w terminie k maleją o d^(t[s + H] - t[k]), gdzie
+    # t to czas w tygodniach, a d tygodniowy zanik, więc sumy prefiksowe liczymy
+    # z 1 / cena * d^-t[k] (koszt pobierany w metalu). Przy storage_mode "eur" uncje się
+    # nie zmieniają, a w każdym terminie j od wartości odejmujemy opłatę za okres od
+    # terminu j - 1: f_j * cena_j * (uncje kupione przed j) - również z sum prefiksowych.
+    # Przy innym harmonogramie tydzień zastępuje termin zakupu.
+    if storage_mode not in STORAGE_MODES:
+        raise ValueError(f"Nieznany sposób pobierania kosztów: {storage_mode}")
+
+    week_rows = schedule_rows(data, schedule)
+    horizon = schedule_horizon(schedule, years, len(week_rows))
+    starts = len(week_rows) - horizon
+    if horizon <= 0 or starts <= 0:
+        raise horizon_error(schedule, years)
+
+    prices = data["prices"][week_rows]
+    inverse = 1.0 / prices
+    cumulative = np.zeros((len(prices) + 1, prices.shape[1]))
+
+    end_prices = prices[horizon:horizon + starts]
+    initial_fees = window_fees = 0
+    if storage is None or storage_mode == "eur":
+        if schedule == WEEKLY and "inverseCumsum" in data:
+            cumulative = data["inverseCumsum"]
+        else:
+            np.cumsum(inverse, axis=0, out=cumulative[1:])
+        initial = inverse[:starts]
+        window = cumulative[horizon:horizon + starts] - cumulative[:starts]
+        if storage is not None:
+            fees = np.zeros((len(prices), 1))
+            gaps = np.diff(elapsed_weeks(data, week_rows))
+            fees[1:, 0] = sum(share * (1 - decay ** gaps) for share, decay in decay_groups(storage))
+            price_sums = np.zeros((len(prices) + 1, prices.shape[1]))
+            held_sums = np.zeros((len(prices) + 1, prices.shape[1]))
+            np.cumsum(fees * prices, axis=0, out=price_sums[1:])
+            np.cumsum(fees * prices * cumulative[:-1], axis=0, out=held_sums[1:])
+            # Terminy naliczania opłat s + 1 ... s + H
+            charged = price_sums[horizon + 1:horizon + starts + 1] - price_sums[1:starts + 1]
+            held = held_sums[horizon + 1:horizon + starts + 1] - held_sums[1:starts + 1]
+            initial_fees = initial * charged
+            window_fees = held - cumulative[:starts] * charged
+    else:
+        initial = np.zeros((starts, prices.shape[1]))
+        window = np.zeros((starts, prices.shape[1]))
+        weeks = elapsed_weeks(data, week_rows)[:, None]
+        for share, decay in decay_groups(storage):
+            np.cumsum(inverse * decay ** -weeks, axis=0, out=cumulative[1:])
+            initial += share * decay ** (weeks[horizon:horizon + starts] - weeks[:starts]) * inverse[:starts]
+            window += share * decay ** weeks[horizon:horizon + starts] * (cumulative[horizon:horizon + starts] - cumulative[:starts])
+
+    weights = np.asarray(weights).T
+    return {
+        "startRows": week_rows[:starts],
+        "endRows": week_rows[horizon:horizon + starts],
+        "horizon": horizon,
+        "initial": (initial * end_prices - initial_fees) @ weights,
+        "weekly": (window * end_prices - window_fees) @ weights
+    }
+
+
+def run_rolling_backtest(data, weights, amount, purchase, years, storage=None, storage_mode="metal", schedule=WEEKLY):
+    # Wynik planu tygodniowego dla każdej możliwej daty startu w jednym przebiegu
+    factors = rolling_factors(data, weights, years, storage, storage_mode, schedule)
+    final_value = amount * factors["initial"] + purchase * factors["weekly"]
+    invested = amount + purchase * factors["horizon"]
+
+    return {
+        "startDates": data["dates"][factors["startRows"]],
+        "endDates": data["dates"][factors["endRows"]],
+        "finalValue": final_value,
+        "invested": invested,
+        "best": float(final_value.max()),
+        "worst": float(final_value.min()),
+        "median": float(np.median(final_value)),
+        "percentiles": dict(zip(ROLLING_PERCENTILES, np.percentile(final_value, ROLLING_PERCENTILES).tolist()))
+    }
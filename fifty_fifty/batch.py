@@ -0,0 +1,250 @@
+# Wsadowa ocena planów klientów z pliku CSV lub JSONL:
+#   python -m fifty_fifty.batch klienci.csv -o wyniki.jsonl --workers 4
+# Wejście jest czytane strumieniowo paczkami po --chunk-size wierszy, a wyniki
+# dopisywane paczka po paczce, więc pamięć zależy od rozmiaru paczki, nie pliku.
+# Przy --workers > 1 paczki liczy pula procesów; w locie jest najwyżej
+# 2 * workers paczek, a wyniki są zapisywane w kolejności wejścia.
+# Opcjonalna kolumna schedule wybiera harmonogram zakupów (schedule.parse_schedule(),
+# domyślnie co tydzień); purchase to kwota na termin, a harmonogram własny ma
+# horyzont wyznaczony datami zamiast years.
+import argparse
+import csv
+import json
+import math
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+
+from .backtest import metal_weights, rolling_factors
+from .core import COMPONENT_TABLES, METAL_TABLES, get_metals
+from .fees import storage_profile
+from .price_store import get_data
+from .schedule import parse_schedule, schedule_horizon, schedule_rows
+from .vectorized import METAL_NAMES, STRATEGY_NAMES, TARIFFS, get_agio_array, get_current_tariff_array
+
+INPUT_FIELDS = ("client_id", "strategy", "amount", "purchase", "years")
+OPTIONAL_FIELDS = ("schedule",)
+BATCH_FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = 1000
+HISTORICAL_PERCENTILES = (5, 50, 95)
+
+COMPONENT_NAMES = list(dict.fromkeys(name for table in COMPONENT_TABLES.values() for name in table.names))
+RESULT_FIELDS = [
+    "clientId", "strategy", "amount", "purchase", "years", "schedule",
+    "initialAgio", "bonus", "effectiveAgio", "effectivePercent", "tariff", "invested",
+    "backtestValue", "historicalP5", "historicalP50", "historicalP95", "error"
+]
+# Kolumny CSV: alokacja rozpisana na wszystkie metale i komponenty ze spec.json
+CSV_FIELDS = RESULT_FIELDS + [f"metal:{name}" for name in METAL_NAMES] + [f"component:{name}" for name in COMPONENT_NAMES]
+
+@lru_cache(maxsize=256)
+def plan_factors(strategy_name, years, rates, schedule):
+    # Czynniki backtestu kroczącego dla strategii, horyzontu, stawek magazynowania
+    # (stawki zależą od progu kwoty, udziały komponentów tylko od strategii) i harmonogramu
+    data = get_data()
+    weights, _ = metal_weights(get_metals(strategy_name, 1), data["columns"])
+    profile = dict(storage_profile(strategy_name, 0), monthlyRates=np.array(rates))
+    try:
+        return rolling_factors(data, weights, years, profile, schedule=schedule)
+    except ValueError:
+        return None
+
+
+def parse_row(row):
+    if "_error" in row:
+        return {"clientId": "", "error": row["_error"]}
+    try:
+        strategy = str(row["strategy"]).strip().upper()
+        if strategy not in STRATEGY_NAMES:
+            raise ValueError(f"Nieznana strategia: {row['strategy']}")
+        parsed = {
+            "clientId": str(row["client_id"]),
+            "strategy": strategy,
+            "amount": float(row["amount"]),
+            "purchase": float(row["purchase"]),
+            # Eksporty z arkuszy zapisują liczby całkowite jako "10.0"
+            "years": float(row["years"]),
+            "schedule": str(row.get("schedule") or "weekly").strip()
+        }
+    except KeyError as error:
+        return {"clientId": str(row.get("client_id", "")), "error": f"Brak pola: {error.args[0]}"}
+    except (TypeError, ValueError) as error:
+        return {"clientId": str(row.get("client_id", "")), "error": str(error)}
+    if not (math.isfinite(parsed["amount"]) and math.isfinite(parsed["purchase"])):
+        return dict(parsed, error="Kwoty muszą być liczbami skończonymi")
+    if not (math.isfinite(parsed["years"]) and parsed["years"].is_integer()):
+        return dict(parsed, error="Horyzont musi być całkowitą liczbą lat")
+    parsed["years"] = int(parsed["years"])
+    if parsed["amount"] < 0 or parsed["purchase"] < 0 or parsed["years"] <= 0:
+        return dict(parsed, error="Kwoty muszą być nieujemne, a horyzont dodatni")
+    try:
+        parse_schedule(parsed["schedule"])
+    except ValueError as error:
+        return dict(parsed, error=str(error))
+    return parsed
+
+
+def _historical(results, indices, factors):
+    amounts = np.array([results[i]["amount"] for i in indices])
+    purchases = np.array([results[i]["purchase"] for i in indices])
+    if factors is None:
+        return np.full(len(indices), np.nan), np.full((len(HISTORICAL_PERCENTILES), len(indices)), np.nan)
+    # Ostatnie okno to backtest z domyślnym startem, percentyle po wszystkich datach startu
+    finals = amounts[:, None] * factors["initial"][None, :] + purchases[:, None] * factors["weekly"][None, :]
+    return finals[:, -1], np.percentile(finals, HISTORICAL_PERCENTILES, axis=1)
+
+
+def evaluate_chunk(rows):
+    results = [parse_row(row) for row in rows]
+    valid = [i for i, result in enumerate(results) if "error" not in result]
+    if not valid:
+        return results
+
+    ids = np.array([STRATEGY_NAMES.index(results[i]["strategy"]) for i in valid])
+    amounts = np.array([results[i]["amount"] for i in valid])
+    agio = get_agio_array(ids, amounts)
+    tariffs = get_current_tariff_array(ids, amounts)
+
+    groups = {}
+    for position, i in enumerate(valid):
+        result = results[i]
+        name, amount = result["strategy"], result["amount"]
+        result.update({
+            "initialAgio": float(agio["initialAgio"][position]),
+            "bonus": float(agio["bonus"][position]),
+            "effectiveAgio": float(agio["effectiveAgio"][position]),
+            "effectivePercent": float(agio["effectivePercent"][position]),
+            "tariff": TARIFFS[tariffs[position]]["name"] if tariffs[position] >= 0 else None,
+            "metals": {n: amount * share for n, share in zip(METAL_TABLES[name].names, METAL_TABLES[name].shares)},
+            "components": {n: amount * share for n, share in zip(COMPONENT_TABLES[name].names, COMPONENT_TABLES[name].shares)}
+        })
+        rates = tuple(storage_profile(name, amount)["monthlyRates"].tolist())
+        groups.setdefault((name, result["years"], rates, parse_schedule(result["schedule"])), []).append(i)
+
+    # Klienci z tą samą strategią, horyzontem, stawkami i harmonogramem dzielą czynniki backtestu
+    for key, indices in groups.items():
+        _, years, _, schedule = key
+        horizon = schedule_horizon(schedule, years, len(schedule_rows(get_data(), schedule)))
+        final, percentiles = _historical(results, indices, plan_factors(*key))
+        for position, i in enumerate(indices):
+            results[i]["invested"] = results[i]["amount"] + results[i]["purchase"] * horizon
+            results[i]["backtestValue"] = float(final[position])
+            for percentile, values in zip(HISTORICAL_PERCENTILES, percentiles):
+                results[i][f"historicalP{percentile}"] = float(values[position])
+    return results
+
+
+def read_rows(stream, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        # Niepoprawna linia JSONL staje się wierszem błędu, a nie przerywa przebiegu
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            row = {"_error": f"Niepoprawny JSON w linii {number}: {error.msg}"}
+        if not isinstance(row, dict):
+            row = {"_error": f"Linia {number} nie jest obiektem JSON"}
+        yield row
+
+
+def _clean(value):
+    # NaN i nieskończoność nie są poprawnym JSON - brak wyniku zapisujemy jako null,
+    # również w zagnieżdżonych słownikach (metale, komponenty)
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def write_chunk(stream, writer, results, fmt):
+    for result in results:
+        if fmt == "jsonl":
+            stream.write(json.dumps(_clean(result), ensure_ascii=False, allow_nan=False) + "\n")
+        else:
+            row = {key: _clean(result.get(key)) for key in RESULT_FIELDS}
+            row.update({f"metal:{name}": value for name, value in result.get("metals", {}).items()})
+            row.update({f"component:{name}": value for name, value in result.get("components", {}).items()})
+            writer.writerow(row)
+    stream.flush()
+
+
+def run_batch(rows, output, fmt="jsonl", chunk_size=CHUNK_SIZE, workers=1):
+    # Zwraca (liczba wierszy, liczba błędów)
+    if fmt not in BATCH_FORMATS:
+        raise ValueError(f"Nieznany format: {fmt}")
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS, restval="")
+        writer.writeheader()
+    chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+    counts = [0, 0]
+
+    def emit(results):
+        counts[0] += len(results)
+        counts[1] += sum("error" in result for result in results)
+        write_chunk(output, writer, results, fmt)
+
+    if workers <= 1:
+        for chunk in chunks:
+            emit(evaluate_chunk(chunk))
+        return tuple(counts)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(evaluate_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return tuple(counts)
+
+
+def _format(path, explicit):
+    if explicit:
+        return explicit
+    return "jsonl" if str(path).endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m fifty_fifty.batch",
+        description="Ocena planów klientów: AGIO, taryfa, alokacja, komponenty i backtest historyczny. "
+                    f"Kolumny wejścia: {', '.join(INPUT_FIELDS)} (opcjonalnie {', '.join(OPTIONAL_FIELDS)})."
+    )
+    parser.add_argument("input", help="plik CSV lub JSONL ('-' dla standardowego wejścia)")
+    parser.add_argument("-o", "--output", default="-", help="plik wyników ('-' dla standardowego wyjścia)")
+    parser.add_argument("--input-format", choices=BATCH_FORMATS)
+    parser.add_argument("--output-format", choices=BATCH_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="liczba procesów (1 = bez puli)")
+    args = parser.parse_args(argv)
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size musi być dodatnie")
+
+    input_format = _format(args.input, args.input_format)
+    output_format = _format(args.output, args.output_format) if args.output != "-" else args.output_format or "jsonl"
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        total, errors = run_batch(read_rows(source, input_format), target, output_format, args.chunk_size, args.workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    print(f"Oceniono {total} planów, błędy: {errors}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# Porównanie wszystkich strategii w jednym przebiegu: wagi strategii złożone w macierz
+# (S, M) mnożoną przez wspólne macierze uncji i cen z jednego okna backtestu.
+import numpy as np
+
+from .backtest import metal_weights, purchase_plan
+from .core import get_metals
+from .fees import decayed_holdings, month_index, storage_profile
+from .vectorized import STRATEGY_NAMES, get_agio_array
+
+
+def weight_matrix(data, amount, names=STRATEGY_NAMES):
+    return np.vstack([metal_weights(get_metals(name, amount), data["columns"])[0] for name in names])
+
+
+def storage_share_matrix(amount, names=STRATEGY_NAMES):
+    # Udział strategii (wiersze) przechowywany po każdej z występujących stawek (kolumny)
+    profiles = [storage_profile(name, amount) for name in names]
+    rates = np.unique(np.concatenate([profile["monthlyRates"] for profile in profiles]))
+    shares = np.zeros((len(names), len(rates)))
+    for row, profile in enumerate(profiles):
+        np.add.at(shares[row], np.searchsorted(rates, profile["monthlyRates"]), profile["shares"])
+    return shares, rates
+
+
+def max_drawdown(values):
+    # Największy spadek od szczytu, kolumnami (bieżące maksimum w jednym przebiegu)
+    return (values / np.maximum.accumulate(values, axis=0) - 1).min(axis=0)
+
+
+def compare_strategies(data, amount, purchase, years, storage_mode=None, names=STRATEGY_NAMES):
+    first, last, cash = purchase_plan(data, amount, purchase, years)
+    prices = data["prices"][first:last + 1]
+    dates = data["dates"][first:last + 1]
+    weights = weight_matrix(data, amount, names)
+
+    # Uncje kupione za wpłatę przy wadze 1 - wspólne dla wszystkich strategii
+    bought = cash[:, None] / prices
+    gross = np.cumsum(bought, axis=0)
+    values = (gross * prices) @ weights.T
+
+    if storage_mode is not None:
+        shares, rates = storage_share_matrix(amount, names)
+        months = month_index(data["days"][first:last + 1])
+        if storage_mode == "metal":
+            held = decayed_holdings(bought[None], months, rates[:, None])
+            values = (((held * prices) @ weights.T) * shares.T[:, None, :]).sum(axis=0)
+        elif storage_mode == "eur":
+            held_value = np.zeros_like(values)
+            held_value[1:] = (gross[:-1] * prices[1:]) @ weights.T
+            elapsed = np.diff(months, prepend=months[0])
+            fee_rates = (1 - (1 - rates[None, :]) ** elapsed[:, None]) @ shares.T
+            values = values - np.cumsum(fee_rates * held_value, axis=0)
+        else:
+            raise ValueError(f"Nieznany sposób pobierania kosztów: {storage_mode}")
+
+    # CAGR i obsunięcie liczone dla 1 EUR zainwestowanego na starcie (bez wpłat,
+    # które zniekształcają stopę zwrotu i spadki wartości portfela)
+    index = (prices / prices[0]) @ weights.T
+    elapsed_years = (dates[-1] - dates[0]).astype(np.int64) / 365.25
+    agio = get_agio_array(np.array(names), np.full(len(names), float(amount)))
+
+    return {
+        "names": list(names),
+        "dates": dates,
+        "values": values,
+        "invested": np.cumsum(cash),
+        "finalValue": values[-1],
+        "cagr": index[-1] ** (1 / elapsed_years) - 1,
+        "maxDrawdown": max_drawdown(index),
+        "effectiveAgio": agio["effectiveAgio"],
+        "effectivePercent": agio["effectivePercent"]
+    }
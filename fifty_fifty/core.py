@@ -0,0 +1,192 @@
+# Czyste funkcje obliczeniowe kalkulatora - bez zależności od Streamlit, pandas i Plotly.
+# Strategie, alokacje, komponenty i taryfy pochodzą z deklaratywnej specyfikacji
+# spec.json, kompilowanej przy imporcie do niezmiennych tabel.
+import json
+import os
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec.json")
+
+
+class AgioRule(NamedTuple):
+    rate: float           # część procentowa (kwota * rate)
+    limits: tuple         # górne granice (wyłącznie) taryf stałych
+    fees: tuple           # opłata stała dla każdej taryfy
+    vip_size: float       # powyżej ostatniej granicy: opłata za każde rozpoczęte vip_size
+    vip_fee: float
+    vip_max_count: int
+    bonus: float          # część AGIO zwracana jako bonus metali
+    names: tuple = ()     # nazwy taryf stałych (np. S-3)
+    vip_name: str = "VIP"
+
+
+class StorageRule(NamedTuple):
+    limits: tuple         # górne granice (wyłącznie) taryf
+    rates: tuple          # stawka netto dla każdej taryfy
+    rate: float           # stawka netto powyżej ostatniej granicy (lub jedyna)
+    periods_per_year: int # stawka roczna (1) lub miesięczna (12)
+
+
+class Allocation(NamedTuple):
+    names: tuple
+    values: tuple         # udział w procentach
+    shares: tuple         # udział jako ułamek
+    colors: tuple
+    rules: tuple          # nazwa reguły AGIO (tylko komponenty)
+    storage: tuple        # nazwa reguły kosztów magazynowania (tylko komponenty)
+
+
+class TariffTable(NamedTuple):
+    min_values: tuple
+    max_values: tuple     # posortowane rosnąco
+
+
+# Niestandardowa funkcja formatowania EUR bez użycia locale
+def format_eur(value):
+    if isinstance(value, (int, float)):
+        return f"{int(value):,} €".replace(",", " ")
+    return f"0 €"
+
+
+def load_spec(path=SPEC_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_agio_rule(rule):
+    vip = rule.get("vip", {})
+    return AgioRule(
+        rate=rule.get("rate", 0),
+        limits=tuple(tier["below"] for tier in rule.get("tiers", [])),
+        fees=tuple(tier["fee"] for tier in rule.get("tiers", [])),
+        vip_size=vip.get("size", 0),
+        vip_fee=vip.get("fee", 0),
+        vip_max_count=vip.get("maxCount", 0),
+        bonus=rule.get("bonus", 0),
+        names=tuple(tier.get("name", "") for tier in rule.get("tiers", [])),
+        vip_name=vip.get("name", "VIP")
+    )
+
+
+def compile_storage_rule(rule):
+    return StorageRule(
+        limits=tuple(tier["below"] for tier in rule.get("tiers", [])),
+        rates=tuple(tier["rate"] for tier in rule.get("tiers", [])),
+        rate=rule["rate"],
+        periods_per_year=rule["periodsPerYear"]
+    )
+
+
+def compile_allocation(entries, colors=None):
+    return Allocation(
+        names=tuple(entry["name"] for entry in entries),
+        values=tuple(entry["value"] for entry in entries),
+        shares=tuple(entry["value"] / 100 for entry in entries),
+        colors=tuple(colors[entry["name"]] if colors else entry["color"] for entry in entries),
+        rules=tuple(entry.get("agio") for entry in entries),
+        storage=tuple(entry.get("storage") for entry in entries)
+    )
+
+
+_spec = load_spec()
+_strategy_keys = ("metals", "components", "tariffs")
+
+METALS = tuple(_spec["metals"])
+METAL_COLORS = {metal["name"]: metal["color"] for metal in METALS}
+PRICE_COLUMNS = {metal["name"]: metal["priceColumn"] for metal in METALS if "priceColumn" in metal}
+AGIO_RULES = {name: compile_agio_rule(rule) for name, rule in _spec["agioRules"].items()}
+STORAGE_RULES = {name: compile_storage_rule(rule) for name, rule in _spec["storageRules"].items()}
+VAT_RATE = _spec["vat"]
+
+# Definicja strategii
+strategies = [{key: value for key, value in s.items() if key not in _strategy_keys} for s in _spec["strategies"]]
+
+# Informacje o taryfach depozytowych
+deposit_tariffs = {s["name"]: s["tariffs"] for s in _spec["strategies"]}
+
+METAL_TABLES = {s["name"]: compile_allocation(s["metals"], METAL_COLORS) for s in _spec["strategies"]}
+COMPONENT_TABLES = {s["name"]: compile_allocation(s["components"]) for s in _spec["strategies"]}
+TARIFF_TABLES = {
+    name: TariffTable(tuple(t["minValue"] for t in tariffs), tuple(t["maxValue"] for t in tariffs))
+    for name, tariffs in deposit_tariffs.items()
+}
+
+
+def _allocation_rows(table, amount):
+    return [
+        {"name": name, "value": value, "amount": amount * share, "color": color}
+        for name, value, share, color in zip(table.names, table.values, table.shares, table.colors)
+    ]
+
+
+def get_metals(strategy_name, amount):
+    return _allocation_rows(METAL_TABLES[strategy_name], amount)
+
+
+def get_components(strategy_name, amount):
+    return _allocation_rows(COMPONENT_TABLES[strategy_name], amount)
+
+
+def vip_count(rule, amount):
+    return min(rule.vip_max_count, int(amount / rule.vip_size) + (1 if amount % rule.vip_size > 0 else 0))
+
+
+def rule_agio(rule, amount):
+    agio = amount * rule.rate if rule.rate else 0
+    if rule.vip_size:
+        tier = bisect_right(rule.limits, amount)
+        agio += rule.fees[tier] if tier < len(rule.fees) else vip_count(rule, amount) * rule.vip_fee
+    return agio
+
+
+def get_agio(strategy_name, amount):
+    initial_agio = 0
+    bonus = 0
+
+    table = COMPONENT_TABLES[strategy_name]
+    for share, rule_name in zip(table.shares, table.rules):
+        rule = AGIO_RULES[rule_name]
+        component_agio = rule_agio(rule, amount * share)
+        initial_agio += component_agio
+        if rule.bonus:
+            bonus += component_agio * rule.bonus
+
+    effective_agio = initial_agio - bonus
+    initial_percent = (initial_agio / amount) * 100 if amount > 0 else 0
+    effective_percent = (effective_agio / amount) * 100 if amount > 0 else 0
+
+    return {
+        "initialAgio": initial_agio,
+        "bonus": bonus,
+        "effectiveAgio": effective_agio,
+        "initialPercent": initial_percent,
+        "effectivePercent": effective_percent
+    }
+
+
+def get_storage_rates(strategy_name, amount):
+    # Miesięczna stawka brutto (z VAT) kosztów magazynowania każdego komponentu.
+    # Taryfa Auvesta zależy od kwoty komponentu przy otwarciu depozytu.
+    rows = []
+    table = COMPONENT_TABLES[strategy_name]
+    for name, value, share, rule_name in zip(table.names, table.values, table.shares, table.storage):
+        rule = STORAGE_RULES[rule_name]
+        tier = bisect_right(rule.limits, amount * share)
+        net_rate = rule.rates[tier] if tier < len(rule.rates) else rule.rate
+        rows.append({
+            "name": name,
+            "value": value,
+            "monthlyRate": net_rate * rule.periods_per_year / 12 * (1 + VAT_RATE)
+        })
+    return rows
+
+
+def get_current_tariff(strategy_name, amount):
+    # Zakresy taryf są posortowane - pierwsza taryfa z maxValue >= kwota
+    table = TARIFF_TABLES.get(strategy_name)
+    if table:
+        index = bisect_left(table.max_values, amount)
+        if index < len(table.max_values) and table.min_values[index] <= amount:
+            return deposit_tariffs[strategy_name][index]
+    return None
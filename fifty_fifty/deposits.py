@@ -0,0 +1,234 @@
+# Doradczy podział komponentu na kilka depozytów: reguły AGIO z opłatą stałą
+# (Auvesta S-3 ... XL-24, VIP) liczą opłatę od kwoty pojedynczego depozytu, więc
+# np. 30 000 EUR jako L-12 kosztuje 1 200 EUR, a jako dwa depozyty S-3 - 600 EUR.
+# Programowanie dynamiczne po kwocie w jednostkach DEPOSIT_UNIT liczy raz na regułę
+# najtańszy zestaw depozytów dla każdej kwoty. Taryfa obowiązuje ściśle poniżej
+# progu, więc pojemności są wyłączne: kwota wymaga k jednostek, gdy jest mniejsza
+# niż k * DEPOSIT_UNIT, a depozyt o pojemności c jednostek mieści kwoty mniejsze
+# niż c * DEPOSIT_UNIT. get_agio() pozostaje bez zmian - to tylko porównanie
+# z rekomendacją.
+from bisect import bisect_right
+from functools import lru_cache
+from math import inf
+from typing import NamedTuple
+
+import numpy as np
+
+from .core import AGIO_RULES, COMPONENT_TABLES, get_agio, strategies, vip_count
+from .vectorized import get_agio_array
+
+DEPOSIT_UNIT = 5000
+CLIFF_MIN_JUMP = 1.0
+
+
+class DepositType(NamedTuple):
+    name: str
+    units: float          # pojemność w jednostkach DEPOSIT_UNIT, wyłączna (inf dla VIP bez limitu)
+    fee: float
+
+
+class SplitTable(NamedTuple):
+    types: tuple
+    fees: np.ndarray      # najniższa opłata dla pokrycia k jednostek
+    choice: np.ndarray    # indeks typu ostatniego depozytu w optymalnym zestawie
+
+
+def deposit_units(amount):
+    # Liczba jednostek k, dla której amount < k * DEPOSIT_UNIT
+    return int(amount // DEPOSIT_UNIT) + 1
+
+
+def deposit_types(rule):
+    # Próg taryfy jest wyłączny - depozyt mieści kwoty mniejsze niż limit
+    types = [DepositType(name, limit // DEPOSIT_UNIT, fee) for name, limit, fee in zip(rule.names, rule.limits, rule.fees)]
+    if rule.vip_size:
+        for count in range(1, rule.vip_max_count):
+            types.append(DepositType(f"{rule.vip_name} {count}x", count * rule.vip_size // DEPOSIT_UNIT, count * rule.vip_fee))
+        # Liczba opłat VIP jest ograniczona - ostatni wariant mieści dowolną kwotę
+        types.append(DepositType(f"{rule.vip_name} {rule.vip_max_count}x", inf, rule.vip_max_count * rule.vip_fee))
+    return tuple(types)
+
+
+def _max_units(rule_name):
+    # Największa kwota komponentu z tą regułą przy suwakach wszystkich strategii
+    amounts = [
+        s["maxValue"] * share
+        for s in strategies
+        for share, name in zip(COMPONENT_TABLES[s["name"]].shares, COMPONENT_TABLES[s["name"]].rules)
+        if name == rule_name
+    ]
+    return deposit_units(max(amounts, default=0))
+
+
+@lru_cache(maxsize=None)
+def split_table(rule_name, max_units=None):
+    # fees[k] = min po typach t: fees[max(0, k - pojemność t)] + opłata t
+    types = deposit_types(AGIO_RULES[rule_name])
+    size = (_max_units(rule_name) if max_units is None else max_units) + 1
+    fees = np.zeros(size)
+    choice = np.full(size, -1)
+    for units in range(1, size):
+        best, best_type = inf, -1
+        for index, deposit in enumerate(types):
+            rest = units - deposit.units
+            cost = deposit.fee + (fees[int(rest)] if rest > 0 else 0)
+            if cost < best:
+                best, best_type = cost, index
+        fees[units], choice[units] = best, best_type
+    fees.setflags(write=False)
+    choice.setflags(write=False)
+    return SplitTable(types, fees, choice)
+
+
+def single_deposit(rule, amount):
+    # Opłata stała i nazwa taryfy dla całej kwoty w jednym depozycie (jak get_agio())
+    tier = bisect_right(rule.limits, amount)
+    if tier < len(rule.fees):
+        return float(rule.fees[tier]), rule.names[tier]
+    count = vip_count(rule, amount)
+    return float(count * rule.vip_fee), f"{rule.vip_name} {count}x"
+
+
+def best_split(rule_name, amount):
+    # Najtańszy zestaw depozytów dla kwoty komponentu: (suma opłat stałych, {typ: liczba}).
+    # Zaokrąglenie do jednostek zawyża kwotę, więc porównujemy też z jednym depozytem
+    # na dokładną kwotę - rekomendacja nigdy nie jest droższa od taryfy standardowej.
+    rule = AGIO_RULES[rule_name]
+    if not rule.vip_size or amount <= 0:
+        return 0.0, {}
+    single_fee, single_name = single_deposit(rule, amount)
+    units = deposit_units(amount)
+    table = split_table(rule_name)
+    if units >= len(table.fees):
+        table = split_table(rule_name, units)
+    if single_fee <= table.fees[units]:
+        return single_fee, {single_name: 1}
+    deposits = {}
+    remaining = units
+    while remaining > 0:
+        deposit = table.types[table.choice[remaining]]
+        deposits[deposit.name] = deposits.get(deposit.name, 0) + 1
+        remaining -= deposit.units
+    return float(table.fees[units]), deposits
+
+
+def optimal_agio(strategy_name, amount):
+    # AGIO przy najtańszym podziale każdego komponentu; klucze jak w get_agio()
+    # oraz depozyty per komponent i oszczędność względem get_agio()
+    table = COMPONENT_TABLES[strategy_name]
+    initial_agio = bonus = 0.0
+    components = []
+    for name, share, rule_name in zip(table.names, table.shares, table.rules):
+        rule = AGIO_RULES[rule_name]
+        component_amount = amount * share
+        fee, deposits = best_split(rule_name, component_amount)
+        fee += component_amount * rule.rate if rule.rate else 0.0
+        initial_agio += fee
+        bonus += fee * rule.bonus
+        components.append({"name": name, "amount": component_amount, "agio": fee, "deposits": deposits})
+
+    standard = get_agio(strategy_name, amount)
+    effective_agio = initial_agio - bonus
+    return {
+        "initialAgio": initial_agio,
+        "bonus": bonus,
+        "effectiveAgio": effective_agio,
+        "initialPercent": initial_agio / amount * 100 if amount > 0 else 0,
+        "effectivePercent": effective_agio / amount * 100 if amount > 0 else 0,
+        "components": components,
+        "saving": standard["initialAgio"] - initial_agio
+    }
+
+
+def _first_amount(boundary, share, strict=False):
+    # Najmniejsza kwota strategii A, dla której kwota komponentu A * share >= boundary
+    # (> przy strict) - dokładnie w arytmetyce, której używają get_agio() i optimal_agio()
+    def reached(amount):
+        return amount * share > boundary if strict else amount * share >= boundary
+
+    amount = boundary / share
+    while not reached(amount):
+        amount = np.nextafter(amount, np.inf)
+    while reached(np.nextafter(amount, -np.inf)):
+        amount = np.nextafter(amount, -np.inf)
+    return float(amount)
+
+
+def _breakpoints(strategy):
+    # Kwoty strategii, od których zmienia się opłata standardowa lub optymalna.
+    # Odcinki są lewostronnie domknięte: progi taryf "below" i kolejne jednostki
+    # DEPOSIT_UNIT zaczynają się na granicy, a kolejna opłata VIP (liczba zaokrąglana
+    # w górę) dopiero tuż za wielokrotnością rozmiaru VIP.
+    table = COMPONENT_TABLES[strategy["name"]]
+    points = [strategy["minValue"]]
+    for share, rule_name in zip(table.shares, table.rules):
+        rule = AGIO_RULES[rule_name]
+        if not rule.vip_size or not share:
+            continue
+        units = range(1, deposit_units(strategy["maxValue"] * share) + 1)
+        points.extend(_first_amount(limit, share) for limit in rule.limits)
+        points.extend(_first_amount(count * DEPOSIT_UNIT, share) for count in units)
+        points.extend(_first_amount(count * rule.vip_size, share, strict=True) for count in range(1, rule.vip_max_count))
+    points = np.unique(points)
+    return points[(points >= strategy["minValue"]) & (points <= strategy["maxValue"])]
+
+
+def percent_rate(strategy_name):
+    # Część AGIO liniowa względem kwoty (np. 3,5% SSW) - nie zależy od podziału
+    table = COMPONENT_TABLES[strategy_name]
+    return sum(share * AGIO_RULES[rule_name].rate for share, rule_name in zip(table.shares, table.rules))
+
+
+@lru_cache(maxsize=None)
+def cost_curve(strategy_name):
+    # Odcinkowo stała krzywa opłat stałych AGIO w całym zakresie kwot strategii
+    # (bez części procentowej): odcinek i to [amounts[i], amounts[i + 1]), wartości
+    # liczone na początku odcinka wraz z rekomendowanymi depozytami
+    strategy = next(s for s in strategies if s["name"] == strategy_name)
+    amounts = _breakpoints(strategy)
+    linear = amounts * percent_rate(strategy_name)
+    standard = get_agio_array(strategy_name, amounts)["initialAgio"] - linear
+    splits = [optimal_agio(strategy_name, amount) for amount in amounts]
+    optimal = np.array([split["initialAgio"] for split in splits]) - linear
+    deposits = tuple(
+        tuple((component["name"], tuple(component["deposits"].items())) for component in split["components"]
+              if component["deposits"])
+        for split in splits
+    )
+
+    # Klify: skok AGIO standardowego na progu taryfy względem kwoty tuż poniżej progu
+    below = get_agio_array(strategy_name, np.maximum(amounts - 0.01, strategy["minValue"]))["initialAgio"]
+    jumps = standard + linear - below
+    cliffs = np.flatnonzero(jumps >= CLIFF_MIN_JUMP)
+    for array in (amounts, standard, optimal, jumps):
+        array.setflags(write=False)
+    return {
+        "amounts": amounts,
+        "standardFees": standard,
+        "optimalFees": optimal,
+        "deposits": deposits,
+        "cliffAmounts": tuple(float(amounts[i]) for i in cliffs),
+        "cliffJumps": tuple(round(float(jumps[i]), 2) for i in cliffs)
+    }
+
+
+def curve_value(strategy_name, amount):
+    # AGIO początkowe standardowe i przy optymalnym podziale oraz rekomendowane depozyty
+    # {komponent: {typ: liczba}} z odcinka krzywej - wyszukiwanie binarne, O(log n)
+    curve = cost_curve(strategy_name)
+    linear = amount * percent_rate(strategy_name)
+    index = max(bisect_right(curve["amounts"], amount) - 1, 0)
+    cliff = bisect_right(curve["cliffAmounts"], amount)
+    next_cliff = None
+    if cliff < len(curve["cliffAmounts"]):
+        next_cliff = {"amount": curve["cliffAmounts"][cliff], "jump": curve["cliffJumps"][cliff]}
+    standard = float(curve["standardFees"][index] + linear)
+    optimal = float(curve["optimalFees"][index] + linear)
+    return {
+        "standardAgio": standard,
+        "optimalAgio": optimal,
+        "saving": standard - optimal,
+        "deposits": {name: dict(items) for name, items in curve["deposits"][index]},
+        "segmentStart": float(curve["amounts"][index]),
+        "nextCliff": next_cliff
+    }
@@ -0,0 +1,377 @@
+# Eksport pełnego planu klienta: skoroszyt xlsx z zakładkami (openpyxl) albo
+# archiwum zip z plikiem Parquet na każdą tabelę (pyarrow). Oba pakiety są
+# opcjonalne i importowane dopiero przy eksporcie w danym formacie.
+# Tabele: plan, alokacja, taryfa, AGIO per komponent, percentyle Monte Carlo
+# i tygodniowy rejestr backtestu dla jednej lub wielu dat startu. Rejestr
+# (30 lat tygodni × setki scenariuszy) powstaje paczkami - po jednym scenariuszu -
+# dopisywanymi od razu do pliku, więc pamięć nie zależy od liczby scenariuszy.
+#
+# ExportJobs wykonuje eksporty w tle w ograniczonej puli procesów - openpyxl to
+# czysty Python i w wątku trzymałby GIL przez cały zapis, wstrzymując przebiegi
+# wszystkich sesji Streamlit. Postęp wraca z procesów kolejką multiprocessing,
+# którą opróżnia wątek nasłuchujący. Gdy wszystkie miejsca w puli i kolejce są
+# zajęte, submit() od razu zgłasza błąd zamiast kolejkować.
+import importlib
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from .backtest import metal_weights, run_backtest
+from .core import AGIO_RULES, COMPONENT_TABLES, PRICE_COLUMNS, get_agio, get_current_tariff, get_metals, rule_agio
+from .deposits import optimal_agio
+from .fees import STORAGE_MODES, storage_profile
+from .price_store import get_data
+from .montecarlo import block_tables, get_tables, run_monte_carlo, weekly_log_returns
+from .schedule import WEEKS_PER_YEAR, schedule_rows
+
+EXPORT_FORMATS = ("xlsx", "parquet")
+EXPORT_EXTENSIONS = {"xlsx": "xlsx", "parquet": "zip"}
+EXPORT_MIME = {"xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "parquet": "application/zip"}
+# Format -> (moduł, pakiet do zainstalowania)
+EXPORT_REQUIREMENTS = {"xlsx": ("openpyxl", "openpyxl"), "parquet": ("pyarrow.parquet", "pyarrow")}
+XLSX_MAX_ROWS = 1048576
+LEDGER_SHEET = "Backtest"
+MC_PATHS = 20000
+EXPORT_WORKERS = 2
+EXPORT_QUEUE = 4
+JOB_HISTORY = 16
+
+# Udział etapów w postępie: tabele i Monte Carlo, potem rejestr scenariuszy
+PROGRESS_TABLES = 0.05
+PROGRESS_PROJECTION = 0.2
+
+
+def require(fmt):
+    # Moduł zapisu dla formatu; brak opcjonalnego pakietu zgłaszamy przed startem zadania
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Nieznany format eksportu: {fmt}")
+    module, package = EXPORT_REQUIREMENTS[fmt]
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ValueError(f"Eksport {fmt} wymaga pakietu {package} (pip install {package})") from None
+
+
+def plan_tables(strategy_name, amount, purchase, years, storage_mode):
+    # Małe tabele raportu: tytuł -> {kolumna: lista wartości}
+    agio = get_agio(strategy_name, amount)
+    tariff = get_current_tariff(strategy_name, amount) or {}
+    metals = get_metals(strategy_name, amount)
+    components = COMPONENT_TABLES[strategy_name]
+    split = optimal_agio(strategy_name, amount)["components"]
+    component_agio = [rule_agio(AGIO_RULES[rule], amount * share) for share, rule in zip(components.shares, components.rules)]
+
+    return {
+        "Plan": {
+            "Strategia": [strategy_name],
+            "Kwota (EUR)": [amount],
+            "Zakup tygodniowy (EUR)": [purchase],
+            "Lata": [years],
+            "Koszty magazynowania": [storage_mode],
+            "Taryfa": [tariff.get("name", "")],
+            "AGIO początkowe (EUR)": [agio["initialAgio"]],
+            "Bonus (EUR)": [agio["bonus"]],
+            "AGIO efektywne (EUR)": [agio["effectiveAgio"]],
+            "AGIO efektywne (%)": [agio["effectivePercent"]],
+            "Wygenerowano": [datetime.now().isoformat(timespec="seconds")]
+        },
+        "Alokacja": {
+            "Rodzaj": ["Metal"] * len(metals) + ["Komponent"] * len(components.names),
+            "Nazwa": [m["name"] for m in metals] + list(components.names),
+            "Udział (%)": [float(m["value"]) for m in metals] + [float(value) for value in components.values],
+            "Kwota (EUR)": [m["amount"] for m in metals] + [amount * share for share in components.shares]
+        },
+        "Taryfa": {
+            "Nazwa": [tariff.get("name", "")],
+            "Od (EUR)": [tariff.get("minValue")],
+            "Do (EUR)": [tariff.get("maxValue")],
+            "AGIO": [tariff.get("agio", "")],
+            "Metale": [tariff.get("metals", "")],
+            "Magazynowanie": [tariff.get("storage", "")],
+            "Zalety": ["; ".join(tariff.get("advantages", []))],
+            "Szczegóły": [tariff.get("details", "")]
+        },
+        "AGIO": {
+            "Komponent": list(components.names),
+            "Reguła": list(components.rules),
+            "Kwota (EUR)": [amount * share for share in components.shares],
+            "AGIO (EUR)": component_agio,
+            "Bonus (EUR)": [value * AGIO_RULES[rule].bonus for value, rule in zip(component_agio, components.rules)],
+            "AGIO przy podziale (EUR)": [component["agio"] for component in split],
+            "Podział na depozyty": [", ".join(f"{count} × {name}" for name, count in component["deposits"].items())
+                                    for component in split]
+        }
+    }
+
+
+def projection_table(tables, weights, strategy_name, amount, purchase, years, storage_mode, n_paths=MC_PATHS):
+    # Percentyle Monte Carlo na koniec każdego roku (jedna paczka procesu, bez własnej puli)
+    projection = run_monte_carlo(tables, weights, amount, purchase, years, n_paths=n_paths, workers=1,
+                                 storage=storage_profile(strategy_name, amount), storage_mode=storage_mode)
+    columns = {"Rok": projection["years"].tolist(), "Wpłacono (EUR)": projection["invested"].tolist()}
+    for percentile, values in projection["percentiles"].items():
+        columns[f"P{percentile} (EUR)"] = values.tolist()
+    return columns
+
+
+def scenario_starts(data, years, stride=None):
+    # Tygodnie startu scenariuszy: ostatnie okno albo co stride tygodni przez całą historię
+    last = len(schedule_rows(data)) - 1 - WEEKS_PER_YEAR * int(years)
+    if last < 0:
+        raise ValueError(f"Za mało danych dla horyzontu {years} lat")
+    if stride is None:
+        return [last]
+    starts = list(range(last, -1, -int(stride)))
+    return starts[::-1]
+
+
+def ledger_columns(labels):
+    return (["Start scenariusza", "Tydzień", "Data", "Wpłacono (EUR)"] + [f"Uncje: {label}" for label in labels]
+            + ["Wartość rynkowa (EUR)", "Koszty magazynowania (EUR)", "Wartość netto (EUR)"])
+
+
+def ledger_chunks(data, weights, labels, amount, purchase, years, starts, storage, storage_mode):
+    # Tygodniowy rejestr backtestu: jedna paczka {kolumna: tablica} na scenariusz
+    week_rows = schedule_rows(data)
+    metals = np.flatnonzero(weights)
+    columns = ledger_columns(labels)
+    horizon = WEEKS_PER_YEAR * int(years)
+    for start in starts:
+        backtest = run_backtest(data, weights, amount, purchase, years, start, storage, storage_mode)
+        rows = week_rows[start:start + horizon + 1] - week_rows[start]
+        dates = backtest["dates"][rows]
+        values = [np.full(len(rows), dates[0]), np.arange(len(rows)), dates, backtest["costBasis"][rows]]
+        values += [backtest["ounces"][rows, metal] for metal in metals]
+        values += [backtest["marketValue"][rows], backtest["storageFees"][rows], backtest["netValue"][rows]]
+        yield dict(zip(columns, values))
+
+
+def _cells(values):
+    # Daty NumPy -> datetime.date, liczby -> typy Pythona (dla openpyxl)
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[D]").tolist()
+    return values.tolist()
+
+
+def write_xlsx(path, tables, columns, chunks, progress):
+    openpyxl = require("xlsx")
+    # Tryb write_only zapisuje wiersze strumieniowo, bez modelu całego arkusza w pamięci
+    workbook = openpyxl.Workbook(write_only=True)
+    for title, table in tables.items():
+        sheet = workbook.create_sheet(title)
+        sheet.append(list(table))
+        for row in zip(*table.values()):
+            sheet.append(list(row))
+
+    sheet, sheet_rows, part = None, XLSX_MAX_ROWS, 0
+    for chunk in chunks:
+        for row in zip(*(_cells(chunk[column]) for column in columns)):
+            # Limit wierszy arkusza - dalszy ciąg rejestru w kolejnej zakładce
+            if sheet_rows >= XLSX_MAX_ROWS:
+                part += 1
+                sheet = workbook.create_sheet(LEDGER_SHEET if part == 1 else f"{LEDGER_SHEET} {part}")
+                sheet.append(columns)
+                sheet_rows = 1
+            sheet.append(list(row))
+            sheet_rows += 1
+        progress()
+    workbook.save(path)
+
+
+def _file_name(title):
+    return title.lower().replace(" ", "_") + ".parquet"
+
+
+def write_parquet(path, tables, columns, chunks, progress):
+    pq = require("parquet")
+    import pyarrow as pa
+
+    directory = tempfile.mkdtemp(prefix="ffcalc-parquet-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        for title, table in tables.items():
+            pq.write_table(pa.table(table), os.path.join(directory, _file_name(title)))
+
+        # Każdy scenariusz rejestru to osobna grupa wierszy w jednym pliku
+        writer = None
+        try:
+            for chunk in chunks:
+                batch = pa.table({column: chunk[column] for column in columns})
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(directory, _file_name(LEDGER_SHEET)), batch.schema)
+                writer.write_table(batch)
+                progress()
+        finally:
+            if writer is not None:
+                writer.close()
+
+        # Parquet jest już skompresowany - archiwum bez ponownej kompresji
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for name in sorted(os.listdir(directory)):
+                archive.write(os.path.join(directory, name), name)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+WRITERS = {"xlsx": write_xlsx, "parquet": write_parquet}
+
+
+def export_plan(path, fmt, strategy_name, amount, purchase, years, storage_mode="metal", stride=None,
+                data=None, tables=None, n_paths=MC_PATHS, progress=None):
+    # Zapisuje raport planu do path. stride: co ile tygodni kolejna data startu
+    # scenariusza backtestu (None = tylko ostatnie okno, jak w interfejsie).
+    # progress(ułamek, etap) jest wołane po każdym etapie i scenariuszu.
+    require(fmt)
+    if storage_mode not in STORAGE_MODES:
+        raise ValueError(f"Nieznany sposób pobierania kosztów: {storage_mode}")
+    progress = progress or (lambda fraction, stage: None)
+    default_data = data is None
+    data = get_data() if default_data else data
+    weights, _ = metal_weights(get_metals(strategy_name, amount), data["columns"])
+    starts = scenario_starts(data, years, stride)
+
+    progress(0.0, "Tabele planu")
+    report = plan_tables(strategy_name, amount, purchase, years, storage_mode)
+    progress(PROGRESS_TABLES, "Projekcja Monte Carlo")
+    if tables is None:
+        # Dla domyślnych cen tablice bloków są budowane raz na proces
+        tables = get_tables() if default_data else block_tables(weekly_log_returns(data))
+    report["Monte Carlo"] = projection_table(tables, weights, strategy_name, amount, purchase, years, storage_mode, n_paths)
+
+    column_names = {column: name for name, column in PRICE_COLUMNS.items()}
+    labels = [column_names.get(data["columns"][metal], data["columns"][metal]) for metal in np.flatnonzero(weights)]
+    chunks = ledger_chunks(data, weights, labels, amount, purchase, years, starts,
+                           storage_profile(strategy_name, amount), storage_mode)
+    done = itertools.count(1)
+
+    def scenario_done():
+        count = next(done)
+        progress(PROGRESS_PROJECTION + (1 - PROGRESS_PROJECTION) * count / len(starts),
+                 f"Rejestr backtestu: scenariusz {count} z {len(starts)}")
+
+    progress(PROGRESS_PROJECTION, f"Rejestr backtestu: {len(starts)} scenariuszy")
+    WRITERS[fmt](path, report, ledger_columns(labels), chunks, scenario_done)
+    return {"path": path, "scenarios": len(starts), "rows": len(starts) * (WEEKS_PER_YEAR * int(years) + 1)}
+
+
+_progress_queue = None
+
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+
+def _export_job(job_id, path, fmt, plan, options):
+    # Zadanie w procesie puli: postęp wysyłany kolejką, wynik z czasem wykonania
+    started = time.perf_counter()
+    result = export_plan(path, fmt, *plan, **options,
+                         progress=lambda fraction, stage: _progress_queue.put((job_id, fraction, stage)))
+    return dict(result, seconds=time.perf_counter() - started)
+
+
+class ExportJobs:
+    # Zadania eksportu w tle; stan zadania to słownik (kopia w status())
+    def __init__(self, workers=EXPORT_WORKERS, queue_size=EXPORT_QUEUE, directory=None, history=JOB_HISTORY):
+        self._queue = multiprocessing.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self._queue,))
+        # Miejsca na eksporty: wykonywane + oczekujące w kolejce puli
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.directory = directory or tempfile.mkdtemp(prefix="ffcalc-export-")
+        self.history = history
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._listener = threading.Thread(target=self._listen, name="ffcalc-export-progress", daemon=True)
+        self._listener.start()
+
+    def submit(self, fmt, strategy_name, amount, purchase, years, storage_mode="metal", stride=None, **options):
+        # Zwraca identyfikator zadania; ValueError przy braku pakietu lub pełnej kolejce
+        require(fmt)
+        if not self.slots.acquire(blocking=False):
+            raise ValueError("Zbyt wiele eksportów w toku - spróbuj ponownie za chwilę")
+        job_id = next(self._ids)
+        file_name = f"ffcalc-{strategy_name.lower()}-{int(amount)}.{EXPORT_EXTENSIONS[fmt]}"
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "progress": 0.0,
+            "stage": "W kolejce",
+            "path": os.path.join(self.directory, f"{job_id}-{file_name}"),
+            "fileName": file_name,
+            "mime": EXPORT_MIME[fmt],
+            "result": None,
+            "error": None,
+            "seconds": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict()
+        try:
+            future = self.pool.submit(_export_job, job_id, job["path"], fmt,
+                                      (strategy_name, amount, purchase, years, storage_mode, stride), options)
+        except RuntimeError:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job_id
+
+    def _listen(self):
+        # Postęp z procesów puli; komunikaty spóźnione po zakończeniu zadania są pomijane
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            job_id, fraction, stage = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job["status"] in ("queued", "running"):
+                    job.update(status="running", progress=fraction, stage=stage)
+
+    def _finish(self, job, future):
+        try:
+            result = future.result()
+            fields = {"status": "done", "progress": 1.0, "stage": "Gotowe", "seconds": result.pop("seconds"),
+                      "result": result}
+        except Exception as error:
+            # Błąd zadania trafia do jego stanu - proces puli nie może go zgłosić sesji
+            if os.path.exists(job["path"]):
+                os.remove(job["path"])
+            fields = {"status": "error", "stage": "Błąd", "error": str(error)}
+        finally:
+            self.slots.release()
+        with self._lock:
+            job.update(fields)
+
+    def _evict(self):
+        # Najstarsze zakończone zadania ponad limit historii razem z plikami
+        finished = [job for job in self._jobs.values() if job["status"] in ("done", "error")]
+        for job in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job["id"]]
+            if os.path.exists(job["path"]):
+                os.remove(job["path"])
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def jobs(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+        self._queue.put(None)
+        self._listener.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,80 @@
+# Naliczanie kosztów magazynowania (SSW, Auvesta) na wartości portfela.
+# Profil kosztów to udziały komponentów z get_components() i ich miesięczne
+# stawki brutto; każdy komponent trzyma proporcjonalną część mieszanki metali.
+import numpy as np
+
+from .core import get_storage_rates
+
+STORAGE_MODES = ("metal", "eur")
+
+
+def storage_profile(strategy_name, amount):
+    rates = get_storage_rates(strategy_name, amount)
+    return {
+        "names": [row["name"] for row in rates],
+        "shares": np.array([row["value"] / 100 for row in rates]),
+        "monthlyRates": np.array([row["monthlyRate"] for row in rates])
+    }
+
+
+def month_index(days):
+    # Liczba przełomów miesiąca od pierwszego wiersza - koszt naliczany na każdym przełomie
+    months = np.asarray(days).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    return months - months[0]
+
+
+def decayed_holdings(bought, months, rates):
+    # Uncje po pobraniu kosztów w metalu: (1 - r)^m * cumsum(b / (1 - r)^m) wzdłuż osi czasu.
+    # bought (..., T, M), rates rozgłaszalne do (..., T)
+    decay = (1 - rates) ** months
+    return decay[..., None] * np.cumsum(bought / decay[..., None], axis=-2)
+
+
+def accrue_storage(bought, prices, months, profile, mode="metal"):
+    # bought (T, M) uncje kupione w wierszu, prices (T, M), months (T,) z month_index().
+    # Zwraca uncje netto (T, M) i koszty w EUR naliczone w każdym wierszu per komponent (C, T).
+    # "metal": koszt pobierany w metalu - uncje komponentu maleją o stawkę co miesiąc,
+    # co daje zamkniętą postać (1 - r)^m * cumsum(b / (1 - r)^m) zamiast pętli.
+    # "eur": koszt płacony gotówką, stan metalu bez zmian.
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Nieznany sposób pobierania kosztów: {mode}")
+    shares = profile["shares"][:, None, None]
+    rates = profile["monthlyRates"][:, None]
+
+    if mode == "metal":
+        ounces = shares * decayed_holdings(bought[None], months, rates)
+        previous = np.zeros_like(ounces)
+        previous[:, 1:] = ounces[:, :-1]
+        fees = ((previous - (ounces - shares * bought[None])) * prices[None]).sum(axis=2)
+        return ounces.sum(axis=0), fees
+
+    ounces = np.cumsum(bought, axis=0)
+    held_value = np.zeros(len(ounces))
+    held_value[1:] = (ounces[:-1] * prices[1:]).sum(axis=1)
+    elapsed = np.diff(months, prepend=months[0])
+    fees = profile["shares"][:, None] * (1 - (1 - rates) ** elapsed[None, :]) * held_value[None, :]
+    return ounces, fees
+
+
+def weekly_decay(profile, weeks=1):
+    # Współczynnik pozostających uncji po `weeks` tygodniach dla każdego komponentu
+    return (1 - profile["monthlyRates"]) ** (weeks * 12 / 52)
+
+
+def decay_groups(profile, weeks=1):
+    # Komponenty o tej samej stawce (np. GTS, GT i SMH w SSW) sumujemy w jedną grupę
+    rates, inverse = np.unique(profile["monthlyRates"], return_inverse=True)
+    shares = np.bincount(inverse, weights=profile["shares"])
+    return list(zip(shares, (1 - rates) ** (weeks * 12 / 52)))
+
+
+def total_cost_of_ownership(agio, storage_by_component, invested, names=None):
+    storage = float(np.sum(storage_by_component))
+    total = agio["effectiveAgio"] + storage
+    return {
+        "effectiveAgio": agio["effectiveAgio"],
+        "storage": storage,
+        "storageByComponent": dict(zip(names, np.asarray(storage_by_component).tolist())) if names else {},
+        "total": total,
+        "percentOfInvested": float(total / invested * 100) if invested > 0 else 0
+    }
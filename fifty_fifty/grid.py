@@ -0,0 +1,81 @@
+# Ewaluacja całej przestrzeni suwaków (strategia, kwota, zakup tygodniowy, lata)
+# w jednym wywołaniu. Wynik to zwarta tablica strukturalna posortowana po
+# strategii, kwocie, zakupie i latach - pozycję dowolnego ustawienia suwaków
+# wyznacza grid_position() bez przeszukiwania.
+import numpy as np
+
+from .backtest import WEEKS_PER_YEAR, metal_weights, rolling_factors
+from .core import get_metals, strategies
+from .vectorized import STRATEGY_NAMES, get_agio_array, get_current_tariff_array
+
+GRID_DTYPE = np.dtype([
+    ("strategy", np.uint8),
+    ("amount", np.uint32),
+    ("purchase", np.uint32),
+    ("years", np.uint8),
+    ("agio", np.float64),
+    ("effectiveAgio", np.float64),
+    ("effectivePercent", np.float32),
+    ("tariff", np.int8),
+    ("projected", np.float64),
+    ("backtestValue", np.float64)
+])
+
+
+def slider_axes(strategy):
+    # Te same wartości, które oferują suwaki w ffcalc.py
+    return (
+        np.arange(strategy["minValue"], strategy["maxValue"] + 1, strategy["step"]),
+        np.arange(strategy["minPurchase"], strategy["maxPurchase"] + 1, int(strategy["minPurchase"] / 2)),
+        np.arange(strategy["minYears"], strategy["maxYears"] + 1)
+    )
+
+
+def grid_offsets():
+    sizes = [np.prod([len(axis) for axis in slider_axes(s)]) for s in strategies]
+    return np.cumsum([0] + sizes)
+
+
+def grid_position(strategy_index, amount, purchase, years, offsets=None):
+    strategy = strategies[strategy_index]
+    amounts, purchases, years_axis = slider_axes(strategy)
+    offsets = grid_offsets() if offsets is None else offsets
+    amount_index = (amount - strategy["minValue"]) // strategy["step"]
+    purchase_index = (purchase - strategy["minPurchase"]) // int(strategy["minPurchase"] / 2)
+    years_index = years - strategy["minYears"]
+    return offsets[strategy_index] + (amount_index * len(purchases) + purchase_index) * len(years_axis) + years_index
+
+
+def evaluate_grid(data=None):
+    # AGIO i taryfa zależą tylko od kwoty, wynik backtestu jest liniowy względem
+    # kwoty i zakupu - liczymy je raz na oś i rozgłaszamy na całą siatkę
+    blocks = []
+    for strategy in strategies:
+        amounts, purchases, years_axis = slider_axes(strategy)
+        block = np.empty((len(amounts), len(purchases), len(years_axis)), dtype=GRID_DTYPE)
+        block["strategy"] = STRATEGY_NAMES.index(strategy["name"])
+        block["amount"] = amounts[:, None, None]
+        block["purchase"] = purchases[None, :, None]
+        block["years"] = years_axis[None, None, :]
+
+        agio = get_agio_array(strategy["name"], amounts)
+        block["agio"] = agio["initialAgio"][:, None, None]
+        block["effectiveAgio"] = agio["effectiveAgio"][:, None, None]
+        block["effectivePercent"] = agio["effectivePercent"][:, None, None]
+        block["tariff"] = get_current_tariff_array(strategy["name"], amounts)[:, None, None]
+        block["projected"] = amounts[:, None, None] + purchases[None, :, None] * WEEKS_PER_YEAR * years_axis[None, None, :]
+
+        block["backtestValue"] = np.nan
+        if data is not None:
+            weights, _ = metal_weights(get_metals(strategy["name"], 1), data["columns"])
+            for index, years in enumerate(years_axis):
+                try:
+                    factors = rolling_factors(data, weights, years)
+                except ValueError:
+                    continue
+                # Ostatnie okno - ten sam backtest co run_backtest() z domyślnym startem
+                block["backtestValue"][:, :, index] = (
+                    amounts[:, None] * factors["initial"][-1] + purchases[None, :] * factors["weekly"][-1]
+                )
+        blocks.append(block.ravel())
+    return np.concatenate(blocks)
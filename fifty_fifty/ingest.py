@@ -0,0 +1,128 @@
+# Przyrostowe dopisywanie nowych fixingów LBMA z lokalnego pliku zrzutu:
+#   python -m fifty_fifty.ingest nowe_fixingi.csv
+# Zrzut ma ten sam nagłówek co lbma_data.csv. Daty muszą rosnąć ściśle; wiersze
+# z datą już obecną w magazynie i identycznymi cenami są pomijane jako duplikaty,
+# inne ceny dla istniejącej daty albo data brakująca w środku historii to błąd.
+# Nowe wiersze są dopisywane na koniec CSV i magazynu cen razem z artefaktami
+# pochodnymi, więc koszt zależy od liczby nowych dni, nie długości historii.
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from .price_store import LBMA_PATH, append_store, default_cache_dir, open_store
+
+# Luka większa niż tyle dni roboczych bez fixingu jest raportowana
+GAP_BUSINESS_DAYS = 3
+
+
+def read_drop(path, columns):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        rows = [row for row in reader if row]
+    if header is None or header[1:] != list(columns):
+        raise ValueError(f"Nagłówek zrzutu musi mieć kolumny: Date, {', '.join(columns)}")
+    try:
+        days = np.array([row[0] for row in rows], dtype="datetime64[D]").astype(np.int32)
+        prices = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(columns))
+    except ValueError as error:
+        raise ValueError(f"Niepoprawny wiersz zrzutu: {error}") from None
+    if not np.all(np.isfinite(prices)) or np.any(prices <= 0):
+        raise ValueError("Ceny muszą być dodatnimi liczbami")
+    if np.any(np.diff(days) <= 0):
+        position = int(np.flatnonzero(np.diff(days) <= 0)[0]) + 1
+        raise ValueError(f"Daty zrzutu nie rosną ściśle: {np.datetime64(int(days[position]), 'D')}")
+    return days, prices
+
+
+def split_drop(data, days, prices):
+    # Zwraca liczbę wierszy już obecnych w magazynie (duplikaty); nowe są po nich
+    last_day = int(data["days"][-1])
+    existing = int(np.searchsorted(days, last_day, side="right"))
+    if existing:
+        positions = np.searchsorted(data["days"], days[:existing])
+        stored = data["days"][np.minimum(positions, len(data["days"]) - 1)]
+        missing = np.flatnonzero(stored != days[:existing])
+        if len(missing):
+            raise ValueError(f"Brak w historii dnia {np.datetime64(int(days[missing[0]]), 'D')} - dopisywać można tylko na końcu")
+        changed = np.flatnonzero(np.any(data["prices"][positions] != prices[:existing], axis=1))
+        if len(changed):
+            raise ValueError(f"Inne ceny dla zapisanego dnia {np.datetime64(int(days[changed[0]]), 'D')}")
+    return existing
+
+
+def find_gaps(previous_day, days, limit=GAP_BUSINESS_DAYS):
+    # Luki między kolejnymi fixingami (łącznie z ostatnim zapisanym dniem) liczone w dniach roboczych
+    dates = np.concatenate([[previous_day], days]).astype("datetime64[D]")
+    missing = np.busday_count(dates[:-1] + 1, dates[1:])
+    return [
+        {"after": str(dates[i]), "before": str(dates[i + 1]), "businessDays": int(missing[i])}
+        for i in np.flatnonzero(missing > limit)
+    ]
+
+
+def _append_csv(csv_path, days, prices):
+    with open(csv_path, "rb+") as f:
+        f.seek(0, 2)
+        if f.tell():
+            f.seek(-1, 2)
+            needs_newline = f.read(1) != b"\n"
+        else:
+            needs_newline = False
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        if needs_newline:
+            f.write("\n")
+        writer = csv.writer(f, lineterminator="\n")
+        for day, row in zip(days.astype("datetime64[D]"), prices):
+            writer.writerow([str(day)] + [repr(float(value)) for value in row])
+
+
+def ingest(drop_path, csv_path=LBMA_PATH, cache_dir=None):
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    data = open_store(csv_path, cache_dir)
+    days, prices = read_drop(drop_path, data["columns"])
+    duplicates = split_drop(data, days, prices) if len(days) else 0
+    days, prices = days[duplicates:], prices[duplicates:]
+    report = {
+        "added": len(days),
+        "duplicates": duplicates,
+        "gaps": find_gaps(int(data["days"][-1]), days) if len(days) else [],
+        "firstDate": str(np.datetime64(int(days[0]), "D")) if len(days) else None,
+        "lastDate": str(np.datetime64(int(days[-1] if len(days) else data["days"][-1]), "D")),
+        "rows": len(data["days"]) + len(days)
+    }
+    if not len(days):
+        return report
+
+    _append_csv(csv_path, days, prices)
+    try:
+        append_store(csv_path, cache_dir, days, prices)
+    except OSError:
+        # Magazyn niedostępny do zapisu - zostanie zbudowany z CSV przy otwarciu
+        pass
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fifty_fifty.ingest", description="Dopisanie nowych fixingów LBMA do historii cen")
+    parser.add_argument("drop", help="plik CSV z nowymi fixingami (nagłówek jak w lbma_data.csv)")
+    parser.add_argument("--csv", default=LBMA_PATH, help="plik historii cen")
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        report = ingest(args.drop, args.csv, args.cache_dir)
+    except ValueError as error:
+        print(f"Błąd: {error}", file=sys.stderr)
+        return 1
+    for gap in report["gaps"]:
+        print(f"Uwaga: {gap['businessDays']} dni roboczych bez fixingu między {gap['after']} a {gap['before']}", file=sys.stderr)
+    print(f"Dopisano {report['added']} dni (duplikaty: {report['duplicates']}), ostatni fixing {report['lastDate']}, "
+          f"wierszy razem: {report['rows']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
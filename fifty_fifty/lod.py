@@ -0,0 +1,128 @@
+# Poziom szczegółowości (LOD) dla długich serii na wykresach: zamiast wysyłać każdy
+# fixing do przeglądarki zmniejszamy serię do LOD_POINTS punktów zachowując kształt
+# (LTTB albo min/max w kubełkach). Widoczny zakres dat wyrównujemy do kafelków
+# poziomu przybliżenia, a wynik trzymamy w pamięci podręcznej LRU per kafelek.
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+LOD_POINTS = 1500
+WEBGL_THRESHOLD = 5000
+LOD_METHODS = ("lttb", "minmax")
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _numeric(x):
+    x = np.asarray(x)
+    if x.dtype.kind == "M":
+        return x.astype("datetime64[D]").astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: z każdego kubełka punkt tworzący największy
+    # trójkąt z poprzednio wybranym punktem i średnią następnego kubełka.
+    # Średnie kubełków liczymy z sum prefiksowych, pętla idzie tylko po kubełkach.
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    prefix_x = np.concatenate([[0.0], np.cumsum(x)])
+    prefix_y = np.concatenate([[0.0], np.nancumsum(y)])
+    sizes = np.diff(edges)
+    mean_x = np.append((prefix_x[edges[1:]] - prefix_x[edges[:-1]]) / sizes, x[-1])
+    mean_y = np.append((prefix_y[edges[1:]] - prefix_y[edges[:-1]]) / sizes, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        area = np.abs((x[anchor] - next_x) * (y[low:high] - y[anchor]) - (x[anchor] - x[low:high]) * (next_y - y[anchor]))
+        anchor = low + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def minmax_indices(y, threshold):
+    # Minimum i maksimum każdego z threshold / 2 kubełków - w pełni wektorowo
+    n = len(y)
+    buckets = threshold // 2
+    if 2 * buckets + 2 >= n or buckets < 1:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.pad(np.asarray(y, dtype=np.float64), (0, size * buckets - n), mode="edge").reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    low = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    high = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    return np.unique(np.concatenate([[0, n - 1], np.minimum(low, n - 1), np.minimum(high, n - 1)]))
+
+
+def zoom_window(x, x_range=None):
+    # Wiersze [start, stop) widocznego zakresu wyrównane do kafelków poziomu przybliżenia:
+    # na poziomie L seria ma 2^L kafelków, a widoczny zakres obejmuje najwyżej dwa
+    n = len(x)
+    if x_range is None or n == 0:
+        return 0, n, 0
+    x = np.asarray(x)
+    low, high = x_range
+    if x.dtype.kind == "M":
+        low, high = np.datetime64(low, "D"), np.datetime64(high, "D")
+    start = int(np.searchsorted(x, low, side="left"))
+    stop = max(int(np.searchsorted(x, high, side="right")), start + 1)
+    level = max(int(np.floor(np.log2(n / (stop - start)))), 0)
+    tile = n / 2 ** level
+    first_tile = int(start // tile)
+    return int(first_tile * tile), min(int(np.ceil((first_tile + 2) * tile)), n), level
+
+
+def series_key(x, y):
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (x, y):
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def downsample(x, y, max_points=LOD_POINTS, x_range=None, method="lttb"):
+    # Zwraca (x, y) z najwyżej max_points punktami (dla "minmax" max_points + 2)
+    if method not in LOD_METHODS:
+        raise ValueError(f"Nieznana metoda LOD: {method}")
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    start, stop, level = zoom_window(x, x_range)
+    key = (series_key(x, y), max_points, method, level, start, stop)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    window_x, window_y = x[start:stop], y[start:stop]
+    if method == "lttb":
+        indices = lttb_indices(_numeric(window_x), window_y, max_points)
+    else:
+        indices = minmax_indices(window_y, max_points)
+    result = (window_x[indices], window_y[indices])
+
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def lod_trace(x, y, max_points=LOD_POINTS, x_range=None, method="lttb", **trace):
+    # Ślad Plotly ze zmniejszoną serią; długie serie (liczba fixingów w widocznym
+    # oknie przed zmniejszeniem) jako WebGL (Scattergl)
+    import plotly.graph_objects as go
+
+    start, stop, _ = zoom_window(np.asarray(x), x_range)
+    x, y = downsample(x, y, max_points, x_range, method)
+    trace_type = go.Scattergl if stop - start > WEBGL_THRESHOLD else go.Scatter
+    return trace_type(x=x, y=y, **trace)
@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .backtest import WEEKS_PER_YEAR
+from .fees import decay_groups, weekly_decay
+from .price_store import get_data
+from .schedule import schedule_rows
+
+MC_PERCENTILES = (5, 50, 95)
+BLOCK_WEEKS = 13  # kwartalne bloki zachowują autokorelację zwrotów
+BATCH_PATHS = 5000
+
+_executor = None
+_executor_workers = None
+_tables = None
+
+
+def weekly_log_returns(data):
+    prices = data["prices"][schedule_rows(data)]
+    return np.diff(np.log(prices), axis=0)
+
+
+def block_tables(returns, block=BLOCK_WEEKS):
+    # Dla każdego możliwego początku bloku: łączny log-zwrot bloku oraz suma
+    # odwrotności cen w tygodniach bloku (względem ceny na jego początku).
+    # Ścieżka złożona z bloków wymaga wtedy O(liczba bloków), a nie O(tygodnie).
+    if WEEKS_PER_YEAR % block:
+        raise ValueError(f"Długość bloku musi dzielić {WEEKS_PER_YEAR} tygodnie")
+    log_prices = np.zeros((len(returns) + 1, returns.shape[1]))
+    np.cumsum(returns, axis=0, out=log_prices[1:])
+    inverse = np.zeros_like(log_prices)
+    np.cumsum(np.exp(-log_prices[:-1]), axis=0, out=inverse[1:])
+
+    starts = np.arange(len(returns) - block + 1)
+    growth = log_prices[starts + block] - log_prices[starts]
+    inverse_sum = np.exp(log_prices[starts]) * (inverse[starts + block] - inverse[starts])
+    return block, growth, inverse_sum
+
+
+def get_tables():
+    # Tablice bloków dla domyślnych cen budowane raz na proces (również w procesach pul)
+    global _tables
+    if _tables is None:
+        _tables = block_tables(weekly_log_returns(get_data()))
+    return _tables
+
+
+def simulate_batch(tables, weights, amount, purchase, years, n_paths, seed, storage=None, storage_mode="metal"):
+    # Wartość portfela na koniec każdego roku dla n_paths ścieżek. Ceny względne
+    # zaczynają od 1, zakupy w tygodniach 0..t-1, wycena w tygodniu t.
+    # Koszty magazynowania naliczane na końcu każdego bloku (zakupy z bloku traktowane
+    # jak dokonane na jego początku): w metalu jako zanik uncji D^k, w EUR jako
+    # opłata (1 - D) * wartość odejmowana od majątku.
+    block, growth, inverse_sum = tables
+    rng = np.random.default_rng(seed)
+    n_blocks = WEEKS_PER_YEAR * int(years) // block
+    index = rng.integers(0, len(growth), size=(n_paths, n_blocks))
+
+    log_level = np.zeros((n_paths, n_blocks + 1, growth.shape[1]))
+    np.cumsum(growth[index], axis=1, out=log_level[:, 1:])
+    bought = np.exp(-log_level[:, :-1]) * inverse_sum[index]
+    checkpoints = np.arange(1, int(years) + 1) * (WEEKS_PER_YEAR // block)
+
+    if storage is None or storage_mode == "eur":
+        ounces_per_eur = np.cumsum(bought, axis=1)
+        ounces = (amount + purchase * ounces_per_eur) * weights
+    elif storage_mode == "metal":
+        ounces = np.zeros(bought.shape)
+        blocks = np.arange(1, n_blocks + 1)[:, None]
+        for share, decay in decay_groups(storage, block):
+            ounces_per_eur = np.cumsum(bought * decay ** (1 - blocks), axis=1)
+            ounces += share * decay ** blocks * (amount + purchase * ounces_per_eur)
+        ounces *= weights
+    else:
+        raise ValueError(f"Nieznany sposób pobierania kosztów: {storage_mode}")
+
+    values = np.empty((n_paths, len(checkpoints) + 1))
+    values[:, 0] = amount
+    if storage is not None and storage_mode == "eur":
+        block_values = (ounces * np.exp(log_level[:, 1:])).sum(axis=2)
+        fee_rate = (storage["shares"] * (1 - weekly_decay(storage, block))).sum()
+        fees = np.cumsum(fee_rate * block_values, axis=1)
+        values[:, 1:] = block_values[:, checkpoints - 1] - fees[:, checkpoints - 1]
+    else:
+        values[:, 1:] = (ounces[:, checkpoints - 1] * np.exp(log_level[:, checkpoints])).sum(axis=2)
+    return values
+
+
+def _simulate_task(args):
+    return simulate_batch(*args)
+
+
+def get_executor(workers):
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        _executor_workers = workers
+    return _executor
+
+
+def run_monte_carlo(tables, weights, amount, purchase, years, n_paths=20000, seed=0, workers=None,
+                    storage=None, storage_mode="metal"):
+    # Ścieżki dzielone na paczki z własnymi ziarnami z SeedSequence, więc wynik
+    # zależy tylko od seed i n_paths, a nie od liczby procesów
+    batch_sizes = [BATCH_PATHS] * (n_paths // BATCH_PATHS)
+    if n_paths % BATCH_PATHS:
+        batch_sizes.append(n_paths % BATCH_PATHS)
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    tasks = [(tables, weights, amount, purchase, years, size, batch_seed, storage, storage_mode)
+             for size, batch_seed in zip(batch_sizes, seeds)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        batches = [_simulate_task(task) for task in tasks]
+    else:
+        batches = list(get_executor(workers).map(_simulate_task, tasks))
+    values = np.concatenate(batches)
+
+    years_axis = np.arange(int(years) + 1)
+    return {
+        "years": years_axis,
+        "invested": amount + purchase * WEEKS_PER_YEAR * years_axis,
+        "percentiles": dict(zip(MC_PERCENTILES, np.percentile(values, MC_PERCENTILES, axis=0))),
+        "paths": n_paths
+    }
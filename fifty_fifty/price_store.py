@@ -0,0 +1,252 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .risk import RunningDrawdown, RunningMoments
+
+# Kolumnowy cache binarny dla lbma_data.csv: daty jako int32 (dni od 1970-01-01),
+# ceny jako macierz float64 zapisana kolumnami (order="F"), metadane w meta.json.
+# Pliki mają zapas wierszy (capacity), więc dopisanie nowych fixingów zapisuje tylko
+# nowe wiersze w każdej kolumnie. Obok cen trzymamy artefakty pochodne aktualizowane
+# przyrostowo: indeksy pierwszego fixingu tygodnia, sumy prefiksowe 1 / cena w tych
+# wierszach oraz stan momentów i obsunięcia dziennych log-zwrotów (w meta.json).
+LBMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lbma_data.csv")
+
+STORE_VERSION = 2
+META_FILE = "meta.json"
+DAYS_FILE = "days.i32"
+PRICES_FILE = "prices.f64"
+WEEKS_FILE = "weeks.i32"
+INVERSE_FILE = "inverse.f64"
+MIN_CAPACITY = 1024
+
+_data = None
+
+
+def default_cache_dir(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), ".cache", name)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_csv(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [row for row in reader if row]
+    days = np.array([row[0] for row in rows], dtype="datetime64[D]").astype(np.int32)
+    prices = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(header) - 1)
+    return days, header[1:], prices
+
+
+def grown_capacity(rows):
+    return max(MIN_CAPACITY, rows + rows // 2)
+
+
+def derive(days, prices, previous=None):
+    # Artefakty pochodne dla nowych wierszy (tydzień od poniedziałku; 1970-01-01 był
+    # czwartkiem, stąd przesunięcie o 3 dni). previous: stan z meta["derived"] po
+    # dotychczasowych wierszach (None przy budowie od zera). Zwraca pozycje nowych
+    # tygodni względem początku `days`, kolejne wiersze sum prefiksowych 1 / cena
+    # i nowy stan - koszt zależy tylko od liczby nowych wierszy.
+    weeks = (np.asarray(days, dtype=np.int64) + 3) // 7
+    previous_week = (previous["lastDay"] + 3) // 7 if previous else weeks[0] - 1
+    starts = np.flatnonzero(np.diff(weeks, prepend=previous_week))
+
+    inverse_sum = np.array(previous["inverseSum"]) if previous else np.zeros(prices.shape[1])
+    inverse_prefix = inverse_sum + np.cumsum(1.0 / prices[starts], axis=0)
+
+    log_prices = np.log(prices)
+    if previous:
+        returns = np.diff(np.vstack([np.log(previous["lastPrices"]), log_prices]), axis=0)
+        moments = RunningMoments.from_state(previous["moments"])
+        drawdown = RunningDrawdown.from_state(previous["drawdown"])
+    else:
+        returns = np.diff(log_prices, axis=0)
+        moments, drawdown = RunningMoments(prices.shape[1]), RunningDrawdown(prices.shape[1])
+    moments.update(returns)
+    drawdown.update(prices)
+
+    state = {
+        "lastDay": int(days[-1]),
+        "lastPrices": prices[-1].tolist(),
+        "inverseSum": (inverse_prefix[-1] if len(starts) else inverse_sum).tolist(),
+        "moments": moments.state(),
+        "drawdown": drawdown.state()
+    }
+    return starts, inverse_prefix, state
+
+
+def _source_info(csv_path):
+    stat = os.stat(csv_path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == STORE_VERSION else None
+
+
+def _write_meta(cache_dir, meta):
+    # meta.json zapisywany na końcu i atomowo - jego obecność oznacza kompletny cache
+    tmp_path = os.path.join(cache_dir, META_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+
+
+def _write_column_file(path, array, capacity=None):
+    # Wiersze [0, len) i zerowy zapas do capacity, każda kolumna ciągła
+    if capacity is not None and capacity > len(array):
+        padded = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        padded[:len(array)] = array
+        array = padded
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(array.tobytes(order="F"))
+    os.replace(tmp_path, path)
+
+
+def _open_column_file(cache_dir, name, dtype, capacity, columns=None, mode="r"):
+    shape = (capacity,) if columns is None else (capacity, columns)
+    return np.memmap(os.path.join(cache_dir, name), dtype=dtype, mode=mode, shape=shape, order="F")
+
+
+def _write_arrays(cache_dir, days, prices, week_rows, inverse, capacity, week_capacity):
+    _write_column_file(os.path.join(cache_dir, DAYS_FILE), days, capacity)
+    _write_column_file(os.path.join(cache_dir, PRICES_FILE), prices, capacity)
+    _write_column_file(os.path.join(cache_dir, WEEKS_FILE), week_rows.astype(np.int32), week_capacity)
+    _write_column_file(os.path.join(cache_dir, INVERSE_FILE), inverse, week_capacity + 1)
+
+
+def build_store(csv_path, cache_dir, sha256=None):
+    days, columns, prices = parse_csv(csv_path)
+    week_rows, inverse_prefix, state = derive(days, prices)
+    inverse = np.vstack([np.zeros((1, len(columns))), inverse_prefix])
+    capacity, week_capacity = grown_capacity(len(days)), grown_capacity(len(week_rows))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_arrays(cache_dir, days, prices, week_rows, inverse, capacity, week_capacity)
+    meta = {
+        "version": STORE_VERSION,
+        "source": dict(_source_info(csv_path), sha256=sha256 or file_sha256(csv_path)),
+        "rows": len(days),
+        "capacity": capacity,
+        "weeks": len(week_rows),
+        "weekCapacity": week_capacity,
+        "columns": columns,
+        "derived": state
+    }
+    _write_meta(cache_dir, meta)
+    return meta
+
+
+def append_store(csv_path, cache_dir, days, prices):
+    # Dopisuje wiersze (już dopisane do csv_path) do aktualnego magazynu. Nowe wiersze
+    # trafiają w zapas każdej kolumny; dopiero przy jego braku pliki są przepisywane
+    # z większą pojemnością (koszt zamortyzowany). Czytelnicy z otwartym memmap widzą
+    # stare `rows` z meta.json, który zapisujemy na końcu.
+    meta = _read_meta(cache_dir)
+    if meta is None:
+        raise OSError(f"Brak magazynu cen w {cache_dir}")
+    rows, weeks, columns = meta["rows"], meta["weeks"], len(meta["columns"])
+    starts, inverse_prefix, state = derive(days, prices, meta["derived"])
+
+    if rows + len(days) > meta["capacity"] or weeks + len(starts) > meta["weekCapacity"]:
+        old_days = np.array(_open_column_file(cache_dir, DAYS_FILE, np.int32, meta["capacity"])[:rows])
+        old_prices = np.array(_open_column_file(cache_dir, PRICES_FILE, np.float64, meta["capacity"], columns)[:rows])
+        old_weeks = np.array(_open_column_file(cache_dir, WEEKS_FILE, np.int32, meta["weekCapacity"])[:weeks])
+        old_inverse = np.array(_open_column_file(cache_dir, INVERSE_FILE, np.float64, meta["weekCapacity"] + 1, columns)[:weeks + 1])
+        meta["capacity"] = max(meta["capacity"], grown_capacity(rows + len(days)))
+        meta["weekCapacity"] = max(meta["weekCapacity"], grown_capacity(weeks + len(starts)))
+        _write_arrays(cache_dir, old_days, old_prices, old_weeks, old_inverse, meta["capacity"], meta["weekCapacity"])
+
+    for name, dtype, capacity, width, start, values in [
+        (DAYS_FILE, np.int32, meta["capacity"], None, rows, days),
+        (PRICES_FILE, np.float64, meta["capacity"], columns, rows, prices),
+        (WEEKS_FILE, np.int32, meta["weekCapacity"], None, weeks, rows + starts),
+        (INVERSE_FILE, np.float64, meta["weekCapacity"] + 1, columns, weeks + 1, inverse_prefix)
+    ]:
+        target = _open_column_file(cache_dir, name, dtype, capacity, width, mode="r+")
+        target[start:start + len(values)] = values
+        target.flush()
+        del target
+
+    meta.update(rows=rows + len(days), weeks=weeks + len(starts), derived=state)
+    # Suma SHA-256 wymagałaby czytania całego pliku; przy zmianie mtime magazyn
+    # zostanie porównany od nowa i w razie potrzeby przebudowany
+    meta["source"] = dict(_source_info(csv_path), sha256=None)
+    _write_meta(cache_dir, meta)
+    return meta
+
+
+def _is_fresh(csv_path, cache_dir, meta):
+    source = _source_info(csv_path)
+    if all(meta["source"].get(key) == value for key, value in source.items()):
+        return True, None
+    # Zmieniony mtime (np. po kopiowaniu do kontenera) nie wymusza przebudowy,
+    # jeśli zawartość pliku jest identyczna
+    sha256 = file_sha256(csv_path)
+    if meta["source"].get("sha256") == sha256:
+        meta["source"].update(source)
+        _write_meta(cache_dir, meta)
+        return True, sha256
+    return False, sha256
+
+
+def as_data(days, columns, prices, week_rows=None, inverse=None, state=None):
+    if week_rows is None:
+        week_rows, inverse_prefix, state = derive(days, prices)
+        inverse = np.vstack([np.zeros((1, prices.shape[1])), inverse_prefix])
+    return {
+        "days": days,
+        "dates": days.astype("datetime64[D]"),
+        "columns": list(columns),
+        "prices": prices,
+        "weekRows": week_rows,
+        # Sumy prefiksowe 1 / cena w wierszach tygodniowych, wiersz 0 to zera
+        "inverseCumsum": inverse,
+        "moments": state["moments"],
+        "drawdown": state["drawdown"]
+    }
+
+
+def open_store(csv_path, cache_dir=None):
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    try:
+        meta = _read_meta(cache_dir)
+        fresh, sha256 = _is_fresh(csv_path, cache_dir, meta) if meta else (False, None)
+        if not fresh:
+            meta = build_store(csv_path, cache_dir, sha256)
+    except OSError:
+        # Katalog cache tylko do odczytu - parsujemy CSV bez zapisu
+        return as_data(*parse_csv(csv_path))
+
+    rows, weeks, columns = meta["rows"], meta["weeks"], meta["columns"]
+    days = _open_column_file(cache_dir, DAYS_FILE, np.int32, meta["capacity"])[:rows]
+    prices = _open_column_file(cache_dir, PRICES_FILE, np.float64, meta["capacity"], len(columns))[:rows]
+    week_rows = _open_column_file(cache_dir, WEEKS_FILE, np.int32, meta["weekCapacity"])[:weeks]
+    inverse = _open_column_file(cache_dir, INVERSE_FILE, np.float64, meta["weekCapacity"] + 1, len(columns))[:weeks + 1]
+    return as_data(days, columns, prices, week_rows, inverse, meta["derived"])
+
+
+def get_data():
+    # Domyślne ceny otwierane leniwie raz na proces (również w procesach pul)
+    global _data
+    if _data is None:
+        _data = open_store(LBMA_PATH)
+    return _data
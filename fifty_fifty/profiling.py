@@ -0,0 +1,148 @@
+# Opcjonalne profilowanie przebiegów skryptu Streamlit, włączane zmienną
+# środowiskową FFCALC_PROFILE=1 (FFCALC_PROFILE_LOG=plik.jsonl dopisuje każdy
+# przebieg jako wiersz JSON). Bez niej instrument() zwraca funkcję bez opakowania,
+# a section() nic nie robi - brak narzutu w produkcji.
+#
+# Przebieg (rerun) to czas od start_run() do finish_run(): sekcje interfejsu
+# mierzone od jednego section() do następnego oraz funkcje z liczbą wywołań,
+# czasem i trafieniami pamięci podręcznej. Trafienie wykrywamy licznikiem wewnątrz
+# dekoratora cache - funkcja wewnętrzna wykonuje się tylko przy chybieniu.
+# Przebiegi są per wątek, bo Streamlit wykonuje skrypt każdej sesji w osobnym wątku.
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+PROFILE_ENV = "FFCALC_PROFILE"
+PROFILE_LOG_ENV = "FFCALC_PROFILE_LOG"
+HISTORY_SIZE = 50
+
+ENABLED = os.environ.get(PROFILE_ENV, "").strip().lower() not in ("", "0", "false", "no")
+
+_local = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_runs = 0
+
+
+def _new_run(label):
+    global _runs
+    with _history_lock:
+        _runs += 1
+        number = _runs
+    return {
+        "run": number,
+        "label": label,
+        "started": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "startedAt": time.perf_counter(),
+        "section": None,
+        "sectionAt": None,
+        "sections": {},
+        "functions": {}
+    }
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+def start_run(label="rerun"):
+    if ENABLED:
+        _local.run = _new_run(label)
+
+
+def section(name):
+    # Zamyka poprzednią sekcję i otwiera nową
+    run = current_run()
+    if run is None:
+        return
+    now = time.perf_counter()
+    if run["section"] is not None:
+        run["sections"][run["section"]] = run["sections"].get(run["section"], 0.0) + now - run["sectionAt"]
+    run["section"], run["sectionAt"] = name, now
+
+
+def finish_run():
+    # Zwraca rekord przebiegu (bez pól wewnętrznych) i dopisuje go do historii i logu
+    run = current_run()
+    if run is None:
+        return None
+    section(None)
+    _local.run = None
+    record = {key: value for key, value in run.items() if key not in ("startedAt", "section", "sectionAt")}
+    record["seconds"] = time.perf_counter() - run["startedAt"]
+    for stats in record["functions"].values():
+        stats["hits"] = stats["calls"] - stats["misses"] if stats["cached"] else None
+    with _history_lock:
+        _history.append(record)
+    log_path = os.environ.get(PROFILE_LOG_ENV)
+    if log_path:
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return record
+
+
+def history():
+    with _history_lock:
+        return list(_history)
+
+
+def export_json(records=None):
+    return json.dumps(history() if records is None else records, ensure_ascii=False, indent=2)
+
+
+def _stats(run, name):
+    return run["functions"].setdefault(name, {"calls": 0, "seconds": 0.0, "maxSeconds": 0.0, "misses": 0, "cached": False})
+
+
+def _timer(name, function, cached=False):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        run = current_run()
+        standalone = run is None
+        if standalone:
+            # Wywołanie poza przebiegiem skryptu (np. ponowne wykonanie samego fragmentu)
+            start_run(f"fragment:{name}")
+            run = current_run()
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = _stats(run, name)
+            stats["cached"] = cached
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["maxSeconds"] = max(stats["maxSeconds"], elapsed)
+            if standalone:
+                finish_run()
+    return wrapper
+
+
+def _miss_counter(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        run = current_run()
+        if run is not None:
+            _stats(run, name)["misses"] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def instrument(cache=None, name=None):
+    # Dekorator: @instrument() mierzy funkcję, @instrument(st.cache_data(...)) dodatkowo
+    # nakłada dekorator cache i liczy trafienia
+    def decorate(function):
+        if not ENABLED:
+            return cache(function) if cache else function
+        label = name or function.__name__
+        if cache is None:
+            return _timer(label, function)
+        cached = cache(_miss_counter(label, function))
+        wrapper = _timer(label, cached, cached=True)
+        wrapper.clear = getattr(cached, "clear", None)
+        return wrapper
+    return decorate
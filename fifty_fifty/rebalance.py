@@ -0,0 +1,150 @@
+# Symulacja dryfu wag metali i rebalancingu do wag docelowych z get_metals().
+# Tryby: "calendar" - przywrócenie wag co `months` miesięcy, "band" - gdy odchylenie
+# którejkolwiek wagi przekroczy `band`, "cashflow" - bez sprzedaży, zakupy tygodniowe
+# kierowane do metali poniżej wagi docelowej. Między rebalancingami uncje rosną tylko
+# o zakupy, więc stan to suma prefiksowa zakupów plus stała korekta segmentu.
+import numpy as np
+
+from .backtest import purchase_plan
+from .fees import month_index
+
+REBALANCE_MODES = ("calendar", "band", "cashflow")
+DEFAULT_BANDS = (0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2)
+FIRST_CHUNK = 64
+
+
+def drift_weights(holdings, prices, target):
+    values = holdings * prices
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = values / values.sum(axis=-1, keepdims=True)
+    return weights, np.abs(weights - target).max(axis=-1)
+
+
+def next_breach(bought, prices, target, offset, start, band):
+    # Pierwszy wiersz po `start`, w którym dryf przekracza pasmo (-1 gdy brak).
+    # Dryf liczymy wektorowo na coraz dłuższych fragmentach ścieżki, więc przy
+    # rzadkich sygnałach koszt to O(T), a przy częstych nie liczymy całej reszty okna.
+    size = FIRST_CHUNK
+    position = start + 1
+    while position < len(prices):
+        stop = min(position + size, len(prices))
+        _, drift = drift_weights(offset + bought[position:stop], prices[position:stop], target)
+        breach = np.argmax(drift > band)
+        if drift[breach] > band:
+            return position + breach
+        position, size = stop, size * 2
+    return -1
+
+
+def calendar_rows(days, months):
+    # Pierwszy wiersz każdego kolejnego okresu `months` miesięcy od startu okna
+    period = month_index(days) // months
+    return np.flatnonzero(np.diff(period)) + 1
+
+
+def cashflow_purchases(cash, prices, target):
+    # Wpłata trafia do metali proporcjonalnie do niedoboru względem wag docelowych
+    # po wpłacie; suma niedoborów jest zawsze >= wpłata, więc nic nie sprzedajemy
+    bought = np.zeros(prices.shape)
+    current = np.zeros(prices.shape[1])
+    for row in np.flatnonzero(cash):
+        values = current * prices[row]
+        deficit = np.maximum(target * (values.sum() + cash[row]) - values, 0)
+        bought[row] = cash[row] * deficit / deficit.sum() / prices[row]
+        current += bought[row]
+    return bought
+
+
+def _simulate(prices, cash, target, mode, band=None, rows=None):
+    if mode == "cashflow":
+        bought = cashflow_purchases(cash, prices, target)
+        return np.cumsum(bought, axis=0), bought, [], 0, 0.0
+
+    bought = cash[:, None] * target / prices
+    total = np.cumsum(bought, axis=0)
+    starts, offsets = [0], [np.zeros(len(target))]
+    trades, turnover = 0, 0.0
+
+    def rebalance(row):
+        nonlocal trades, turnover
+        holdings = offsets[-1] + total[row]
+        value = holdings @ prices[row]
+        traded = np.abs(target * value / prices[row] - holdings) * prices[row]
+        # Obrót jednostronny: sprzedaż pokrywa zakupy
+        turnover += traded.sum() / 2
+        trades += int(np.count_nonzero(traded > value * 1e-9))
+        starts.append(row)
+        offsets.append(target * value / prices[row] - total[row])
+
+    if mode == "calendar":
+        for row in rows:
+            rebalance(row)
+    else:
+        row = next_breach(total, prices, target, offsets[-1], 0, band)
+        while row >= 0:
+            rebalance(row)
+            row = next_breach(total, prices, target, offsets[-1], row, band)
+
+    segment = np.searchsorted(starts, np.arange(len(prices)), side="right") - 1
+    return total + np.array(offsets)[segment], bought, starts[1:], trades, turnover
+
+
+def simulate_rebalancing(data, weights, amount, purchase, years, mode="band", band=0.05, months=12, start_week=None):
+    # weights: wagi docelowe (M,) z backtest.metal_weights(); okno i wpłaty jak w run_backtest()
+    if mode not in REBALANCE_MODES:
+        raise ValueError(f"Nieznany tryb rebalancingu: {mode}")
+    if mode == "band" and not band > 0:
+        raise ValueError("Szerokość pasma musi być dodatnia")
+    first, last, cash = purchase_plan(data, amount, purchase, years, start_week)
+    prices = np.asarray(data["prices"][first:last + 1])
+    target = np.asarray(weights, dtype=np.float64)
+    rows = calendar_rows(data["days"][first:last + 1], months) if mode == "calendar" else None
+
+    holdings, bought, events, trades, turnover = _simulate(prices, cash, target, mode, band, rows)
+    path, drift = drift_weights(holdings, prices, target)
+    value = (holdings * prices).sum(axis=1)
+    invested = float(cash.sum())
+
+    return {
+        "dates": data["dates"][first:last + 1],
+        "weights": path,
+        "drift": drift,
+        "value": value,
+        "finalValue": float(value[-1]),
+        "invested": invested,
+        "rebalanceDates": data["dates"][first + np.array(events, dtype=np.int64)],
+        "rebalances": len(events),
+        "trades": trades,
+        "purchases": int(np.count_nonzero(bought > 0)),
+        "turnover": turnover,
+        "turnoverPercent": turnover / invested * 100 if invested > 0 else 0,
+        "maxDrift": float(drift.max()),
+        "meanDrift": float(drift.mean())
+    }
+
+
+def band_sweep(data, weights, amount, purchase, years, bands=DEFAULT_BANDS, start_week=None):
+    # Ten sam plan zakupów dla wielu szerokości pasma; ceny i zakupy liczone raz
+    first, last, cash = purchase_plan(data, amount, purchase, years, start_week)
+    prices = np.asarray(data["prices"][first:last + 1])
+    target = np.asarray(weights, dtype=np.float64)
+
+    rebalances, trades, turnover, final_value, max_drift = [], [], [], [], []
+    for band in bands:
+        holdings, _, events, band_trades, band_turnover = _simulate(prices, cash, target, "band", band)
+        _, drift = drift_weights(holdings, prices, target)
+        rebalances.append(len(events))
+        trades.append(band_trades)
+        turnover.append(band_turnover)
+        final_value.append(holdings[-1] @ prices[-1])
+        max_drift.append(drift.max())
+
+    return {
+        "bands": np.asarray(bands, dtype=np.float64),
+        "rebalances": np.array(rebalances),
+        "trades": np.array(trades),
+        "turnover": np.array(turnover),
+        "turnoverPercent": np.array(turnover) / cash.sum() * 100,
+        "finalValue": np.array(final_value),
+        "maxDrift": np.array(max_drift)
+    }
@@ -0,0 +1,171 @@
+# Statystyki ryzyka liczone algorytmami jednoprzebiegowymi: wariancja i kowariancja
+# metodą Welforda (łączenie paczek wg Chana), bieżące maksimum dla obsunięcia oraz
+# okna kroczące z różnic sum prefiksowych - O(N) niezależnie od długości okna.
+import numpy as np
+
+
+class RunningMoments:
+    # Średnia i komomenty kolumn aktualizowane paczkami wierszy; stan można
+    # zapisać i kontynuować po dopisaniu nowych notowań
+    def __init__(self, columns):
+        self.count = 0
+        self.mean = np.zeros(columns)
+        self.comoment = np.zeros((columns, columns))
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64).reshape(-1, len(self.mean))
+        if not len(chunk):
+            return self
+        chunk_count = len(chunk)
+        chunk_mean = chunk.mean(axis=0)
+        centered = chunk - chunk_mean
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        self.comoment += centered.T @ centered + np.outer(delta, delta) * self.count * chunk_count / total
+        self.mean += delta * chunk_count / total
+        self.count = total
+        return self
+
+    @property
+    def variance(self):
+        return np.diag(self.comoment) / max(self.count - 1, 1)
+
+    @property
+    def covariance(self):
+        return self.comoment / max(self.count - 1, 1)
+
+    @property
+    def correlation(self):
+        std = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.comoment / np.outer(std, std)
+
+    def state(self):
+        return {"count": self.count, "mean": self.mean.tolist(), "comoment": self.comoment.tolist()}
+
+    @classmethod
+    def from_state(cls, state):
+        moments = cls(len(state["mean"]))
+        moments.count = state["count"]
+        moments.mean = np.array(state["mean"])
+        moments.comoment = np.array(state["comoment"])
+        return moments
+
+
+class RunningDrawdown:
+    # Bieżący szczyt i największy spadek od szczytu dla każdej kolumny poziomów
+    def __init__(self, columns):
+        self.peak = np.full(columns, -np.inf)
+        self.max_drawdown = np.zeros(columns)
+
+    def update(self, levels):
+        levels = np.asarray(levels, dtype=np.float64).reshape(-1, len(self.peak))
+        if not len(levels):
+            return self
+        peaks = np.maximum(np.maximum.accumulate(levels, axis=0), self.peak)
+        self.max_drawdown = np.minimum(self.max_drawdown, (levels / peaks - 1).min(axis=0))
+        self.peak = peaks[-1]
+        return self
+
+    def state(self):
+        return {"peak": self.peak.tolist(), "maxDrawdown": self.max_drawdown.tolist()}
+
+    @classmethod
+    def from_state(cls, state):
+        drawdown = cls(len(state["peak"]))
+        drawdown.peak = np.array(state["peak"])
+        drawdown.max_drawdown = np.array(state["maxDrawdown"])
+        return drawdown
+
+
+def _prefix(values):
+    prefix = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix
+
+
+def _window_sums(values, window):
+    prefix = _prefix(values)
+    return prefix[window:] - prefix[:-window]
+
+
+def rolling_moments(returns, window):
+    # Średnia i wariancja w oknie kroczącym: każde przesunięcie dodaje jeden wiersz i
+    # usuwa jeden, co przy sumach prefiksowych daje cały przebieg w O(N). Dane są
+    # centrowane średnią globalną, aby różnice sum kwadratów nie traciły precyzji.
+    if not 1 < window <= len(returns):
+        raise ValueError(f"Okno musi mieć od 2 do {len(returns)} obserwacji")
+    centered = returns - returns.mean(axis=0)
+    sums = _window_sums(centered, window)
+    squares = _window_sums(centered * centered, window)
+    mean = sums / window
+    variance = np.maximum(squares - sums * mean, 0) / (window - 1)
+    return mean + returns.mean(axis=0), variance
+
+
+def rolling_correlation(returns, window):
+    # Korelacje wszystkich par kolumn w oknie kroczącym; zwraca pary indeksów i (T - w + 1, P)
+    if not 1 < window <= len(returns):
+        raise ValueError(f"Okno musi mieć od 2 do {len(returns)} obserwacji")
+    first, second = np.triu_indices(returns.shape[1], k=1)
+    centered = returns - returns.mean(axis=0)
+    sums = _window_sums(centered, window)
+    squares = _window_sums(centered * centered, window)
+    products = _window_sums(centered[:, first] * centered[:, second], window)
+    covariance = products - sums[:, first] * sums[:, second] / window
+    variance = np.maximum(squares - sums * sums / window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = covariance / np.sqrt(variance[:, first] * variance[:, second])
+    return list(zip(first.tolist(), second.tolist())), np.clip(correlation, -1, 1)
+
+
+def periods_per_year(days):
+    span_years = (int(days[-1]) - int(days[0])) / 365.25
+    if span_years <= 0:
+        raise ValueError("Za krótka historia notowań")
+    return (len(days) - 1) / span_years
+
+
+def portfolio_log_returns(returns, weights):
+    # Log-zwroty mieszanek o stałych wagach (codzienne przywracanie wag); wagi (S, M)
+    return np.log1p(np.expm1(returns) @ np.asarray(weights).T)
+
+
+def risk_report(data, weights, window):
+    # Ryzyko dla mieszanek metali (wagi (S, M)) na pełnej historii notowań
+    returns = np.diff(np.log(data["prices"]), axis=0)
+    mix_returns = portfolio_log_returns(returns, weights)
+    annual = periods_per_year(data["days"])
+
+    moments = RunningMoments(mix_returns.shape[1]).update(mix_returns)
+    levels = np.exp(np.cumsum(mix_returns, axis=0))
+    drawdown = RunningDrawdown(levels.shape[1]).update(np.vstack([np.ones(levels.shape[1]), levels]))
+    volatility = np.sqrt(moments.variance * annual)
+    mean_return = moments.mean * annual
+
+    _, rolling_variance = rolling_moments(mix_returns, window)
+    pairs, correlation = rolling_correlation(returns, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.where(volatility > 0, mean_return / volatility, np.nan)
+
+    # Statystyki pojedynczych metali ze stanu utrzymywanego przyrostowo przez magazyn
+    # cen (dopisanie fixingów nie wymaga przeliczenia całej historii), jeśli dostępny
+    metal_moments = (RunningMoments.from_state(data["moments"]) if "moments" in data
+                     else RunningMoments(returns.shape[1]).update(returns))
+    metal_drawdown = (RunningDrawdown.from_state(data["drawdown"]) if "drawdown" in data
+                      else RunningDrawdown(returns.shape[1]).update(data["prices"]))
+
+    return {
+        "volatility": volatility,
+        "meanReturn": mean_return,
+        "sharpe": sharpe,
+        "maxDrawdown": drawdown.max_drawdown,
+        "metalVolatility": np.sqrt(metal_moments.variance * annual),
+        "metalMeanReturn": metal_moments.mean * annual,
+        "metalDrawdown": metal_drawdown.max_drawdown,
+        "metalCorrelation": metal_moments.correlation,
+        "rollingDates": data["dates"][window:],
+        "rollingVolatility": np.sqrt(rolling_variance * annual),
+        "pairs": pairs,
+        "rollingCorrelation": correlation
+    }
@@ -0,0 +1,174 @@
+# Kalendarz notowań: harmonogram zakupów (co tydzień w wybrany dzień, co miesiąc
+# albo własne daty) zamieniony na indeksy wierszy cen. W lbma_data.csv brakuje
+# weekendów i świąt, więc termin bez fixingu przesuwamy zgodnie z konwencją:
+#   following - pierwszy fixing w dniu terminu lub później,
+#   preceding - ostatni fixing w dniu terminu lub wcześniej,
+#   modified_following - jak following, chyba że wypada w kolejnym miesiącu.
+# Terminy wypadające na ten sam fixing łączymy. Indeksy są liczone wektorowo
+# (searchsorted) i trzymane w pamięci podręcznej per harmonogram, więc backtest,
+# Monte Carlo i przetwarzanie wsadowe dzielą te same tablice.
+# Horyzont harmonogramu tygodniowego i miesięcznego to lata × terminy w roku;
+# harmonogram własny ma własny horyzont - liczbę okresów między terminami okna
+# (domyślnie wszystkie daty: zakupy w każdej oprócz ostatniej, wycena w ostatniej).
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+WEEKS_PER_YEAR = 52
+MONTHS_PER_YEAR = 12
+SCHEDULE_KINDS = ("weekly", "monthly", "custom")
+ROLL_CONVENTIONS = ("following", "preceding", "modified_following")
+CACHE_SIZE = 64
+
+
+class Schedule(NamedTuple):
+    kind: str = "weekly"
+    weekday: int = 0          # 0 = poniedziałek ... 6 = niedziela
+    day: int = 1              # dzień miesiąca dla "monthly" (obcinany do długości miesiąca)
+    roll: str = "following"
+    dates: tuple = ()         # dni od 1970-01-01 dla "custom"
+    periods: int = 0          # okresy okna dla "custom" (0 = wszystkie daty)
+
+
+# Domyślny harmonogram - pierwszy fixing każdego tygodnia, jak data["weekRows"] magazynu cen
+WEEKLY = Schedule()
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def make_schedule(kind="weekly", weekday=0, day=1, roll="following", dates=(), periods=0):
+    if kind not in SCHEDULE_KINDS:
+        raise ValueError(f"Nieznany harmonogram: {kind}")
+    if roll not in ROLL_CONVENTIONS:
+        raise ValueError(f"Nieznana konwencja przesunięcia: {roll}")
+    if not 0 <= int(weekday) <= 6:
+        raise ValueError("Dzień tygodnia musi być z zakresu 0-6")
+    if not 1 <= int(day) <= 31:
+        raise ValueError("Dzień miesiąca musi być z zakresu 1-31")
+    if kind == "custom":
+        try:
+            days = np.unique(np.asarray(dates, dtype="datetime64[D]").astype(np.int64))
+        except ValueError:
+            raise ValueError("Daty harmonogramu muszą mieć postać RRRR-MM-DD") from None
+        if len(days) < 2:
+            raise ValueError("Harmonogram własny wymaga co najmniej dwóch dat")
+        if not 0 <= int(periods) < len(days):
+            raise ValueError(f"Liczba okresów musi być z zakresu 1-{len(days) - 1}")
+        return Schedule(kind, 0, 1, roll, tuple(days.tolist()), int(periods))
+    if kind == "weekly":
+        return Schedule(kind, int(weekday), 1, roll)
+    return Schedule(kind, 0, int(day), roll)
+
+
+def parse_schedule(text):
+    # Zapis tekstowy (wejście wsadowe, API): "weekly", "weekly:4" (piątek), "monthly",
+    # "monthly:15" albo "custom:2020-01-15;2020-02-14;..." (opcjonalnie "/okresy" na
+    # końcu dat), z konwencją przesunięcia po "@", np. "monthly:31@modified_following"
+    text = str(text or "").strip() or "weekly"
+    spec, _, roll = text.partition("@")
+    kind, _, argument = spec.partition(":")
+    kind, argument, roll = kind.strip().lower(), argument.strip(), roll.strip() or "following"
+    dates, _, periods = argument.partition("/") if kind == "custom" else ("", "", argument)
+    if periods and not periods.strip().isdigit():
+        raise ValueError(f"Niepoprawny harmonogram {text!r}: oczekiwano liczby całkowitej")
+    try:
+        if kind == "weekly":
+            return make_schedule(kind, weekday=int(argument or 0), roll=roll)
+        if kind == "monthly":
+            return make_schedule(kind, day=int(argument or 1), roll=roll)
+        if kind == "custom":
+            return make_schedule(kind, roll=roll, dates=[date for date in re.split(r"[;,\s]+", dates) if date],
+                                 periods=int(periods or 0))
+    except ValueError as error:
+        raise ValueError(f"Niepoprawny harmonogram {text!r}: {error}") from None
+    raise ValueError(f"Nieznany harmonogram: {kind}")
+
+
+def schedule_periods(schedule):
+    # Liczba terminów w roku - horyzont w latach zamieniany na liczbę zakupów
+    if schedule.kind == "weekly":
+        return WEEKS_PER_YEAR
+    if schedule.kind == "monthly":
+        return MONTHS_PER_YEAR
+    raise ValueError("Harmonogram własny nie ma stałej liczby terminów w roku")
+
+
+def schedule_horizon(schedule, years, terms):
+    # Liczba okresów okna: lata × terminy w roku albo horyzont harmonogramu własnego
+    # (terms - liczba terminów harmonogramu w historii cen)
+    if schedule.kind == "custom":
+        return schedule.periods or terms - 1
+    return schedule_periods(schedule) * int(years)
+
+
+def horizon_error(schedule, years):
+    if schedule.kind == "custom":
+        return ValueError("Za mało dat harmonogramu własnego z notowaniami dla jego horyzontu")
+    return ValueError(f"Za mało danych dla horyzontu {years} lat")
+
+
+def elapsed_weeks(data, rows):
+    # Czas od pierwszego terminu w tygodniach - koszty magazynowania przy nierównych
+    # odstępach między terminami (przesunięcia na święta, daty własne)
+    days = np.asarray(data["days"], dtype=np.int64)[rows]
+    return (days - days[0]) / 7 if len(days) else np.zeros(0)
+
+
+def target_days(first_day, last_day, schedule):
+    # Terminy harmonogramu (dni od 1970-01-01) od okresu zawierającego first_day do last_day
+    if schedule.kind == "weekly":
+        monday = first_day - (first_day + 3) % 7
+        return np.arange(monday + schedule.weekday, last_day + 1, 7, dtype=np.int64)
+    if schedule.kind == "monthly":
+        months = np.arange(np.datetime64(first_day, "D").astype("datetime64[M]"),
+                           np.datetime64(last_day, "D").astype("datetime64[M]") + 1)
+        starts = months.astype("datetime64[D]")
+        lengths = ((months + 1).astype("datetime64[D]") - starts).astype(np.int64)
+        targets = starts.astype(np.int64) + np.minimum(schedule.day, lengths) - 1
+        return targets[targets <= last_day]
+    targets = np.asarray(schedule.dates, dtype=np.int64)
+    return targets[targets <= last_day]
+
+
+def roll_rows(days, targets, roll="following"):
+    # Wiersze cen dla terminów wg konwencji; terminy bez fixingu po właściwej stronie
+    # (np. preceding przed pierwszym notowaniem) są pomijane
+    days = np.asarray(days, dtype=np.int64)
+    following = np.searchsorted(days, targets, side="left")
+    preceding = np.searchsorted(days, targets, side="right") - 1
+    if roll == "following":
+        rows = following
+    elif roll == "preceding":
+        rows = preceding
+    elif roll == "modified_following":
+        month = np.asarray(targets).astype("datetime64[D]").astype("datetime64[M]")
+        rolled = days[np.minimum(following, len(days) - 1)].astype("datetime64[D]").astype("datetime64[M]")
+        rows = np.where((following < len(days)) & (rolled == month), following, preceding)
+    else:
+        raise ValueError(f"Nieznana konwencja przesunięcia: {roll}")
+    return np.unique(rows[(rows >= 0) & (rows < len(days))])
+
+
+def schedule_rows(data, schedule=WEEKLY):
+    # Indeksy wierszy cen dla harmonogramu; tablica tylko do odczytu, współdzielona
+    if schedule == WEEKLY and "weekRows" in data:
+        # Utrzymywane przyrostowo przez magazyn cen
+        return data["weekRows"]
+    days = data["days"]
+    key = (len(days), int(days[0]), int(days[-1]), schedule)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    rows = roll_rows(days, target_days(int(days[0]), int(days[-1]), schedule), schedule.roll)
+    rows.setflags(write=False)
+    with _cache_lock:
+        _cache[key] = rows
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rows
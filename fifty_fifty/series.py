@@ -0,0 +1,142 @@
+# Dodatkowe serie z lokalnych plików CSV (kursy walut, indeksy metali strategicznych)
+# dopasowane do dat fixingów LBMA złączeniem "as-of": dla każdego dnia LBMA bierzemy
+# ostatnią znaną wartość serii, o ile nie jest starsza niż limit świeżości.
+# Plik serii: nagłówek Date,<kolumna>[,<kolumna>...], puste pola oznaczają brak
+# notowania. Kolumny metali nazywamy jak priceColumn w spec.json (np. Hafnium_EUR),
+# kurs waluty jako <WALUTA_BAZOWA>_<WALUTA> (np. EUR_PLN = PLN za 1 EUR).
+import csv
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .price_store import as_data
+
+SERIES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "series")
+MAX_AGE_DAYS = 7
+CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def series_paths(directory=SERIES_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".csv"))
+
+
+def read_series(path):
+    # Zwraca (dni int32 posortowane rosnąco, kolumny, wartości (N, K) z NaN dla braków)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        rows = [row for row in reader if row]
+    if not header or len(header) < 2:
+        raise ValueError(f"Plik serii {path} musi mieć kolumnę Date i co najmniej jedną serię")
+    try:
+        days = np.array([row[0] for row in rows], dtype="datetime64[D]").astype(np.int32)
+        values = np.array([[field.strip() or "nan" for field in row[1:]] for row in rows],
+                          dtype=np.float64).reshape(len(rows), len(header) - 1)
+    except ValueError as error:
+        raise ValueError(f"Niepoprawny wiersz w {path}: {error}") from None
+
+    order = np.argsort(days, kind="stable")
+    days, values = days[order], values[order]
+    if np.any(np.diff(days) == 0):
+        duplicate = days[np.flatnonzero(np.diff(days) == 0)[0]]
+        raise ValueError(f"Powtórzona data {np.datetime64(int(duplicate), 'D')} w {path}")
+    return days, header[1:], values
+
+
+def default_max_age(days):
+    # Limit świeżości dopasowany do częstotliwości serii: dwa typowe odstępy,
+    # nie mniej niż MAX_AGE_DAYS (seria miesięczna może mieć ~60 dni)
+    if len(days) < 2:
+        return MAX_AGE_DAYS
+    return max(MAX_AGE_DAYS, 2 * int(np.median(np.diff(days))))
+
+
+def asof_indices(source_days, target_days, max_age=None):
+    # Indeks ostatniej obserwacji nie późniejszej niż każdy dzień docelowy,
+    # -1 gdy jej brak lub jest starsza niż max_age dni
+    source_days = np.asarray(source_days, dtype=np.int64)
+    target_days = np.asarray(target_days, dtype=np.int64)
+    indices = np.searchsorted(source_days, target_days, side="right") - 1
+    valid = indices >= 0
+    if max_age is not None:
+        valid &= target_days - source_days[np.maximum(indices, 0)] <= max_age
+    return np.where(valid, indices, -1)
+
+
+def asof_join(target_days, source_days, values, max_age=None):
+    # Wartości (N, K) dopasowane do target_days -> (T, K); każda kolumna osobno,
+    # aby brak notowania w jednej kolumnie nie unieważniał pozostałych
+    values = np.asarray(values, dtype=np.float64).reshape(len(source_days), -1)
+    aligned = np.full((len(target_days), values.shape[1]), np.nan)
+    for column in range(values.shape[1]):
+        present = np.flatnonzero(np.isfinite(values[:, column]))
+        indices = asof_indices(np.asarray(source_days)[present], target_days, max_age)
+        found = indices >= 0
+        aligned[found, column] = values[present[indices[found]], column]
+    return aligned
+
+
+def _source_key(paths):
+    key = []
+    for path in paths:
+        stat = os.stat(path)
+        key.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+def load_auxiliary(data, paths=None, fx_column=None, max_age=None):
+    # Ceny LBMA rozszerzone o kolumny serii dodatkowych jako jedna gęsta macierz dla
+    # silników. Wiersze, w których brakuje którejkolwiek serii (przed jej początkiem
+    # lub po przekroczeniu limitu świeżości), są pomijane. fx_column: kolumna kursu,
+    # przez którą mnożymy wszystkie ceny (wynik w walucie kursu, data["currency"]).
+    # max_age: liczba dni, słownik {kolumna: dni} albo None (z częstotliwości serii).
+    paths = series_paths() if paths is None else list(paths)
+    days = data["days"]
+    key = (_source_key(paths), len(days), int(days[0]), int(days[-1]), tuple(data["columns"]), fx_column,
+           tuple(sorted(max_age.items())) if isinstance(max_age, dict) else max_age)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    columns, blocks, sources = list(data["columns"]), [np.asarray(data["prices"])], {}
+    for path in paths:
+        series_days, series_columns, values = read_series(path)
+        for index, column in enumerate(series_columns):
+            if column in sources or column in data["columns"]:
+                raise ValueError(f"Kolumna {column} występuje w więcej niż jednym źródle")
+            limit = max_age.get(column) if isinstance(max_age, dict) else max_age
+            limit = default_max_age(series_days) if limit is None else limit
+            blocks.append(asof_join(days, series_days, values[:, index], limit))
+            columns.append(column)
+            sources[column] = {"path": path, "maxAge": limit}
+    prices = np.hstack(blocks)
+
+    currency = "EUR"
+    if fx_column is not None:
+        if fx_column not in sources:
+            raise ValueError(f"Brak kolumny kursu {fx_column}")
+        position = columns.index(fx_column)
+        rates = prices[:, position]
+        prices = np.delete(prices, position, axis=1) * rates[:, None]
+        columns.pop(position)
+        currency = fx_column.rsplit("_", 1)[-1]
+
+    keep = np.isfinite(prices).all(axis=1)
+    if not keep.any():
+        raise ValueError("Serie dodatkowe nie pokrywają się z historią LBMA")
+    result = as_data(np.asarray(days)[keep], columns, np.asfortranarray(prices[keep]))
+    result.update(currency=currency, sources=sources, droppedRows=int((~keep).sum()))
+
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
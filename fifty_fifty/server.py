@@ -0,0 +1,321 @@
+# Lokalne API HTTP (JSON) z funkcjami kalkulatora:
+#   python -m fifty_fifty.server --port 8765
+#   GET /agio?strategy=FOUNDATION&amount=400000
+# Odpowiedzi są trzymane w pamięci podręcznej LRU z czasem życia (TTL), kluczem są
+# znormalizowane parametry. Symulacje (/projection, /backtest) liczy pula procesów;
+# gdy wszystkie miejsca w puli i kolejce są zajęte, serwer od razu odpowiada 503
+# z nagłówkiem Retry-After zamiast kolejkować bez końca. /metrics zwraca liczniki.
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from .backtest import metal_weights, run_backtest, run_rolling_backtest
+from .core import get_agio, get_components, get_current_tariff, get_metals
+from .fees import STORAGE_MODES, storage_profile
+from .montecarlo import get_tables, run_monte_carlo
+from .price_store import get_data
+from .schedule import WEEKLY, parse_schedule
+from .vectorized import STRATEGY_NAMES
+
+DEFAULT_PORT = 8765
+CACHE_SIZE = 4096
+CACHE_TTL = 300
+MAX_PATHS = 100000
+MAX_YEARS = 50
+# Zakresy parametrów całkowitych - chronią procesy puli przed ogromnymi alokacjami
+PARAM_BOUNDS = {"years": (1, MAX_YEARS), "paths": (1, MAX_PATHS)}
+LATENCY_WINDOW = 1024
+RETRY_AFTER = 1
+
+def jsonable(value):
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return jsonable(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def parse_params(query, fields):
+    # Parametry zapytania -> znormalizowana krotka (nazwa, wartość) w kolejności pól
+    params = []
+    for name, kind, default in fields:
+        values = query.get(name)
+        if not values:
+            if default is None:
+                raise ValueError(f"Brak parametru: {name}")
+            params.append((name, default))
+            continue
+        raw = values[-1].strip()
+        if kind == "strategy":
+            value = raw.upper()
+            if value not in STRATEGY_NAMES:
+                raise ValueError(f"Nieznana strategia: {raw}")
+        elif kind == "mode":
+            if raw not in STORAGE_MODES:
+                raise ValueError(f"Nieznany sposób pobierania kosztów: {raw}")
+            value = raw
+        elif kind == "schedule":
+            value = parse_schedule(raw)
+        else:
+            try:
+                value = float(raw)
+            except ValueError:
+                raise ValueError(f"Niepoprawna wartość parametru {name}: {raw}") from None
+            if not np.isfinite(value) or value < 0:
+                raise ValueError(f"Parametr {name} musi być nieujemną liczbą")
+            if kind is int:
+                # 7.9 nie jest cichym 7 - wartości ułamkowe odrzucamy
+                if not value.is_integer():
+                    raise ValueError(f"Parametr {name} musi być liczbą całkowitą")
+                value = int(value)
+            if name in PARAM_BOUNDS and not PARAM_BOUNDS[name][0] <= value <= PARAM_BOUNDS[name][1]:
+                raise ValueError(f"Parametr {name} musi być z zakresu {PARAM_BOUNDS[name][0]}-{PARAM_BOUNDS[name][1]}")
+        params.append((name, value))
+    return tuple(params)
+
+
+def projection_task(strategy, amount, purchase, years, paths, seed, storage_mode):
+    weights, _ = metal_weights(get_metals(strategy, amount), get_data()["columns"])
+    result = run_monte_carlo(get_tables(), weights, amount, purchase, years, n_paths=paths, seed=seed,
+                             workers=1, storage=storage_profile(strategy, amount), storage_mode=storage_mode)
+    return jsonable(result)
+
+
+def backtest_task(strategy, amount, purchase, years, storage_mode, schedule=WEEKLY):
+    data = get_data()
+    weights, coverage = metal_weights(get_metals(strategy, amount), data["columns"])
+    storage = storage_profile(strategy, amount)
+    backtest = run_backtest(data, weights, amount, purchase, years, storage=storage, storage_mode=storage_mode,
+                            schedule=schedule)
+    rolling = run_rolling_backtest(data, weights, amount, purchase, years, storage=storage,
+                                   storage_mode=storage_mode, schedule=schedule)
+    return jsonable({
+        "startDate": str(backtest["dates"][0]),
+        "endDate": str(backtest["dates"][-1]),
+        "coverage": coverage,
+        "invested": backtest["costBasis"][-1],
+        "netValue": backtest["netValue"][-1],
+        "storageFees": backtest["storageFees"][-1],
+        "historical": {key: rolling[key] for key in ("invested", "best", "worst", "median", "percentiles")}
+    })
+
+
+STRATEGY_FIELDS = (("strategy", "strategy", None), ("amount", float, None))
+PLAN_FIELDS = STRATEGY_FIELDS + (("purchase", float, None), ("years", int, None), ("storage_mode", "mode", "metal"))
+
+# Ścieżka -> (pola, funkcja, czy symulacja w puli procesów)
+ENDPOINTS = {
+    "/agio": (STRATEGY_FIELDS, get_agio, False),
+    "/metals": (STRATEGY_FIELDS, get_metals, False),
+    "/components": (STRATEGY_FIELDS, get_components, False),
+    "/tariff": (STRATEGY_FIELDS, get_current_tariff, False),
+    "/projection": (PLAN_FIELDS[:4] + (("paths", int, 20000), ("seed", int, 0)) + PLAN_FIELDS[4:], projection_task, True),
+    # schedule w zapisie schedule.parse_schedule(), np. "monthly:15"; purchase to kwota na termin
+    "/backtest": (PLAN_FIELDS + (("schedule", "schedule", WEEKLY),), backtest_task, True)
+}
+
+
+# Brak wpisu w pamięci podręcznej - odróżnia chybienie od zapamiętanej odpowiedzi None
+# (np. /tariff dla kwoty poza taryfami)
+MISSING = object()
+
+
+class ResponseCache:
+    # LRU z czasem życia wpisu; bezpieczny dla wątków serwera
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ServiceStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        self.rejected = 0
+        self.latency = {}
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            if status == 503:
+                self.rejected += 1
+            self.latency.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latency = {}
+            for endpoint, samples in self.latency.items():
+                values = np.array(samples) * 1000
+                latency[endpoint] = {
+                    "p50Ms": float(np.percentile(values, 50)),
+                    "p95Ms": float(np.percentile(values, 95)),
+                    "maxMs": float(values.max())
+                }
+            return {"requests": dict(self.requests), "errors": dict(self.errors), "rejected": self.rejected, "latency": latency}
+
+
+class CalculatorService:
+    def __init__(self, workers=None, queue_size=None, cache_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = self.workers if queue_size is None else queue_size
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Miejsca na symulacje: wykonywane + oczekujące w kolejce puli
+        self.slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self.cache = ResponseCache(cache_size, ttl)
+        self.stats = ServiceStats()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def metrics(self):
+        return dict(
+            self.stats.snapshot(),
+            cache={"hits": self.cache.hits, "misses": self.cache.misses, "size": len(self.cache)},
+            pool={"workers": self.workers, "queueSize": self.queue_size, "inFlight": self._in_flight}
+        )
+
+    def _simulate(self, function, kwargs):
+        if not self.slots.acquire(blocking=False):
+            return 503, {"error": "Serwer zajęty, spróbuj ponownie"}
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return 200, self.pool.submit(function, **kwargs).result()
+        except ValueError as error:
+            return 400, {"error": str(error)}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self.slots.release()
+
+    def handle(self, path, query):
+        # Zwraca (status, ciało JSON)
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path not in ENDPOINTS:
+            return 404, {"error": f"Nieznany adres: {path}", "endpoints": sorted(ENDPOINTS) + ["/health", "/metrics"]}
+
+        fields, function, heavy = ENDPOINTS[path]
+        try:
+            params = parse_params(query, fields)
+        except ValueError as error:
+            return 400, {"error": str(error)}
+
+        key = (path, params)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return 200, cached
+        if heavy:
+            status, body = self._simulate(function, dict(params))
+        else:
+            status, body = 200, jsonable(function(*[value for _, value in params]))
+        if status == 200:
+            self.cache.put(key, body)
+        return status, body
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CalculatorHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        try:
+            status, body = self.service.handle(url.path, parse_qs(url.query))
+        except Exception as error:
+            status, body = 500, {"error": str(error)}
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 503:
+            self.send_header("Retry-After", str(RETRY_AFTER))
+        self.end_headers()
+        self.wfile.write(payload)
+        if url.path != "/metrics":
+            # Nieznane adresy w jednym liczniku, aby nie rozrastać statystyk
+            endpoint = url.path if url.path in ENDPOINTS or url.path == "/health" else "other"
+            self.service.stats.record(endpoint, time.perf_counter() - started, status)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, service=None):
+    handler = type("Handler", (CalculatorHandler,), {"service": service or CalculatorService()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fifty_fifty.server", description="Lokalne API JSON kalkulatora Fifty/Fifty")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="procesy dla symulacji (domyślnie liczba CPU)")
+    parser.add_argument("--queue", type=int, default=None, help="symulacje oczekujące ponad liczbę procesów")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    parser.add_argument("--ttl", type=float, default=CACHE_TTL, help="czas życia odpowiedzi w pamięci podręcznej (s)")
+    args = parser.parse_args(argv)
+
+    service = CalculatorService(args.workers, args.queue, args.cache_size, args.ttl)
+    server = make_server(args.host, args.port, service)
+    print(f"Nasłuchiwanie na http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+# Wersje get_agio() i get_current_tariff() działające na tablicach kwot (NumPy).
+# Tablice są budowane raz z tabel skompilowanych w core ze spec.json.
+import numpy as np
+
+from .core import AGIO_RULES, COMPONENT_TABLES, METAL_TABLES, METALS, TARIFF_TABLES, deposit_tariffs, strategies
+
+STRATEGY_NAMES = [s["name"] for s in strategies]
+METAL_NAMES = [metal["name"] for metal in METALS]
+RULE_NAMES = list(AGIO_RULES)
+
+
+def _frozen(array):
+    array.setflags(write=False)
+    return array
+
+
+# Macierz wag metali: strategia x metal (ułamki)
+WEIGHTS = _frozen(np.array([
+    [dict(zip(METAL_TABLES[name].names, METAL_TABLES[name].shares)).get(metal, 0.0) for metal in METAL_NAMES]
+    for name in STRATEGY_NAMES
+]))
+
+# Komponenty jako sloty: udział i indeks reguły AGIO (-1 dla pustego slotu)
+_max_components = max(len(COMPONENT_TABLES[name].names) for name in STRATEGY_NAMES)
+COMPONENT_SHARES = _frozen(np.array([
+    list(COMPONENT_TABLES[name].shares) + [0.0] * (_max_components - len(COMPONENT_TABLES[name].shares))
+    for name in STRATEGY_NAMES
+]))
+COMPONENT_RULES = _frozen(np.array([
+    [RULE_NAMES.index(rule) for rule in COMPONENT_TABLES[name].rules] + [-1] * (_max_components - len(COMPONENT_TABLES[name].rules))
+    for name in STRATEGY_NAMES
+]))
+
+# Reguły AGIO jako wektory granic i opłat
+RULE_RATES = _frozen(np.array([AGIO_RULES[name].rate for name in RULE_NAMES], dtype=np.float64))
+RULE_BONUS = _frozen(np.array([AGIO_RULES[name].bonus for name in RULE_NAMES], dtype=np.float64))
+RULE_LIMITS = [_frozen(np.array(AGIO_RULES[name].limits, dtype=np.float64)) for name in RULE_NAMES]
+RULE_FEES = [_frozen(np.array(AGIO_RULES[name].fees, dtype=np.float64)) for name in RULE_NAMES]
+
+# Płaska lista taryf z globalnymi identyfikatorami oraz posortowane granice per strategia
+TARIFFS = [tariff for name in STRATEGY_NAMES for tariff in deposit_tariffs.get(name, [])]
+TARIFF_OFFSETS = _frozen(np.cumsum([0] + [len(TARIFF_TABLES[name].max_values) for name in STRATEGY_NAMES]))
+TARIFF_MIN = _frozen(np.array([v for name in STRATEGY_NAMES for v in TARIFF_TABLES[name].min_values], dtype=np.float64))
+TARIFF_MAX = _frozen(np.array([v for name in STRATEGY_NAMES for v in TARIFF_TABLES[name].max_values], dtype=np.float64))
+
+
+def strategy_ids(strategy, shape):
+    # Nazwa strategii, tablica nazw lub tablica indeksów -> tablica indeksów STRATEGY_NAMES
+    if isinstance(strategy, str):
+        return np.full(shape, STRATEGY_NAMES.index(strategy))
+    strategy = np.asarray(strategy)
+    if strategy.dtype.kind in "iu":
+        return np.broadcast_to(strategy, shape)
+    unique, inverse = np.unique(strategy, return_inverse=True)
+    lookup = np.array([STRATEGY_NAMES.index(name) for name in unique])
+    return np.broadcast_to(lookup[inverse].reshape(strategy.shape), shape)
+
+
+def broadcast_inputs(strategy, amounts):
+    # Tablica nazw/indeksów strategii i kwoty rozgłaszane wzajemnie (np. wiele strategii
+    # dla jednej kwoty); pojedyncza nazwa przyjmuje kształt kwot
+    amounts = np.asarray(amounts, dtype=np.float64)
+    if not isinstance(strategy, str):
+        strategy, amounts = np.broadcast_arrays(np.asarray(strategy), amounts)
+    return strategy, amounts
+
+
+def vip_counts(rule, amounts):
+    counts = np.trunc(amounts / rule.vip_size) + (np.mod(amounts, rule.vip_size) > 0)
+    return np.minimum(rule.vip_max_count, counts)
+
+
+def rule_agio_array(rule_index, amounts):
+    rule = AGIO_RULES[RULE_NAMES[rule_index]]
+    agio = amounts * RULE_RATES[rule_index] if rule.rate else np.zeros(amounts.shape)
+    if rule.vip_size:
+        limits, fees = RULE_LIMITS[rule_index], RULE_FEES[rule_index]
+        tier = np.searchsorted(limits, amounts, side="right")
+        if len(fees):
+            tier_fee = fees[np.minimum(tier, len(fees) - 1)]
+            agio = agio + np.where(tier < len(fees), tier_fee, vip_counts(rule, amounts) * rule.vip_fee)
+        else:
+            agio = agio + vip_counts(rule, amounts) * rule.vip_fee
+    return agio
+
+
+def get_agio_array(strategy, amounts):
+    # Skalar (0-d) liczymy jako tablicę jednoelementową i zwracamy w kształcie wejścia
+    strategy, amounts = broadcast_inputs(strategy, amounts)
+    shape = amounts.shape
+    amounts = np.atleast_1d(amounts)
+    ids = strategy_ids(strategy, amounts.shape)
+    initial_agio = np.zeros(amounts.shape)
+    bonus = np.zeros(amounts.shape)
+
+    used = np.flatnonzero(np.bincount(ids.ravel(), minlength=len(STRATEGY_NAMES)))
+    for slot in range(COMPONENT_RULES.shape[1]):
+        slot_rules = set(COMPONENT_RULES[used, slot].tolist())
+        rules = COMPONENT_RULES[ids, slot]
+        component_amounts = amounts * COMPONENT_SHARES[ids, slot]
+        for rule_index in slot_rules - {-1}:
+            # Jedna reguła dla wszystkich wierszy - bez maskowania
+            mask = slice(None) if len(slot_rules) == 1 else rules == rule_index
+            component_agio = rule_agio_array(rule_index, component_amounts[mask])
+            initial_agio[mask] += component_agio
+            if RULE_BONUS[rule_index]:
+                bonus[mask] += component_agio * RULE_BONUS[rule_index]
+
+    effective_agio = initial_agio - bonus
+    positive = amounts > 0
+    safe_amounts = np.where(positive, amounts, 1)
+    result = {
+        "initialAgio": initial_agio,
+        "bonus": bonus,
+        "effectiveAgio": effective_agio,
+        "initialPercent": np.where(positive, initial_agio / safe_amounts * 100, 0),
+        "effectivePercent": np.where(positive, effective_agio / safe_amounts * 100, 0)
+    }
+    return {key: value.reshape(shape) for key, value in result.items()}
+
+
+def get_current_tariff_array(strategy, amounts):
+    # Globalny indeks w TARIFFS (-1 gdy brak dopasowania). Zakresy taryf strategii są
+    # posortowane, więc pierwsza taryfa z maxValue >= kwota to ta sama, którą
+    # wybiera get_current_tariff()
+    strategy, amounts = broadcast_inputs(strategy, amounts)
+    ids = strategy_ids(strategy, amounts.shape)
+    result = np.full(amounts.shape, -1)
+
+    for index in range(len(STRATEGY_NAMES)):
+        start, stop = TARIFF_OFFSETS[index], TARIFF_OFFSETS[index + 1]
+        mask = ids == index
+        if start == stop or not mask.any():
+            continue
+        amount = amounts[mask]
+        position = start + np.searchsorted(TARIFF_MAX[start:stop], amount, side="left")
+        candidate = np.minimum(position, stop - 1)
+        matched = (position < stop) & (TARIFF_MIN[candidate] <= amount)
+        result[mask] = np.where(matched, candidate, -1)
+    return result
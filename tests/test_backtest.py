@@ -0,0 +1,34 @@
+import pytest
+
+from fifty_fifty.backtest import metal_weights, run_backtest, run_rolling_backtest
+from fifty_fifty.core import get_metals
+from fifty_fifty.fees import STORAGE_MODES, storage_profile
+from fifty_fifty.price_store import LBMA_PATH, open_store
+
+
+@pytest.fixture(scope="module")
+def data():
+    return open_store(LBMA_PATH)
+
+
+@pytest.mark.parametrize("storage_mode", STORAGE_MODES)
+@pytest.mark.parametrize("strategy, amount, years", [("START", 7000, 10), ("BALANCE", 50000, 20), ("PRESTIGE", 3e6, 5)])
+def test_rolling_matches_single_backtest(data, storage_mode, strategy, amount, years):
+    # Rozkład dat startu nalicza koszty co tydzień, pojedynczy backtest co miesiąc
+    weights, _ = metal_weights(get_metals(strategy, amount), data["columns"])
+    storage = storage_profile(strategy, amount)
+    rolling = run_rolling_backtest(data, weights, amount, 100, years, storage=storage, storage_mode=storage_mode)
+    starts = len(rolling["finalValue"])
+    for start_week in (0, starts // 2, starts - 1):
+        single = run_backtest(data, weights, amount, 100, years, start_week, storage, storage_mode)
+        assert rolling["finalValue"][start_week] == pytest.approx(single["netValue"][-1], rel=3e-3)
+
+
+def test_eur_storage_lowers_rolling_values(data):
+    weights, _ = metal_weights(get_metals("BALANCE", 50000), data["columns"])
+    storage = storage_profile("BALANCE", 50000)
+    gross = run_rolling_backtest(data, weights, 50000, 100, 10)
+    eur = run_rolling_backtest(data, weights, 50000, 100, 10, storage=storage, storage_mode="eur")
+    assert (eur["finalValue"] < gross["finalValue"]).all()
+    with pytest.raises(ValueError):
+        run_rolling_backtest(data, weights, 50000, 100, 10, storage=storage, storage_mode="gold")
@@ -0,0 +1,64 @@
+import io
+import json
+
+from fifty_fifty.batch import parse_row, read_rows, run_batch
+
+ROW = {"client_id": "a", "strategy": "BALANCE", "amount": "50000", "purchase": "100", "years": "10"}
+
+
+def test_parse_row_errors():
+    assert parse_row({"client_id": "x", "strategy": "NONE", "amount": 1, "purchase": 1, "years": 1})["error"]
+    assert "Brak pola" in parse_row({"client_id": "x", "strategy": "START"})["error"]
+    assert parse_row(dict(ROW, amount="-1"))["error"]
+    assert parse_row(dict(ROW, years="0"))["error"]
+    for value in ("nan", "inf", "-inf"):
+        assert parse_row(dict(ROW, amount=value))["error"]
+        assert parse_row(dict(ROW, purchase=value))["error"]
+        assert "Horyzont" in parse_row(dict(ROW, years=value))["error"]
+
+
+def test_parse_row_accepts_whole_float_years():
+    assert parse_row(dict(ROW, years="10.0"))["years"] == 10
+    assert parse_row(dict(ROW, years=10.0))["years"] == 10
+    result = parse_row(dict(ROW, years="10.5"))
+    assert result["clientId"] == "a" and "całkowitą" in result["error"]
+
+
+def test_malformed_jsonl_lines_become_error_rows():
+    lines = [json.dumps(ROW), "{broken", "[1, 2]", "", json.dumps(dict(ROW, client_id="b", amount="nan"))]
+    output = io.StringIO()
+    total, errors = run_batch(read_rows(io.StringIO("\n".join(lines) + "\n"), "jsonl"), output)
+    assert (total, errors) == (4, 3)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert "error" not in results[0]
+    assert results[0]["metals"] and results[0]["backtestValue"] > 0
+    assert "linii 2" in results[1]["error"]
+    assert "Linia 3" in results[2]["error"]
+    assert results[3]["clientId"] == "b" and results[3]["error"]
+
+
+def test_csv_output_keeps_error_rows():
+    output = io.StringIO()
+    rows = [ROW, dict(ROW, client_id="b", strategy="X")]
+    assert run_batch(iter(rows), output, fmt="csv") == (2, 1)
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 3 and "Nieznana strategia" in lines[2]
+
+
+def test_schedule_column():
+    rows = [ROW, dict(ROW, client_id="m", schedule="monthly:15"),
+            dict(ROW, client_id="c", schedule="custom:2010-01-04;2015-01-05;2020-01-06"),
+            dict(ROW, client_id="x", schedule="yearly")]
+    results = [json.loads(line) for line in _run(rows).splitlines()]
+    weekly, monthly, custom, invalid = results
+    assert weekly["schedule"] == "weekly" and weekly["invested"] == 50000 + 100 * 52 * 10
+    assert monthly["invested"] == 50000 + 100 * 12 * 10 and monthly["backtestValue"] > 0
+    assert custom["invested"] == 50000 + 100 * 2 and custom["historicalP50"] == custom["backtestValue"]
+    assert "Nieznany harmonogram" in invalid["error"]
+
+
+def _run(rows):
+    output = io.StringIO()
+    run_batch(iter(rows), output)
+    return output.getvalue()
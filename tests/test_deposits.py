@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from fifty_fifty.core import get_agio, strategies
+from fifty_fifty.deposits import best_split, cost_curve, curve_value, optimal_agio
+from fifty_fifty.grid import slider_axes
+
+
+def auvesta(split):
+    return next(component for component in split["components"] if "Auvesta" in component["name"])
+
+
+def test_tier_limit_is_exclusive():
+    # 15 000 € nie mieści się w S-3 (ściśle poniżej 15 000 €) - jeden depozyt to M-6
+    split = optimal_agio("BALANCE", 30000)
+    assert auvesta(split)["amount"] == 15000
+    assert auvesta(split)["agio"] == 600
+    assert "S-3" not in auvesta(split)["deposits"]
+    assert split["saving"] == 0
+
+
+def test_split_below_tier_limits():
+    # 30 000 € w Auvesta: trzy depozyty S-3 (900 €) zamiast L-12 (1 200 €)
+    split = optimal_agio("BALANCE", 60000)
+    assert auvesta(split)["agio"] == 900
+    assert split["saving"] == pytest.approx(300)
+    assert best_split("Auvesta", 14999.99) == (300.0, {"S-3": 1})
+    assert best_split("Auvesta", 15000)[0] == 600
+
+
+def test_split_never_costs_more_than_standard():
+    for strategy in strategies:
+        for amount in slider_axes(strategy)[0]:
+            assert optimal_agio(strategy["name"], float(amount))["saving"] >= -1e-9
+
+
+def test_curve_matches_exact_values():
+    rng = np.random.default_rng(0)
+    for strategy in strategies:
+        name = strategy["name"]
+        breakpoints = cost_curve(name)["amounts"]
+        amounts = np.concatenate([
+            slider_axes(strategy)[0],
+            breakpoints,
+            np.nextafter(breakpoints[1:], -np.inf),
+            rng.uniform(strategy["minValue"], strategy["maxValue"], 200)
+        ])
+        for amount in amounts.tolist():
+            value = curve_value(name, amount)
+            assert value["standardAgio"] == pytest.approx(get_agio(name, amount)["initialAgio"], abs=1e-6)
+            assert value["optimalAgio"] == pytest.approx(optimal_agio(name, amount)["initialAgio"], abs=1e-6)
+
+
+def test_curve_reports_tier_cliffs():
+    value = curve_value("BALANCE", 60000)
+    assert value["deposits"] == {"GRatio (Auvesta)": {"S-3": 3}}
+    assert value["nextCliff"]["amount"] == 100000
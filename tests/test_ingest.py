@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from fifty_fifty.ingest import ingest
+from fifty_fifty.price_store import LBMA_PATH, open_store
+
+
+def write_rows(path, header, rows):
+    path.write_text("".join([header] + rows))
+
+
+@pytest.fixture
+def lbma_lines():
+    with open(LBMA_PATH) as f:
+        lines = [line if line.endswith("\n") else line + "\n" for line in f if line.strip()]
+    return lines[0], lines[1:]
+
+
+def assert_same_store(appended, rebuilt):
+    assert appended["columns"] == rebuilt["columns"]
+    np.testing.assert_array_equal(appended["days"], rebuilt["days"])
+    np.testing.assert_array_equal(appended["prices"], rebuilt["prices"])
+    np.testing.assert_array_equal(appended["weekRows"], rebuilt["weekRows"])
+    np.testing.assert_allclose(appended["inverseCumsum"], rebuilt["inverseCumsum"], rtol=1e-12)
+    for key in ("moments", "drawdown"):
+        for name, value in rebuilt[key].items():
+            np.testing.assert_allclose(appended[key][name], value, rtol=1e-9)
+
+
+def test_append_matches_rebuild(tmp_path, lbma_lines):
+    header, rows = lbma_lines
+    # Historia bez ostatnich dni, potem dwa zrzuty - drugi z duplikatami i poza zapasem pojemności
+    split, middle = 2000, 2800
+    csv_path = tmp_path / "lbma.csv"
+    write_rows(csv_path, header, rows[:split])
+    write_rows(tmp_path / "drop1.csv", header, rows[split:middle])
+    write_rows(tmp_path / "drop2.csv", header, rows[middle - 10:])
+
+    cache_dir = tmp_path / "cache"
+    open_store(str(csv_path), str(cache_dir))
+    first = ingest(str(tmp_path / "drop1.csv"), str(csv_path), str(cache_dir))
+    second = ingest(str(tmp_path / "drop2.csv"), str(csv_path), str(cache_dir))
+    assert (first["added"], second["added"], second["duplicates"]) == (800, len(rows) - 2800, 10)
+    assert second["rows"] == len(rows)
+
+    appended = open_store(str(csv_path), str(cache_dir))
+    rebuilt = open_store(str(csv_path), str(tmp_path / "fresh"))
+    assert_same_store(appended, rebuilt)
+
+    write_rows(tmp_path / "full.csv", header, rows)
+    assert_same_store(appended, open_store(str(tmp_path / "full.csv"), str(tmp_path / "full")))
+
+
+def test_rejects_changed_prices(tmp_path, lbma_lines):
+    header, rows = lbma_lines
+    csv_path = tmp_path / "lbma.csv"
+    write_rows(csv_path, header, rows[:-5])
+    changed = rows[-6].split(",")
+    changed[1] = str(float(changed[1]) + 1)
+    write_rows(tmp_path / "drop.csv", header, [",".join(changed)] + rows[-5:])
+    with pytest.raises(ValueError, match="Inne ceny"):
+        ingest(str(tmp_path / "drop.csv"), str(csv_path), str(tmp_path / "cache"))
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from fifty_fifty.lod import LOD_POINTS, WEBGL_THRESHOLD, lod_trace
+
+go = pytest.importorskip("plotly.graph_objects")
+
+
+def test_long_series_use_webgl_with_defaults():
+    x = np.arange("1977-01-01", "2024-01-01", dtype="datetime64[D]")
+    y = np.sin(np.arange(len(x)) / 100)
+    trace = lod_trace(x, y)
+    assert isinstance(trace, go.Scattergl) and len(trace.x) <= LOD_POINTS
+
+
+def test_short_series_and_zoomed_windows_use_svg():
+    x = np.arange("1977-01-01", "2024-01-01", dtype="datetime64[D]")
+    y = np.cos(np.arange(len(x)) / 100)
+    assert isinstance(lod_trace(x[:WEBGL_THRESHOLD], y[:WEBGL_THRESHOLD]), go.Scatter)
+    assert isinstance(lod_trace(x, y, x_range=("2020-01-01", "2021-01-01")), go.Scatter)
@@ -0,0 +1,16 @@
+import numpy as np
+
+from fifty_fifty.compare import weight_matrix
+from fifty_fifty.price_store import LBMA_PATH, open_store
+from fifty_fifty.risk import risk_report
+
+
+def test_metal_stats_from_store_state_match_full_history():
+    data = open_store(LBMA_PATH)
+    weights = weight_matrix(data, 50000)
+    stored = risk_report(data, weights, 250)
+    plain = {key: value for key, value in data.items() if key not in ("moments", "drawdown")}
+    recomputed = risk_report(plain, weights, 250)
+    for key in ("metalVolatility", "metalMeanReturn", "metalDrawdown", "metalCorrelation"):
+        np.testing.assert_allclose(stored[key], recomputed[key], rtol=1e-9)
+    assert (stored["metalDrawdown"] < 0).all()
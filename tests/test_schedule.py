@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from fifty_fifty.backtest import metal_weights, run_backtest, run_rolling_backtest
+from fifty_fifty.core import get_metals
+from fifty_fifty.fees import storage_profile
+from fifty_fifty.price_store import LBMA_PATH, open_store
+from fifty_fifty.schedule import WEEKLY, make_schedule, parse_schedule, schedule_rows
+
+DATES = np.arange("2005-01-03", "2024-01-01", 45, dtype="datetime64[D]")
+
+
+@pytest.fixture(scope="module")
+def data():
+    return open_store(LBMA_PATH)
+
+
+@pytest.fixture(scope="module")
+def plan(data):
+    weights, _ = metal_weights(get_metals("BALANCE", 50000), data["columns"])
+    return weights, storage_profile("BALANCE", 50000)
+
+
+def test_parse_schedule():
+    assert parse_schedule("") == parse_schedule("weekly:0") == WEEKLY
+    assert parse_schedule("monthly:31@modified_following") == make_schedule("monthly", day=31, roll="modified_following")
+    custom = parse_schedule("custom:2020-01-06;2020-02-03 2020-03-02/1")
+    assert custom.kind == "custom" and len(custom.dates) == 3 and custom.periods == 1
+    for text in ("yearly", "weekly:9", "monthly:x", "custom:2020-01-06", "custom:2020-13-01;2020-01-01", "custom:2020-01-06;2020-02-03/2"):
+        with pytest.raises(ValueError):
+            parse_schedule(text)
+
+
+def test_custom_schedule_backtest_buys_on_its_dates(data, plan):
+    weights, storage = plan
+    schedule = make_schedule("custom", dates=DATES)
+    rows = schedule_rows(data, schedule)
+    backtest = run_backtest(data, weights, 10000, 500, None, storage=storage, schedule=schedule)
+    assert backtest["dates"][0] == data["dates"][rows[0]] and backtest["dates"][-1] == data["dates"][rows[-1]]
+    assert backtest["costBasis"][-1] == pytest.approx(10000 + 500 * (len(rows) - 1))
+
+    rolling = run_rolling_backtest(data, weights, 10000, 500, None, storage=storage, schedule=schedule)
+    assert len(rolling["finalValue"]) == 1
+    assert rolling["finalValue"][0] == pytest.approx(backtest["netValue"][-1], rel=3e-3)
+
+
+@pytest.mark.parametrize("storage_mode", ("metal", "eur"))
+def test_custom_schedule_rolling_windows(data, plan, storage_mode):
+    weights, storage = plan
+    schedule = make_schedule("custom", dates=DATES, periods=40)
+    rolling = run_rolling_backtest(data, weights, 10000, 500, None, storage=storage, storage_mode=storage_mode,
+                                   schedule=schedule)
+    assert len(rolling["finalValue"]) == len(schedule_rows(data, schedule)) - 40
+    assert rolling["invested"] == 10000 + 500 * 40
+    for start in (0, len(rolling["finalValue"]) - 1):
+        single = run_backtest(data, weights, 10000, 500, None, start, storage, storage_mode, schedule)
+        assert rolling["finalValue"][start] == pytest.approx(single["netValue"][-1], rel=3e-3)
+
+
+def test_monthly_schedule_uses_months_per_year(data, plan):
+    weights, storage = plan
+    rolling = run_rolling_backtest(data, weights, 0, 100, 10, storage=storage, schedule=make_schedule("monthly", day=15))
+    assert rolling["invested"] == 100 * 12 * 10
@@ -0,0 +1,36 @@
+import pytest
+
+from fifty_fifty.schedule import WEEKLY, make_schedule
+from fifty_fifty.server import ENDPOINTS, PLAN_FIELDS, CalculatorService, backtest_task, parse_params
+
+
+def test_parse_params_rejects_fractional_and_out_of_range_ints():
+    query = {"strategy": ["start"], "amount": ["7000"], "purchase": ["100"]}
+    assert dict(parse_params(dict(query, years=["7"]), PLAN_FIELDS))["years"] == 7
+    for years in ("7.9", "0", "100000", "nan"):
+        with pytest.raises(ValueError):
+            parse_params(dict(query, years=[years]), PLAN_FIELDS)
+
+
+def test_none_responses_are_cached():
+    service = CalculatorService(workers=1)
+    try:
+        query = {"strategy": ["START"], "amount": ["1"]}
+        assert service.handle("/tariff", query) == (200, None)
+        assert service.handle("/tariff", query) == (200, None)
+        assert service.metrics()["cache"]["hits"] == 1
+        status, body = service.handle("/projection", dict(query, purchase=["100"], years=["10"], paths=["0"]))
+        assert status == 400 and "paths" in body["error"]
+    finally:
+        service.close()
+
+
+def test_backtest_schedule_param():
+    fields = ENDPOINTS["/backtest"][0]
+    query = {"strategy": ["BALANCE"], "amount": ["50000"], "purchase": ["100"], "years": ["10"]}
+    assert dict(parse_params(query, fields))["schedule"] == WEEKLY
+    assert dict(parse_params(dict(query, schedule=["monthly:15"]), fields))["schedule"].day == 15
+    with pytest.raises(ValueError):
+        parse_params(dict(query, schedule=["yearly"]), fields)
+    monthly = backtest_task("BALANCE", 50000, 100, 10, "eur", make_schedule("monthly", day=15))
+    assert monthly["invested"] == 50000 + 100 * 12 * 10
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from fifty_fifty.core import get_agio, get_current_tariff, strategies
+from fifty_fifty.grid import slider_axes
+from fifty_fifty.vectorized import TARIFFS, get_agio_array, get_current_tariff_array
+
+
+def test_agio_array_matches_scalar():
+    rng = np.random.default_rng(0)
+    for strategy in strategies:
+        amounts = np.concatenate([slider_axes(strategy)[0], rng.uniform(0, strategy["maxValue"] * 1.2, 500), [0]])
+        vectorized = get_agio_array(strategy["name"], amounts)
+        for position, amount in enumerate(amounts.tolist()):
+            scalar = get_agio(strategy["name"], amount)
+            for key, value in scalar.items():
+                assert vectorized[key][position] == pytest.approx(value, abs=1e-9)
+
+
+def test_agio_array_mixed_strategies_and_shapes():
+    names = np.array([[s["name"] for s in strategies]] * 2)
+    amounts = np.array([[s["minValue"] for s in strategies], [s["maxValue"] for s in strategies]])
+    result = get_agio_array(names, amounts)
+    assert result["initialAgio"].shape == amounts.shape
+    for row, column in np.ndindex(amounts.shape):
+        expected = get_agio(names[row, column], float(amounts[row, column]))["initialAgio"]
+        assert result["initialAgio"][row, column] == pytest.approx(expected)
+
+
+def test_scalar_amount():
+    result = get_agio_array("START", 1000)
+    assert result["initialAgio"].shape == ()
+    assert float(result["initialAgio"]) == pytest.approx(get_agio("START", 1000)["initialAgio"])
+    assert int(get_current_tariff_array("START", 7000)) >= 0
+
+
+def test_tariff_array_matches_scalar():
+    for strategy in strategies:
+        amounts = np.concatenate([slider_axes(strategy)[0], [0, strategy["maxValue"] + 1]])
+        indices = get_current_tariff_array(strategy["name"], amounts)
+        for index, amount in zip(indices.tolist(), amounts.tolist()):
+            tariff = get_current_tariff(strategy["name"], amount)
+            assert (TARIFFS[index] if index >= 0 else None) is tariff
+
+
+def test_strategy_array_with_scalar_amount():
+    names = [s["name"] for s in strategies]
+    result = get_agio_array(names, 50000)
+    assert result["initialAgio"].shape == (len(names),)
+    for position, name in enumerate(names):
+        assert result["initialAgio"][position] == pytest.approx(get_agio(name, 50000)["initialAgio"])
+    indices = get_current_tariff_array(np.array(names)[:, None], [7000, 50000, 400000])
+    assert indices.shape == (len(names), 3)